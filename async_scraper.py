@@ -0,0 +1,683 @@
+"""
+This module provides an asyncio scrape engine for the climate website.
+
+`AsyncWeatherScraper` extends `WeatherScraper` so that hundreds of month pages, across
+any number of stations, can be in flight at once on a single thread:
+- An `asyncio.Semaphore` caps the number of requests in flight.
+- An optional `AsyncAdaptiveLimiter` adapts how many of them are sent at once.
+- Cancelling the task running a scrape cancels every request in flight.
+
+Pages are downloaded with `aiohttp` when it is installed, and otherwise with a small
+HTTP/1.1 client built on `asyncio` streams. `BackgroundLoop` runs an event loop on a
+daemon thread, so code outside asyncio, such as the tkinter application, can start a
+scrape and cancel it.
+"""
+
+import asyncio
+import gzip
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from urllib.parse import urljoin, urlsplit
+from requests.structures import CaseInsensitiveDict
+from http_client import FetchError, HTTPClient
+from instrumentation import count, traced
+from rate_control import AdaptiveLimiter, parse_retry_after
+from scrape_weather import WeatherScraper
+from stations import DEFAULT_STATION_ID
+
+try:
+    import aiohttp
+except ImportError:  # The asyncio streams client is used instead
+    aiohttp = None
+
+AsyncResponse = namedtuple("AsyncResponse", ["status", "headers", "text", "size"])
+
+_REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+_TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) + (
+    (aiohttp.ClientError,) if aiohttp is not None else ())
+
+
+class AsyncHTTPClient:
+    """
+    The asyncio counterpart of HTTPClient. It belongs to the event loop it is first used on
+    and must be closed on that loop.
+    """
+    RETRY_STATUSES = HTTPClient.RETRY_STATUSES
+
+    def __init__(self, pool_size=100, max_retries=3, backoff_factor=0.5, timeout=10, use_aiohttp=None,
+                 limiter=None, max_cached_pages=256):
+        """
+        Initialize the client. Connections are opened on first use.
+        :param pool_size: The number of idle keep-alive connections kept per host.
+        :param max_retries: How many times a failed request is retried.
+        :param backoff_factor: Base delay in seconds, doubled after every retry.
+        :param timeout: Default timeout in seconds for each request.
+        :param use_aiohttp: True or False to choose the transport, or None to use aiohttp if installed.
+        :param limiter: An AsyncAdaptiveLimiter shared by every request, or None to send requests as they come.
+        :param max_cached_pages: How many recently fetched pages get_text keeps to revalidate.
+        """
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_cached_pages = max_cached_pages
+        self.use_aiohttp = aiohttp is not None if use_aiohttp is None else use_aiohttp
+        if self.use_aiohttp and aiohttp is None:
+            raise ImportError("aiohttp is not installed.")
+
+        self._session = None
+        self._idle = {}
+        self._validators = OrderedDict()
+        self._counters = {"requests": 0, "reuses": 0, "retries": 0, "not_modified": 0, "bytes": 0}
+
+    async def _send(self, url, headers, timeout):
+        """
+        Send one GET request, holding a slot of the limiter if there is one and reporting how it went.
+        :param url: The URL to fetch.
+        :param headers: The request headers.
+        :param timeout: The timeout in seconds.
+        :return: An AsyncResponse.
+        """
+        if self.limiter is None:
+            return await asyncio.wait_for(self._get(url, headers), timeout)
+
+        sent_at = await self.limiter.acquire()
+        try:
+            response = await asyncio.wait_for(self._get(url, headers), timeout)
+        except asyncio.TimeoutError:
+            self.limiter.release(sent_at, timed_out=True)
+            raise
+        except BaseException:
+            self.limiter.release(sent_at, failed=True)
+            raise
+        if response.status in HTTPClient.THROTTLE_STATUSES:
+            self.limiter.release(sent_at, throttled=True,
+                                 retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        else:
+            self.limiter.release(sent_at)
+        return response
+
+    async def fetch(self, url, etag=None, last_modified=None, timeout=None):
+        """
+        Send a GET request, retrying 429 and 5xx responses, timeouts and connection errors.
+
+        :param url: The URL to fetch.
+        :param etag: An ETag from an earlier response, sent as If-None-Match.
+        :param last_modified: A Last-Modified value from an earlier response, sent as If-Modified-Since.
+        :param timeout: The timeout in seconds of each attempt, or None to use the client default.
+        :return: An AsyncResponse with status 200 or 304.
+        :raises FetchError: If the request still fails after all retries.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                self._counters["requests"] += 1
+                response = await self._send(url, headers, timeout or self.timeout)
+                if response.status not in self.RETRY_STATUSES:
+                    if response.status >= 400:
+                        raise FetchError(f"Failed to fetch page: {response.status} Client Error for url: {url}")
+                    self._counters["bytes"] += response.size
+                    count("http.bytes", response.size)
+                    if response.status == 304:
+                        self._counters["not_modified"] += 1
+                    return response
+                kind = "Too Many Requests" if response.status == 429 else "Server Error"
+                error = f"{response.status} {kind} for url: {url}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except _TRANSIENT_ERRORS as e:
+                error = str(e) or type(e).__name__
+
+            if attempt >= self.max_retries:
+                raise FetchError(f"Failed to fetch page: {error}")
+            self._counters["retries"] += 1
+            count("http.retries")
+            await asyncio.sleep(max(self.backoff_factor * (2 ** attempt),
+                                    min(retry_after or 0, HTTPClient.MAX_RETRY_AFTER)))
+            attempt += 1
+
+    async def get_text(self, url, timeout=None):
+        """
+        Return the body of a page, using a conditional GET if it is among the max_cached_pages
+        most recently fetched pages.
+
+        :param url: The URL to fetch.
+        :param timeout: The timeout in seconds, or None to use the client default.
+        :return: HTML content of the page as a string.
+        :raises FetchError: If the request fails after all retries.
+        """
+        etag, last_modified, text = self._validators.get(url, (None, None, None))
+        if text is not None:
+            self._validators.move_to_end(url)
+
+        response = await self.fetch(url, etag, last_modified, timeout)
+        if response.status == 304 and text is not None:
+            return text
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._validators[url] = (etag, last_modified, response.text)
+            self._validators.move_to_end(url)
+            while len(self._validators) > self.max_cached_pages:
+                self._validators.popitem(last=False)
+        return response.text
+
+    async def _get(self, url, headers, max_redirects=5):
+        """
+        Send one GET request, following redirects.
+
+        :param url: The URL to fetch.
+        :param headers: Extra request headers.
+        :param max_redirects: The number of redirects followed before giving up.
+        :return: An AsyncResponse.
+        """
+        if self.use_aiohttp:
+            return await self._aiohttp_get(url, headers)
+
+        for _ in range(max_redirects + 1):
+            response = await self._stream_get(url, headers)
+            location = response.headers.get("Location")
+            if response.status not in _REDIRECT_STATUSES or not location:
+                return response
+            url = urljoin(url, location)
+        raise FetchError(f"Failed to fetch page: too many redirects for url: {url}")
+
+    async def _aiohttp_get(self, url, headers):
+        """
+        Send one GET request with aiohttp.
+
+        :param url: The URL to fetch.
+        :param headers: Extra request headers.
+        :return: An AsyncResponse.
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0,
+                                                                                 limit_per_host=self.pool_size))
+        async with self._session.get(url, headers=headers) as response:
+            body = await response.read()
+            text = body.decode(response.charset or "utf-8", errors="replace")
+            return AsyncResponse(response.status, CaseInsensitiveDict(response.headers), text, len(body))
+
+    async def _stream_get(self, url, headers):
+        """
+        Send one GET request over a pooled asyncio stream connection.
+
+        An idle connection the server has since closed is discarded and the request
+        is sent again on a new one.
+
+        :param url: The URL to fetch.
+        :param headers: Extra request headers.
+        :return: An AsyncResponse.
+        """
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        key = (parts.hostname, parts.port or (443 if secure else 80), secure)
+        idle = self._idle.setdefault(key, deque())
+
+        while True:
+            reused = bool(idle)
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(key[0], key[1], ssl=True if secure else None)
+            try:
+                response, keep_alive = await self._exchange(reader, writer, parts, headers)
+            except _TRANSIENT_ERRORS:
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if reused:
+                self._counters["reuses"] += 1
+            if keep_alive and len(idle) < self.pool_size:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _exchange(self, reader, writer, parts, headers):
+        """
+        Write a GET request and read its response from a connection.
+
+        :param reader: The connection's StreamReader.
+        :param writer: The connection's StreamWriter.
+        :param parts: The split URL being fetched.
+        :param headers: Extra request headers.
+        :return: A tuple of (AsyncResponse, whether the connection can be reused).
+        :raises ConnectionError: If the response is malformed or the connection is closed.
+        """
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}", "Accept-Encoding: gzip",
+                 "Connection: keep-alive", *(f"{name}: {value}" for name, value in headers.items())]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server.")
+        try:
+            version, status = status_line.decode("latin-1").split(None, 2)[:2]
+            status = int(status)
+            response_headers = CaseInsensitiveDict()
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip()] = value.strip()
+
+            keep_alive = (version == "HTTP/1.1"
+                          and response_headers.get("Connection", "").lower() != "close")
+            if status in (204, 304) or 100 <= status < 200:
+                body = b""
+            elif response_headers.get("Transfer-Encoding", "").lower() == "chunked":
+                body = await self._read_chunked(reader)
+            elif "Content-Length" in response_headers:
+                body = await reader.readexactly(int(response_headers["Content-Length"]))
+            else:
+                body = await reader.read()
+                keep_alive = False
+        except ValueError as e:
+            raise ConnectionError(f"Malformed HTTP response from {parts.netloc}: {e}") from e
+
+        size = len(body)
+        if response_headers.get("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        charset = response_headers.get("Content-Type", "").partition("charset=")[2].split(";")[0].strip()
+        try:
+            text = body.decode(charset or "utf-8", errors="replace")
+        except LookupError:
+            text = body.decode("utf-8", errors="replace")
+        return AsyncResponse(status, response_headers, text, size), keep_alive
+
+    @staticmethod
+    async def _read_chunked(reader):
+        """
+        Read a chunked response body.
+        :param reader: The connection's StreamReader.
+        :return: The body bytes.
+        """
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if not size:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    def stats(self):
+        """
+        Return a snapshot of the client counters.
+        :return: A dictionary with requests, reuses, retries, not_modified and bytes.
+        """
+        return dict(self._counters)
+
+    async def close(self):
+        """
+        Close every pooled connection.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle.clear()
+
+
+class AsyncHostRateLimiter:
+    """
+    An asyncio counterpart of HostRateLimiter that spaces out requests made to the same host.
+    """
+    def __init__(self, requests_per_second=None):
+        """
+        Initialize the limiter.
+
+        :param requests_per_second: Maximum requests per second for each host, or None for no limit.
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = {}
+
+    async def wait(self, url):
+        """
+        Wait until a request to the host of the given URL is allowed.
+
+        :param url: The URL about to be requested.
+        """
+        if not self.interval:
+            return
+
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncAdaptiveLimiter(AdaptiveLimiter):
+    """
+    An asyncio counterpart of AdaptiveLimiter, for requests made on one event loop.
+    """
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the limiter with the same arguments as AdaptiveLimiter.
+        """
+        super().__init__(*args, **kwargs)
+        self._released = asyncio.Event()
+
+    async def acquire(self):
+        """
+        Wait until a request may be sent, and take a slot. Every acquire must be followed by a release.
+        :return: The monotonic time the request is sent at, to give to release.
+        """
+        while True:
+            with self._condition:
+                wait = self._take_slot()
+            if wait == 0:
+                break
+            # Nothing can release between the check and clearing the event, as both run on the loop
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        if self.bucket is not None:
+            try:
+                delay = self.bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # A pause may have started while this request waited for a token
+                await asyncio.sleep(self._pause_remaining())
+            except BaseException:
+                # A task cancelled here, such as a stopped station's queued month, never sends its request
+                self._give_back_slot()
+                raise
+        return time.monotonic()
+
+    def _give_back_slot(self):
+        """
+        Give back the slot of a request that was never sent and wake the requests waiting for a slot.
+        """
+        super()._give_back_slot()
+        self._released.set()
+
+    def release(self, sent_at, throttled=False, timed_out=False, failed=False, retry_after=None):
+        """
+        Give back a slot, adjust the limit and wake the requests waiting for a slot.
+        """
+        super().release(sent_at, throttled, timed_out, failed, retry_after)
+        self._released.set()
+
+
+class AsyncWeatherScraper(WeatherScraper):
+    """
+    A WeatherScraper that downloads month pages concurrently on an asyncio event loop.
+    """
+    def __init__(self, async_client=None, page_cache=None, parser="fast",
+                 station_id=DEFAULT_STATION_ID, base_url=None):
+        """
+        Initialize the scraper.
+
+        :param async_client: The AsyncHTTPClient used for downloads. A new client is created if omitted.
+        :param page_cache: An optional PageCache holding raw month pages.
+        :param parser: "fast" for the streaming table extractor, or "bs4" for BeautifulSoup.
+        :param station_id: The climate station whose data is scraped.
+        :param base_url: The scheme and host pages are requested from, defaulting to SITE_URL.
+        """
+        super().__init__(page_cache=page_cache, parser=parser, station_id=station_id, base_url=base_url)
+        self.async_client = async_client or AsyncHTTPClient()
+
+    @traced("scrape.get_html_async")
+    async def _get_html_async(self, url, timeout=10):
+        """
+        Fetch HTML content from the provided URL, through the page cache if there is one.
+        The cache is read and written on worker threads, off the event loop.
+
+        :param url: The URL to fetch the content from.
+        :param timeout: The maximum time in seconds to wait for each attempt.
+        :return: HTML content of the page as a string.
+        :raises: FetchError if the request still fails or times out after retrying.
+        """
+        if self.page_cache is None:
+            return await self.async_client.get_text(url, timeout)
+
+        cached = await asyncio.to_thread(self.page_cache.get, url)
+        if cached is not None and (self.page_cache.offline or
+                                   self.page_cache.is_immutable(url, fetched_at=cached.fetched_at)):
+            return cached.text
+        if self.page_cache.offline:
+            raise FetchError(f"Page is not cached and the cache is offline: {url}")
+
+        if cached is not None:
+            response = await self.async_client.fetch(url, cached.etag, cached.last_modified, timeout)
+            if response.status == 304:
+                await asyncio.to_thread(self.page_cache.touch, url)
+                return cached.text
+        else:
+            response = await self.async_client.fetch(url, timeout=timeout)
+
+        await asyncio.to_thread(self.page_cache.put, url, response.text,
+                                response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.text
+
+    async def _fetch_month(self, semaphore, limiter, station_id, month_date, timeout):
+        """
+        Download one month page once a request slot is free and parse it on a worker thread.
+
+        :param semaphore: The semaphore capping the requests in flight.
+        :param limiter: The AsyncHostRateLimiter shared by the scrape.
+        :param station_id: The station to fetch.
+        :param month_date: A date in the month to fetch.
+        :param timeout: The maximum time in seconds to wait for each attempt.
+        :return: A tuple of (whether the page had any table rows, dictionary of weather data by date).
+        """
+        url = self._generate_url_for_month(month_date, station_id)
+        async with semaphore:
+            await limiter.wait(url)
+            html = await self._get_html_async(url, timeout)
+        return await asyncio.to_thread(self._parse_page, html)
+
+    async def _iter_pages(self, jobs, concurrency, requests_per_second, timeout, stop_on_empty,
+                          return_exceptions=False):
+        """
+        Fetch (station, month) jobs concurrently and yield their records.
+
+        At most 2 * concurrency jobs are scheduled at a time and at most concurrency
+        requests are in flight. With stop_on_empty, each station's months are yielded
+        in job order and the first empty page cancels that station's remaining months;
+        otherwise months are yielded as they arrive. The first month that fails raises its
+        error, unless return_exceptions is set, in which case the error is yielded in place of
+        the month's records. Leaving the generator early, or cancelling the task iterating it,
+        cancels every request in flight.
+
+        :param jobs: An iterable of (station ID, month date) tuples.
+        :param concurrency: The maximum number of requests in flight.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :param timeout: The maximum time in seconds to wait for each attempt.
+        :param stop_on_empty: Whether an empty page ends its station's scrape.
+        :param return_exceptions: Whether to yield the error of a failed month instead of raising it.
+            Only used without stop_on_empty.
+        :return: An async generator of (station ID, month date, dictionary of weather data) tuples.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = AsyncHostRateLimiter(requests_per_second)
+        jobs = iter(jobs)
+        running = {}
+        order = {}
+        finished = {}
+        stopped = set()
+
+        def fill():
+            while len(running) < 2 * concurrency:
+                job = next((job for job in jobs if job[0] not in stopped), None)
+                if job is None:
+                    return
+                task = asyncio.create_task(self._fetch_month(semaphore, limiter, *job, timeout))
+                running[task] = job
+                order.setdefault(job[0], deque()).append(job[1])
+
+        try:
+            fill()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                ready = []
+                for task in done:
+                    if task not in running:  # Cancelled with its station earlier in this batch
+                        continue
+                    station_id, month_date = running.pop(task)
+                    if return_exceptions and not stop_on_empty and isinstance(task.exception(), Exception):
+                        ready.append((station_id, month_date, task.exception()))
+                        continue
+                    found_rows, records = task.result()
+                    if not stop_on_empty:
+                        ready.append((station_id, month_date, records))
+                        continue
+
+                    finished[station_id, month_date] = found_rows, records
+                    months = order[station_id]
+                    while months and (station_id, months[0]) in finished:
+                        month_date = months.popleft()
+                        found_rows, records = finished.pop((station_id, month_date))
+                        if not found_rows:
+                            print(f"No more data found for station {station_id}. Stopping its scrape.")
+                            stopped.add(station_id)
+                            self._cancel_station(running, finished, months, station_id)
+                            break
+                        ready.append((station_id, month_date, records))
+
+                fill()
+                for page in ready:
+                    yield page
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    @staticmethod
+    def _cancel_station(running, finished, months, station_id):
+        """
+        Drop the outstanding months of a station that has run out of data.
+
+        :param running: The running tasks, mapped to their (station ID, month date) jobs.
+        :param finished: Pages finished out of order, keyed by (station ID, month date).
+        :param months: The station's months that have not been yielded.
+        :param station_id: The station to drop.
+        """
+        for task, job in list(running.items()):
+            if job[0] == station_id:
+                task.cancel()
+                del running[task]
+        for month_date in months:
+            finished.pop((station_id, month_date), None)
+        months.clear()
+
+    def iter_scrape_async(self, start_date, end_date, station_ids=None, concurrency=100,
+                          requests_per_second=None, timeout=10):
+        """
+        Scrape stations concurrently, yielding each station's months newest first.
+
+        Jobs are scheduled newest month first across every station. As with scrape(),
+        the first empty page of a station ends that station's scrape.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :param station_ids: The stations to scrape, defaulting to the scraper's station.
+        :param concurrency: The maximum number of requests in flight.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :param timeout: The maximum time in seconds to wait for each attempt.
+        :return: An async generator of (station ID, month date, dictionary of weather data) tuples.
+        """
+        station_ids = station_ids or [self.station_id]
+        jobs = ((station_id, month_date) for month_date in self._iter_months(start_date, end_date)
+                for station_id in station_ids)
+        return self._iter_pages(jobs, concurrency, requests_per_second, timeout, stop_on_empty=True)
+
+    def scrape_months_async(self, jobs, concurrency=100, requests_per_second=None, timeout=10,
+                            return_exceptions=False):
+        """
+        Scrape the given station months concurrently, yielding them as they arrive.
+
+        Unlike iter_scrape_async(), empty pages do not stop the scrape; they yield no records.
+        With return_exceptions, a month that fails yields its error in place of its records
+        and the other months carry on.
+
+        :param jobs: An iterable of (station ID, month date) tuples.
+        :param concurrency: The maximum number of requests in flight.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :param timeout: The maximum time in seconds to wait for each attempt.
+        :param return_exceptions: Whether to yield the error of a failed month instead of raising it.
+        :return: An async generator of (station ID, month date, dictionary of weather data or exception) tuples.
+        """
+        return self._iter_pages(jobs, concurrency, requests_per_second, timeout, stop_on_empty=False,
+                                return_exceptions=return_exceptions)
+
+    async def scrape_async(self, start_date, end_date, concurrency=100, requests_per_second=None, timeout=10):
+        """
+        Scrape weather data of the scraper's station for the given date range.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :param concurrency: The maximum number of requests in flight.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :param timeout: The maximum time in seconds to wait for each attempt.
+        :return: A dictionary of weather data indexed by date.
+        """
+        pages = self.iter_scrape_async(start_date, end_date, None, concurrency, requests_per_second, timeout)
+        try:
+            async for _, _, records in pages:
+                self._store_records(records)
+        finally:
+            await pages.aclose()
+        return self.weather_data
+
+
+class BackgroundLoop:
+    """
+    An asyncio event loop running on a daemon thread.
+    """
+    def __init__(self):
+        """
+        Start the loop thread.
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-scraper", daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine):
+        """
+        Schedule a coroutine on the loop.
+
+        :param coroutine: The coroutine to run.
+        :return: A concurrent.futures.Future of the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def cancel(self):
+        """
+        Cancel every task running on the loop.
+
+        The tasks' futures are resolved as cancelled once the tasks have finished
+        cleaning up, so a done callback sees a scrape that has fully stopped.
+        """
+        self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop)])
+
+    def stop(self):
+        """
+        Stop the loop and wait for its thread to finish.
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
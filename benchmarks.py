@@ -0,0 +1,525 @@
+"""
+This module provides benchmarks for the weather application.
+
+Run it directly to measure how fast synthetic weather rows are ingested into SQLite,
+comparing the original one-INSERT-per-row loop with `DBOperations.bulk_insert`, and how
+much memory scraped records take as a dictionary of dictionaries and as a
+`WeatherRecordStore`, and how fast the asyncio scrape engine downloads month pages
+from `MockClimateServer` with injected latency compared with the serial `scrape`.
+
+The end-to-end suite generates synthetic month pages for N stations over Y years and
+measures each stage of the application in turn: parse throughput of both parsers
+(checking they agree), `save_data` ingest rate, `fetch_data` range-query latency and
+the data preparation of box and line plots on the headless Agg backend. Its results
+are written as JSON, and a previous result file can be given to compare against.
+The parse throughput can also be measured with `instrumentation` disabled and enabled:
+
+    python benchmarks.py --rows 1000000
+    python benchmarks.py --memory --rows 1000000
+    python benchmarks.py --scrape --months 240 --latency 0.05
+    python benchmarks.py --suite --stations 5 --years 20 --json results.json [--baseline old.json]
+    python benchmarks.py --instrumentation --years 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import date, datetime, timedelta
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from async_scraper import AsyncWeatherScraper
+from db_operations import DBOperations
+from dbcm import DBCM
+import instrumentation
+from mock_climate_server import MockClimateServer, SyntheticSource, render_month_page, synthetic_month_records
+from plot_cache import PlotCache
+from plot_operations import PlotOperations
+from record_store import WeatherRecordStore
+from scrape_weather import WeatherScraper
+
+
+def synthetic_rows(count, stations=100, seed=0):
+    """
+    Generate synthetic weather rows spread over several stations.
+
+    :param count: The number of rows to generate.
+    :param stations: The number of stations the rows are spread over.
+    :param seed: The random seed, so runs are repeatable.
+    :return: A generator of (station_id, sample_date, min_temp, max_temp, avg_temp) tuples.
+    """
+    rng = random.Random(seed)
+    days_per_station = -(-count // stations)
+    first_day = date(1900, 1, 1)
+    produced = 0
+    for station_id in range(1, stations + 1):
+        for offset in range(days_per_station):
+            if produced == count:
+                return
+            max_temp = round(rng.uniform(-30, 35), 1)
+            min_temp = round(max_temp - rng.uniform(0, 15), 1)
+            yield (station_id, (first_day + timedelta(days=offset)).isoformat(),
+                   min_temp, max_temp, round((max_temp + min_temp) / 2, 1))
+            produced += 1
+
+
+def _row_by_row_insert(db_name, rows):
+    """
+    Insert rows the way the original save_data did: one execute call per row.
+
+    :param db_name: The database file to insert into.
+    :param rows: An iterable of weather rows.
+    """
+    insert_sql = """
+    INSERT OR IGNORE INTO weather (station_id, sample_date, min_temp, max_temp, avg_temp)
+    VALUES (?, ?, ?, ?, ?);
+    """
+    with sqlite3.connect(db_name) as conn:
+        cursor = conn.cursor()
+        for row in rows:
+            cursor.execute(insert_sql, row)
+        conn.commit()
+    conn.close()
+
+
+def bench_ingest(count=1_000_000, batch_size=10000):
+    """
+    Compare ingest throughput of the row-by-row loop and the bulk insert paths.
+
+    :param count: The number of synthetic rows to ingest.
+    :param batch_size: The batch size passed to bulk_insert.
+    :return: A dictionary mapping each method to its rows per second.
+    """
+    # Generate the rows up front so only the database work is timed
+    rows = list(synthetic_rows(count))
+    methods = {
+        "row_by_row": lambda db: _row_by_row_insert(db.db_name, rows),
+        "bulk_insert": lambda db: db.bulk_insert(iter(rows), batch_size),
+        "bulk_insert_staging": lambda db: db.bulk_insert(iter(rows), batch_size,
+                                                         on_conflict="update", use_staging=True),
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, ingest in methods.items():
+            db = DBOperations(os.path.join(tmp_dir, f"{name}.db"))
+            db.initialize_db()
+            start = time.perf_counter()
+            ingest(db)
+            elapsed = time.perf_counter() - start
+            results[name] = count / elapsed
+            print(f"{name}: {count} rows in {elapsed:.2f} s ({results[name]:,.0f} rows/s)")
+            DBCM.close_all(db.db_name)
+    return results
+
+
+def bench_memory(count=1_000_000):
+    """
+    Compare the memory held by scraped records as a dictionary of dictionaries and
+    as a WeatherRecordStore, filled newest day first as the scrapers do.
+
+    :param count: The number of consecutive days of records.
+    :return: A dictionary mapping each representation to bytes per million records.
+    """
+    rows = [row[1:] for row in synthetic_rows(count, stations=1)][::-1]
+    representations = {
+        "dict": dict,
+        "WeatherRecordStore": WeatherRecordStore,
+    }
+
+    results = {}
+    for name, factory in representations.items():
+        tracemalloc.start()
+        records = factory()
+        for sample_date, min_temp, max_temp, avg_temp in rows:
+            records[sample_date] = {"Max": max_temp, "Min": min_temp, "Mean": avg_temp}
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del records
+        results[name] = size * 1_000_000 / count
+        print(f"{name}: {size / 2 ** 20:.1f} MiB for {count} records "
+              f"({results[name] / 2 ** 20:.1f} MiB per million, {size / count:.0f} bytes each)")
+    return results
+
+
+def synthetic_month_page(station_id, year, month, seed=0):
+    """
+    Render a month page shaped like the climate website's daily data table.
+
+    :param station_id: The station the page belongs to.
+    :param year: The year of the month.
+    :param month: The month number.
+    :param seed: The random seed, so pages are repeatable.
+    :return: The HTML of the page.
+    """
+    return render_month_page(year, month, synthetic_month_records(station_id, year, month, seed))
+
+
+def synthetic_pages(stations=5, years=20, last_year=2024):
+    """
+    Generate a synthetic month page for every month of several stations and years.
+
+    :param stations: The number of stations, numbered from 1.
+    :param years: The number of years, ending with last_year.
+    :param last_year: The newest year.
+    :return: A generator of (station_id, year, month, html) tuples.
+    """
+    for station_id in range(1, stations + 1):
+        for year in range(last_year - years + 1, last_year + 1):
+            for month in range(1, 13):
+                yield station_id, year, month, synthetic_month_page(station_id, year, month)
+
+
+def _latency_summary(seconds):
+    """
+    Summarize a list of latencies.
+    :param seconds: The latencies in seconds.
+    :return: A dictionary of the mean, p50, p95 and max in milliseconds.
+    """
+    milliseconds = np.array(seconds) * 1000
+    return {"mean_ms": float(milliseconds.mean()), "p50_ms": float(np.percentile(milliseconds, 50)),
+            "p95_ms": float(np.percentile(milliseconds, 95)), "max_ms": float(milliseconds.max())}
+
+
+def bench_parse(pages):
+    """
+    Measure the parse throughput of the streaming and BeautifulSoup parsers.
+
+    :param pages: A list of (station_id, year, month, html) tuples.
+    :return: A dictionary of pages and rows per second for each parser, and whether they agree.
+    :raises AssertionError: If the parsers return different records for a page.
+    """
+    results = {}
+    parsed = {}
+    for parser in ("fast", "bs4"):
+        scraper = WeatherScraper(parser=parser)
+        start = time.perf_counter()
+        parsed[parser] = [scraper._parse_page(html)[1] for *_, html in pages]
+        elapsed = time.perf_counter() - start
+        rows = sum(len(records) for records in parsed[parser])
+        results[parser] = {"pages_per_second": len(pages) / elapsed, "rows_per_second": rows / elapsed}
+        print(f"parse {parser}: {len(pages)} pages in {elapsed:.2f} s ({len(pages) / elapsed:,.0f} pages/s)")
+
+    if parsed["fast"] != parsed["bs4"]:
+        raise AssertionError("The fast and bs4 parsers returned different records.")
+    results["parity"] = True
+    results["speedup"] = results["fast"]["pages_per_second"] / results["bs4"]["pages_per_second"]
+    return results, parsed["fast"]
+
+
+def bench_instrumentation(pages, repeats=3):
+    """
+    Measure what instrumentation costs the fast parser, disabled and enabled.
+
+    :param pages: A list of (station_id, year, month, html) tuples.
+    :param repeats: The number of timed passes over the pages; the fastest is kept.
+    :return: A dictionary of pages per second with instrumentation disabled and enabled, and the overhead.
+    """
+    scraper = WeatherScraper()
+    results = {}
+    for name, switch in (("disabled", instrumentation.disable), ("enabled", instrumentation.enable)):
+        switch()
+        instrumentation.REGISTRY.reset()
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for *_, html in pages:
+                scraper._parse_page(html)
+            best = min(best, time.perf_counter() - start)
+        results[name] = len(pages) / best
+        print(f"parse with instrumentation {name}: {results[name]:,.0f} pages/s")
+    instrumentation.disable()
+
+    results["overhead"] = results["disabled"] / results["enabled"] - 1
+    spans = instrumentation.REGISTRY.snapshot()["spans"]
+    for name, data in spans.items():
+        print(f"  {name}: {data['count']} spans, p50 {data['p50_ms']:.3f} ms")
+    print(f"overhead when enabled: {results['overhead']:+.1%}")
+    return results
+
+
+def bench_save_data(db_name, pages, records):
+    """
+    Measure the ingest rate of save_data, saving each station's parsed records in one call.
+
+    :param db_name: The database file to create.
+    :param pages: A list of (station_id, year, month, html) tuples.
+    :param records: The parsed records of each page.
+    :return: A dictionary of the rows ingested and rows per second.
+    """
+    by_station = {}
+    for (station_id, *_), page_records in zip(pages, records):
+        by_station.setdefault(station_id, WeatherRecordStore()).update(page_records)
+
+    db = DBOperations(db_name)
+    db.initialize_db()
+    rows = sum(len(station_records) for station_records in by_station.values())
+    start = time.perf_counter()
+    for station_id, station_records in by_station.items():
+        db.save_data(station_records, station_id)
+    elapsed = time.perf_counter() - start
+    print(f"save_data: {rows} rows in {elapsed:.2f} s ({rows / elapsed:,.0f} rows/s)")
+    return {"rows": rows, "rows_per_second": rows / elapsed}
+
+
+def bench_fetch_data(db_name, stations, first_year, last_year, queries=200, seed=0):
+    """
+    Measure fetch_data latency for month, year and decade ranges at random positions.
+
+    :param db_name: The database file to query.
+    :param stations: The number of stations in the database.
+    :param first_year: The oldest year in the database.
+    :param last_year: The newest year in the database.
+    :param queries: The number of queries of each range size.
+    :param seed: The random seed, so runs are repeatable.
+    :return: A dictionary mapping each range size to its latency summary.
+    """
+    rng = random.Random(seed)
+    db = DBOperations(db_name)
+    first_day = date(first_year, 1, 1).toordinal()
+    last_day = date(last_year, 12, 31).toordinal()
+    results = {}
+    for name, days in (("month", 31), ("year", 365), ("decade", 3652)):
+        latencies = []
+        for _ in range(queries):
+            start_day = rng.randint(first_day, max(first_day, last_day - days))
+            start_date = date.fromordinal(start_day).isoformat()
+            end_date = date.fromordinal(min(start_day + days - 1, last_day)).isoformat()
+            station_id = rng.randint(1, stations)
+            start = time.perf_counter()
+            db.fetch_data(start_date, end_date, station_id)
+            latencies.append(time.perf_counter() - start)
+        results[name] = _latency_summary(latencies)
+        print(f"fetch_data {name}: p50 {results[name]['p50_ms']:.3f} ms, p95 {results[name]['p95_ms']:.3f} ms")
+    return results
+
+
+def bench_plot_prep(db_name, stations, first_year, last_year, repeats=20):
+    """
+    Measure box and line plot data preparation on the Agg backend.
+
+    Cold timings start from an empty plot cache every time; warm timings repeat a
+    cached view. The full plot_boxplot and plot_lineplot calls are timed as well
+    from a warm cache, so they measure drawing the figure, with plt.show() a no-op on Agg.
+
+    :param db_name: The database file to plot from.
+    :param stations: The number of stations in the database.
+    :param first_year: The oldest year in the database.
+    :param last_year: The newest year in the database.
+    :param repeats: The number of times each measurement is repeated.
+    :return: A dictionary mapping each measurement to its latency summary.
+    """
+    plotter = PlotOperations(db_name)
+    station_ids = list(range(1, stations + 1))
+    measurements = {
+        "boxplot_stats_cold": lambda: plotter.boxplot_stats(first_year, last_year, station_ids),
+        "lineplot_data_cold": lambda: plotter.lineplot_data(last_year, 6, 1),
+        "boxplot_stats_warm": lambda: plotter.boxplot_stats(first_year, last_year, station_ids),
+        "lineplot_data_warm": lambda: plotter.lineplot_data(last_year, 6, 1),
+        "plot_boxplot": lambda: plotter.plot_boxplot(first_year, last_year, station_ids),
+        "plot_lineplot": lambda: plotter.plot_lineplot(last_year, 6, 1),
+    }
+
+    results = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # plt.show() warns that Agg is non-interactive
+        for name, prepare in measurements.items():
+            latencies = []
+            if not name.endswith("_cold"):
+                prepare()
+            for _ in range(repeats):
+                if name.endswith("_cold"):
+                    plotter.cache = PlotCache()
+                start = time.perf_counter()
+                prepare()
+                latencies.append(time.perf_counter() - start)
+                plt.close("all")
+            results[name] = _latency_summary(latencies)
+            print(f"{name}: p50 {results[name]['p50_ms']:.3f} ms")
+    return results
+
+
+def _environment():
+    """
+    Describe the code and machine a benchmark ran on.
+    :return: A dictionary of the git commit, versions and platform.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version, "numpy": np.__version__, "matplotlib": matplotlib.__version__,
+            "timestamp": datetime.now().isoformat(timespec="seconds")}
+
+
+def run_suite(stations=5, years=20, last_year=2024):
+    """
+    Run every stage of the end-to-end benchmark on synthetic pages.
+
+    :param stations: The number of synthetic stations.
+    :param years: The number of synthetic years per station.
+    :param last_year: The newest synthetic year.
+    :return: A JSON-serializable dictionary of the environment, parameters and results.
+    """
+    first_year = last_year - years + 1
+    pages = list(synthetic_pages(stations, years, last_year))
+    print(f"Generated {len(pages)} month pages for {stations} stations over {years} years.")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "suite.db")
+        results["parse"], records = bench_parse(pages)
+        results["save_data"] = bench_save_data(db_name, pages, records)
+        results["fetch_data"] = bench_fetch_data(db_name, stations, first_year, last_year)
+        results["plot_prep"] = bench_plot_prep(db_name, stations, first_year, last_year)
+        DBCM.close_all(db_name)
+
+    return {"environment": _environment(),
+            "parameters": {"stations": stations, "years": years, "last_year": last_year, "pages": len(pages)},
+            "results": results}
+
+
+def _flatten(results, prefix=""):
+    """
+    Flatten nested results into dotted metric names.
+    :param results: A dictionary of results.
+    :param prefix: The dotted name of the dictionary.
+    :return: A dictionary mapping metric names to numbers.
+    """
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """
+    Print how the throughputs and median latencies changed from a baseline run.
+
+    Throughputs (per second) are better when higher and latencies when lower.
+    Means, tails and maxima are too noisy between runs to compare and are skipped.
+
+    :param results: The results of this run.
+    :param baseline: The results of the baseline run.
+    :param threshold: The relative change for the worse reported as a regression.
+    :return: The names of the metrics that regressed.
+    """
+    current = _flatten(results["results"])
+    previous = _flatten(baseline["results"])
+    regressions = []
+    for name in sorted(current.keys() & previous.keys()):
+        if not previous[name] or not name.endswith(("per_second", "p50_ms")):
+            continue
+        change = current[name] / previous[name] - 1
+        worse = -change if name.endswith("per_second") else change
+        marker = "  REGRESSION" if worse > threshold else ""
+        if marker:
+            regressions.append(name)
+        print(f"{name}: {previous[name]:.4g} -> {current[name]:.4g} ({change:+.1%}){marker}")
+    return regressions
+
+
+def bench_scrape(months=240, latency=0.05, concurrency=100):
+    """
+    Compare the serial scrape with the asyncio scrape engine against a local server.
+
+    :param months: The number of months to scrape.
+    :param latency: The delay in seconds the server adds to every page.
+    :param concurrency: The maximum number of requests the asyncio engine keeps in flight.
+    :return: A dictionary mapping each method to its months per second.
+    """
+    server = MockClimateServer(SyntheticSource(2000, 2024), latency=latency).start()
+
+    end_date = date(2024, 12, 31)
+    start_date = end_date
+    for _ in range(months - 1):
+        start_date = start_date.replace(day=1) - timedelta(days=1)
+    start_date = start_date.replace(day=1)
+
+    async def scrape_async(scraper):
+        try:
+            return await scraper.scrape_async(start_date, end_date, concurrency)
+        finally:
+            await scraper.async_client.close()
+
+    methods = {
+        "serial": lambda scraper: scraper.scrape(start_date, end_date),
+        "asyncio": lambda scraper: asyncio.run(scrape_async(scraper)),
+    }
+    scrapers = {"serial": WeatherScraper(base_url=server.url), "asyncio": AsyncWeatherScraper(base_url=server.url)}
+
+    results = {}
+    try:
+        for name, scrape in methods.items():
+            scraper = scrapers[name]
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                scrape(scraper)
+            elapsed = time.perf_counter() - start
+            results[name] = months / elapsed
+            print(f"{name}: {months} months in {elapsed:.2f} s ({results[name]:,.1f} months/s, "
+                  f"{len(scraper.weather_data)} records)")
+    finally:
+        server.stop()
+
+    if dict(scrapers["serial"].weather_data) != dict(scrapers["asyncio"].weather_data):
+        raise AssertionError("The asyncio scrape returned different records from the serial scrape.")
+    print(f"speedup: {results['asyncio'] / results['serial']:.1f}x at {latency * 1000:.0f} ms latency")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weather application benchmarks.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic rows to ingest.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Batch size for bulk inserts.")
+    parser.add_argument("--memory", action="store_true", help="Measure record memory instead of ingest.")
+    parser.add_argument("--scrape", action="store_true", help="Compare serial and asyncio scraping instead.")
+    parser.add_argument("--months", type=int, default=240, help="Number of months to scrape.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the local server adds per page.")
+    parser.add_argument("--concurrency", type=int, default=100, help="Requests the asyncio engine keeps in flight.")
+    parser.add_argument("--suite", action="store_true", help="Run the end-to-end benchmark suite instead.")
+    parser.add_argument("--stations", type=int, default=5, help="Number of synthetic stations for the suite.")
+    parser.add_argument("--years", type=int, default=20, help="Number of synthetic years for the suite.")
+    parser.add_argument("--json", help="Write the suite results to this JSON file.")
+    parser.add_argument("--baseline", help="A previous suite JSON file to compare the results with.")
+    parser.add_argument("--instrumentation", action="store_true",
+                        help="Measure the parse overhead of instrumentation instead.")
+    args = parser.parse_args()
+    if args.suite:
+        suite_results = run_suite(args.stations, args.years)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(suite_results, f, indent=2)
+            print(f"Results written to {args.json}")
+        else:
+            print(json.dumps(suite_results, indent=2))
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                if compare_results(suite_results, json.load(f)):
+                    sys.exit(1)
+    elif args.instrumentation:
+        bench_instrumentation(list(synthetic_pages(1, args.years)))
+    elif args.memory:
+        bench_memory(args.rows)
+    elif args.scrape:
+        bench_scrape(args.months, args.latency, args.concurrency)
+    else:
+        bench_ingest(args.rows, args.batch_size)
@@ -0,0 +1,300 @@
+"""
+This module exports the weather table to partitioned columnar files and reads them back.
+
+The `ColumnarStore` class writes one partition per station and year, in Hive-style
+`station_id=<id>/year=<year>/` directories, so other tools can load the data without
+SQLite. When `pyarrow` is installed each partition is a Parquet file; otherwise it is
+a set of NumPy `.npy` files, one per column. Reads prune partitions by station and year
+from the directory names, then push the date range down into the files: Parquet row
+group statistics skip unneeded groups, and the sorted `.npy` columns are memory-mapped
+and sliced, so only the pages holding the requested days are read.
+
+Usage:
+    python columnar_store.py export weather_data.db weather_columns [--verify]
+    python columnar_store.py import weather_data.db weather_columns
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from collections import namedtuple
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional
+    pa = None
+
+WeatherColumns = namedtuple("WeatherColumns", ["station_id", "date", "min_temp", "max_temp", "avg_temp"])
+
+_TEMPERATURE_COLUMNS = ("min_temp", "max_temp", "avg_temp")
+_PARQUET_FILE = "part-0.parquet"
+
+
+def _epoch_day(value):
+    """
+    Convert a date to days since 1970-01-01.
+    :param value: A date in YYYY-MM-DD format, or a datetime.date.
+    :return: The day number as an int.
+    """
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def _none_if_nan(value):
+    """
+    Convert a NaN temperature back to None, as stored in SQLite.
+    :param value: A float.
+    :return: The float, or None if it is NaN.
+    """
+    return None if value != value else float(value)
+
+
+class ColumnarStore:
+    """
+    A directory of weather data partitioned by station and year in a columnar format.
+
+    Attributes:
+        root (str): The directory holding the partitions.
+        file_format (str): The format new partitions are written in, "parquet" or "npy".
+
+    Methods:
+        export(db_operations, station_ids=None):
+            Writes the weather rows of the given stations from a database.
+
+        import_into(db_operations, on_conflict="update"):
+            Loads every partition into a database.
+
+        fetch_columns(start_date, end_date, station_ids):
+            Reads a date range as NumPy column arrays.
+
+        fetch_data(start_date, end_date, station_id):
+            Reads a date range as rows shaped like DBOperations.fetch_data.
+
+        verify(db_operations):
+            Compares the stored records with a database.
+    """
+    def __init__(self, root, file_format=None):
+        """
+        Initialize the store.
+        :param root: The directory holding the partitions.
+        :param file_format: "parquet" or "npy", defaulting to Parquet when pyarrow is installed.
+        :raises ValueError: If the format is unknown, or Parquet is requested without pyarrow.
+        """
+        file_format = file_format or ("parquet" if pa is not None else "npy")
+        if file_format not in ("parquet", "npy"):
+            raise ValueError(f"Unknown columnar format: {file_format}")
+        if file_format == "parquet" and pa is None:
+            raise ValueError("The parquet format needs pyarrow to be installed.")
+        self.root = root
+        self.file_format = file_format
+
+    def _partition_dir(self, station_id, year):
+        """
+        Build the directory of a partition.
+        :param station_id: The station of the partition.
+        :param year: The year of the partition.
+        :return: The directory path.
+        """
+        return os.path.join(self.root, f"station_id={station_id}", f"year={year}")
+
+    def partitions(self, station_ids=None, first_year=None, last_year=None):
+        """
+        List the partitions, pruned by station and year from the directory names.
+        :param station_ids: The stations to keep, or None for all of them.
+        :param first_year: The first year to keep, or None.
+        :param last_year: The last year to keep, or None.
+        :return: A sorted list of (station_id, year) tuples.
+        """
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for station_name in os.listdir(self.root):
+            if not station_name.startswith("station_id="):
+                continue
+            station_id = int(station_name.split("=", 1)[1])
+            if station_ids is not None and station_id not in station_ids:
+                continue
+            for year_name in os.listdir(os.path.join(self.root, station_name)):
+                if not year_name.startswith("year="):
+                    continue
+                year = int(year_name.split("=", 1)[1])
+                if (first_year is None or year >= first_year) and (last_year is None or year <= last_year):
+                    found.append((station_id, year))
+        return sorted(found)
+
+    def _write_partition(self, station_id, year, epoch_days, temperatures):
+        """
+        Write one partition.
+        :param station_id: The station of the partition.
+        :param year: The year of the partition.
+        :param epoch_days: The sorted int64 array of days since 1970-01-01.
+        :param temperatures: A dictionary of float64 arrays for each temperature column.
+        """
+        directory = self._partition_dir(station_id, year)
+        os.makedirs(directory, exist_ok=True)
+        if self.file_format == "parquet":
+            table = pa.table({"epoch_day": pa.array(epoch_days, pa.int32()),
+                              **{name: pa.array(values, mask=np.isnan(values))
+                                 for name, values in temperatures.items()}})
+            pq.write_table(table, os.path.join(directory, _PARQUET_FILE))
+        else:
+            np.save(os.path.join(directory, "epoch_day.npy"), epoch_days.astype(np.int32))
+            for name, values in temperatures.items():
+                np.save(os.path.join(directory, f"{name}.npy"), values)
+
+    def _read_partition(self, station_id, year, first_day, last_day):
+        """
+        Read the days of one partition within a range, in whichever format it was written.
+        :param station_id: The station of the partition.
+        :param year: The year of the partition.
+        :param first_day: The first epoch day to read.
+        :param last_day: The last epoch day to read.
+        :return: A tuple of (epoch day array, dictionary of temperature arrays).
+        """
+        directory = self._partition_dir(station_id, year)
+        parquet_path = os.path.join(directory, _PARQUET_FILE)
+        if os.path.exists(parquet_path):
+            if pa is None:
+                raise ValueError("Reading parquet partitions needs pyarrow to be installed.")
+            table = pq.read_table(parquet_path, memory_map=True,
+                                  filters=[("epoch_day", ">=", first_day), ("epoch_day", "<=", last_day)])
+            epoch_days = table.column("epoch_day").to_numpy().astype(np.int64)
+            return epoch_days, {name: table.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+                                for name in _TEMPERATURE_COLUMNS}
+
+        epoch_days = np.load(os.path.join(directory, "epoch_day.npy"), mmap_mode="r")
+        start = np.searchsorted(epoch_days, first_day, side="left")
+        stop = np.searchsorted(epoch_days, last_day, side="right")
+        return (np.array(epoch_days[start:stop], dtype=np.int64),
+                {name: np.array(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")[start:stop])
+                 for name in _TEMPERATURE_COLUMNS})
+
+    def export(self, db_operations, station_ids=None):
+        """
+        Write the weather rows of the given stations, replacing their existing partitions.
+        :param db_operations: The DBOperations of the source database.
+        :param station_ids: The stations to export, or None for every station in the database.
+        :return: The number of rows written.
+        """
+        total = 0
+        for station_id in station_ids or db_operations.list_stations():
+            shutil.rmtree(os.path.join(self.root, f"station_id={station_id}"), ignore_errors=True)
+            columns = db_operations.fetch_columns("0001-01-01", "9999-12-31", station_id)
+            epoch_days = columns.date.astype(np.int64)
+            years = columns.date.astype("datetime64[Y]").astype(np.int64) + 1970
+            bounds = [0, *(np.flatnonzero(np.diff(years)) + 1), len(years)]
+            for start, stop in zip(bounds, bounds[1:]):
+                if start == stop:
+                    continue
+                self._write_partition(station_id, int(years[start]), epoch_days[start:stop],
+                                      {name: getattr(columns, name)[start:stop] for name in _TEMPERATURE_COLUMNS})
+            total += len(epoch_days)
+        return total
+
+    def fetch_columns(self, start_date, end_date, station_ids):
+        """
+        Read a date range as NumPy column arrays.
+        :param start_date: The start date in YYYY-MM-DD format, or a datetime.date.
+        :param end_date: The end date in YYYY-MM-DD format, or a datetime.date.
+        :param station_ids: A station ID or a list of them.
+        :return: A WeatherColumns tuple sorted by station and date.
+        """
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        first_day, last_day = _epoch_day(start_date), _epoch_day(end_date)
+        first_year = int(np.datetime64(start_date, "Y").astype(np.int64)) + 1970
+        last_year = int(np.datetime64(end_date, "Y").astype(np.int64)) + 1970
+
+        stations, days, temperatures = [], [], {name: [] for name in _TEMPERATURE_COLUMNS}
+        for station_id, year in self.partitions(set(station_ids), first_year, last_year):
+            epoch_days, values = self._read_partition(station_id, year, first_day, last_day)
+            stations.append(np.full(len(epoch_days), station_id, dtype=np.int64))
+            days.append(epoch_days)
+            for name in _TEMPERATURE_COLUMNS:
+                temperatures[name].append(values[name])
+
+        def join(arrays, dtype):
+            return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+        return WeatherColumns(station_id=join(stations, np.int64),
+                              date=join(days, np.int64).astype("datetime64[D]"),
+                              **{name: join(arrays, np.float64) for name, arrays in temperatures.items()})
+
+    def fetch_data(self, start_date, end_date, station_id):
+        """
+        Read a date range as rows shaped like DBOperations.fetch_data.
+        :param start_date: The start date in YYYY-MM-DD format.
+        :param end_date: The end date in YYYY-MM-DD format.
+        :param station_id: The station to read.
+        :return: A list of (sample_date, min_temp, max_temp, avg_temp) tuples, None where missing.
+        """
+        columns = self.fetch_columns(start_date, end_date, station_id)
+        return [(sample_date, _none_if_nan(min_temp), _none_if_nan(max_temp), _none_if_nan(avg_temp))
+                for sample_date, min_temp, max_temp, avg_temp in zip(
+                    columns.date.astype(str).tolist(), columns.min_temp.tolist(),
+                    columns.max_temp.tolist(), columns.avg_temp.tolist())]
+
+    def _iter_rows(self):
+        """
+        Read every partition as weather rows.
+        :return: A generator of (station_id, sample_date, min_temp, max_temp, avg_temp) tuples.
+        """
+        for station_id, year in self.partitions():
+            for row in self.fetch_data(f"{year}-01-01", f"{year}-12-31", station_id):
+                yield (station_id, *row)
+
+    def import_into(self, db_operations, on_conflict="update"):
+        """
+        Load every partition into a database.
+        :param db_operations: The DBOperations of the target database.
+        :param on_conflict: "update" to overwrite existing days, or "ignore" to keep them.
+        :return: The number of rows loaded.
+        """
+        return db_operations.bulk_insert(self._iter_rows(), on_conflict=on_conflict)
+
+    def verify(self, db_operations):
+        """
+        Compare the stored records with a database, station by station.
+        :param db_operations: The DBOperations of the database to compare with.
+        :return: The stations whose records differ, in either direction.
+        """
+        stations = set(db_operations.list_stations()) | {station_id for station_id, _ in self.partitions()}
+        return [station_id for station_id in sorted(stations)
+                if db_operations.fetch_data("0001-01-01", "9999-12-31", station_id)
+                != self.fetch_data("0001-01-01", "9999-12-31", station_id)]
+
+
+def main():
+    """
+    Export a database to columnar files, or import them, from the command line.
+    """
+    # Imported here because db_operations imports this module
+    from db_operations import DBOperations
+
+    parser = argparse.ArgumentParser(description="Export or import partitioned columnar weather data.")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("db_name", help="The SQLite database file.")
+    parser.add_argument("root", help="The directory of columnar partitions.")
+    parser.add_argument("--format", choices=["parquet", "npy"], help="The file format (default: parquet if available).")
+    parser.add_argument("--verify", action="store_true", help="Check that both sides hold identical records.")
+    args = parser.parse_args()
+
+    db = DBOperations(args.db_name)
+    db.initialize_db()
+    store = ColumnarStore(args.root, args.format)
+    if args.action == "export":
+        print(f"Exported {store.export(db)} rows to {args.root} ({store.file_format}).")
+    else:
+        print(f"Imported {store.import_into(db)} rows from {args.root}.")
+
+    if args.verify:
+        mismatched = store.verify(db)
+        print(f"Stations with differing records: {mismatched or 'none'}")
+        if mismatched:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
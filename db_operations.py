@@ -2,16 +2,80 @@
 This module provides database operations for managing weather data in an SQLite database.
 
 The `DBOperations` class offers methods to:
-- Initialize the database schema.
-- Insert weather data into the database while avoiding duplicates.
-- Fetch weather data for a specified date range.
+- Initialize the database schema, migrating databases created by older versions.
+- Insert weather data for a station into the database while avoiding duplicates.
+- Bulk ingest large numbers of rows in batches inside a single transaction.
+- Fetch weather data for a station and a specified date range, as rows or NumPy columns.
+- Track which months of each station are complete, and checkpoint streaming backfills.
+- Keep the monthly temperature rollups and each station's data version up to date.
 - Purge all data from the database while retaining its structure.
 
+Rows are keyed by (station_id, sample_date) and also store their date as integer
+sample_year, sample_month and epoch_day columns, so date filters are index range scans.
+
 It is designed to work with an SQLite database and employs
 a context manager for database connections.
 """
 
+from itertools import islice
+import numpy as np
+from columnar_store import ColumnarStore, WeatherColumns
 from dbcm import DBCM
+from instrumentation import count, span, traced
+from record_store import WeatherRecordStore
+from rollup_operations import RollupOperations
+from stations import DEFAULT_STATION_ID
+
+SCHEMA_VERSION = 5
+
+_WEATHER_COLUMNS = "station_id, sample_date, min_temp, max_temp, avg_temp"
+_DATE_KEY_COLUMNS = "sample_year, sample_month, epoch_day"
+_UPDATE_ON_CONFLICT = """
+ON CONFLICT (station_id, sample_date) DO UPDATE SET
+    min_temp = excluded.min_temp,
+    max_temp = excluded.max_temp,
+    avg_temp = excluded.avg_temp
+"""
+# Answered from the covering idx_weather_station_days index alone, one range per station
+COLUMNS_QUERY = """
+SELECT station_id, epoch_day, min_temp, max_temp, avg_temp FROM weather
+WHERE station_id IN ({stations}) AND epoch_day BETWEEN ? AND ?
+ORDER BY station_id, epoch_day;
+"""
+_INDEXES = {
+    "idx_weather_station_month": "weather (station_id, sample_year, sample_month, sample_date, avg_temp)",
+    "idx_weather_station_days": "weather (station_id, epoch_day, min_temp, max_temp, avg_temp)",
+}
+# Indexes of older schema versions, replaced by the ones above
+_OLD_INDEXES = ["idx_weather_station_epoch"]
+
+
+def _date_keys_sql(date_expression):
+    """
+    Build the SQL expressions that derive the integer date keys from a YYYY-MM-DD value.
+
+    :param date_expression: The SQL expression holding the date, such as a column or parameter.
+    :return: SQL for the sample_year, sample_month and epoch_day values, comma separated.
+    """
+    return (f"CAST(substr({date_expression}, 1, 4) AS INTEGER), "
+            f"CAST(substr({date_expression}, 6, 2) AS INTEGER), "
+            f"CAST(julianday({date_expression}) - 2440587.5 AS INTEGER)")
+
+
+def iter_weather_rows(weather_data, station_id=DEFAULT_STATION_ID):
+    """
+    Turn a dictionary of weather data into rows for DBOperations.bulk_insert.
+
+    :param weather_data: A dictionary or WeatherRecordStore containing date and weather data.
+    :param station_id: The station the weather data was recorded at.
+    :return: A generator of (station_id, sample_date, min_temp, max_temp, avg_temp) tuples.
+    """
+    if isinstance(weather_data, WeatherRecordStore):
+        yield from weather_data.iter_rows(station_id)
+        return
+    for date, data in weather_data.items():
+        yield station_id, date, data.get('Min'), data.get('Max'), data.get('Mean')
+
 
 class DBOperations:
     """
@@ -25,80 +89,461 @@ class DBOperations:
 
     Attributes:
         db_name (str): The name of the SQLite database file.
+        rollups (RollupOperations): The monthly rollups maintained alongside the weather table.
+        columnar_dir (str): The directory of a columnar export used by the "columnar" source.
 
     Methods:
         initialize_db():
             Initializes the database schema by creating the required table
               if it doesn't already exist.
 
-        save_data(weather_data):
-            Saves weather data to the database, ensuring no duplicate entries.
+        save_data(weather_data, station_id=DEFAULT_STATION_ID):
+            Saves weather data for a station to the database, ensuring no duplicate entries.
+
+        bulk_insert(rows, batch_size=10000, on_conflict="ignore", use_staging=False):
+            Inserts rows in batches inside a single transaction.
+
+        fetch_data(start_date, end_date, station_id=DEFAULT_STATION_ID, source="sqlite"):
+            Retrieves weather data for a station from the database within a specified date range.
+
+        fetch_columns(start_date, end_date, station_ids=DEFAULT_STATION_ID, source="sqlite"):
+            Retrieves weather data for one or more stations as NumPy column arrays.
+
+        list_stations():
+            Returns the IDs of all stations that have data in the database.
 
-        fetch_data(start_date, end_date):
-            Retrieves weather data from the database within a specified date range.
+        month_day_counts(start_date, end_date, station_id=DEFAULT_STATION_ID):
+            Counts the stored days of each month in a date range.
+
+        complete_months(station_id=DEFAULT_STATION_ID):
+            Returns the months recorded as complete for a station.
+
+        record_month_status(statuses, station_id=DEFAULT_STATION_ID):
+            Records how many days each month has and whether it is complete.
+
+        get_checkpoint(station_id, start_date):
+            Returns the progress of a station's backfill.
+
+        save_checkpoint(station_id, start_date, end_date, next_month):
+            Records the progress of a station's backfill.
+
+        explain_query_plan(query, params=()):
+            Returns SQLite's query plan for a query.
 
         purge_data():
             Deletes all records from the database while keeping the schema intact.
     """
-    def __init__(self, db_name="weather_data.db"):
+    def __init__(self, db_name="weather_data.db", columnar_dir=None):
         """
         Initialize the DBOperations with the database name.
         :param db_name: The name of the SQLite database file.
+        :param columnar_dir: The directory of a columnar export used by the "columnar" source.
         """
         self.db_name = db_name
+        self.rollups = RollupOperations(db_name)
+        self.columnar_dir = columnar_dir
 
     def initialize_db(self):
         """
-        Initialize the database with the necessary table if it doesn't already exist.
+        Initialize the database with the necessary table if it doesn't already exist,
+        and migrate tables created by older versions:
+        - Version 0 tables, without stations, are rebuilt and their rows given the default station.
+        - Version 1 tables gain the integer date key columns, filled in from sample_date.
+        - Version 2 databases gain the monthly rollups, built from the existing rows.
+        - Version 3 databases gain the data version tables.
+        - Version 4 databases have their (station_id, epoch_day) index replaced by a covering one.
         """
         create_table_sql = """
         CREATE TABLE IF NOT EXISTS weather (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sample_date TEXT UNIQUE,
+            station_id INTEGER NOT NULL DEFAULT {default_station},
+            sample_date TEXT NOT NULL,
             min_temp REAL,
             max_temp REAL,
-            avg_temp REAL
+            avg_temp REAL,
+            sample_year INTEGER,
+            sample_month INTEGER,
+            epoch_day INTEGER,
+            UNIQUE (station_id, sample_date)
+        );
+        """.format(default_station=DEFAULT_STATION_ID)
+        create_month_status_sql = """
+        CREATE TABLE IF NOT EXISTS month_status (
+            station_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            days_present INTEGER NOT NULL,
+            days_expected INTEGER NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 0,
+            checked_at TEXT NOT NULL,
+            PRIMARY KEY (station_id, year, month)
+        );
+        """
+        create_checkpoints_sql = """
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            station_id INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            next_month TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (station_id, start_date)
+        );
+        """
+        create_jobs_sql = """
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            station_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            record_count INTEGER,
+            fetched_at TEXT,
+            claimed_by TEXT,
+            claimed_at REAL,
+            PRIMARY KEY (station_id, year, month)
+        );
+        """
+        create_meta_sql = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        """
+        create_station_versions_sql = """
+        CREATE TABLE IF NOT EXISTS station_versions (
+            station_id INTEGER PRIMARY KEY,
+            data_version INTEGER NOT NULL
         );
         """
         with DBCM(self.db_name) as cursor:
-            cursor.execute(create_table_sql)
+            cursor.execute("PRAGMA table_info(weather);")
+            columns = [row[1] for row in cursor.fetchall()]
+
+            if columns and "station_id" not in columns:
+                # Rows saved before stations were tracked all belong to the default station
+                cursor.execute("ALTER TABLE weather RENAME TO weather_legacy;")
+                cursor.execute(create_table_sql)
+                cursor.execute(f"""
+                INSERT OR IGNORE INTO weather ({_WEATHER_COLUMNS}, {_DATE_KEY_COLUMNS})
+                SELECT {DEFAULT_STATION_ID}, sample_date, min_temp, max_temp, avg_temp,
+                       {_date_keys_sql("sample_date")}
+                FROM weather_legacy ORDER BY id;
+                """)
+                cursor.execute("DROP TABLE weather_legacy;")
+            elif columns and "epoch_day" not in columns:
+                for column in _DATE_KEY_COLUMNS.split(", "):
+                    cursor.execute(f"ALTER TABLE weather ADD COLUMN {column} INTEGER;")
+                cursor.execute(f"""
+                UPDATE weather SET ({_DATE_KEY_COLUMNS}) = ({_date_keys_sql("sample_date")});
+                """)
+            else:
+                cursor.execute(create_table_sql)
+
+            for index_name in _OLD_INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+            for index_name, definition in _INDEXES.items():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition};")
+            cursor.execute(create_month_status_sql)
+            cursor.execute(create_checkpoints_sql)
+            cursor.execute(create_jobs_sql)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, year, month);")
+            cursor.execute(create_meta_sql)
+            cursor.execute(create_station_versions_sql)
+            self.rollups.initialize_db()
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
 
-    def save_data(self, weather_data):
+    def save_data(self, weather_data, station_id=DEFAULT_STATION_ID):
         """
         Save weather data to the database, ensuring no duplicates.
         :param weather_data: A dictionary containing date and weather data.
+        :param station_id: The station the weather data was recorded at.
         """
-        insert_sql = """
-        INSERT OR IGNORE INTO weather (sample_date, min_temp, max_temp, avg_temp)
-        VALUES (?, ?, ?, ?);
+        self.bulk_insert(iter_weather_rows(weather_data, station_id))
+
+    @traced("db.bulk_insert")
+    def bulk_insert(self, rows, batch_size=10000, on_conflict="ignore", use_staging=False):
+        """
+        Insert rows in batches with executemany, all inside a single transaction.
+
+        Pooled connections run in WAL mode with synchronous=NORMAL, which keeps the
+        database safe while avoiding an fsync on every commit. The rollups of every
+        month the rows fall in are refreshed, and the data versions of their stations
+        bumped, in the same transaction.
+
+        :param rows: An iterable of (station_id, sample_date, min_temp, max_temp, avg_temp) tuples.
+            Generators are consumed one batch at a time.
+        :param batch_size: The number of rows sent to each executemany call.
+        :param on_conflict: "ignore" to keep existing rows, or "update" to overwrite their temperatures.
+        :param use_staging: Load the rows into a temporary staging table first and merge
+            them into the weather table with a single INSERT ... SELECT.
+        :return: The number of rows processed.
+        :raises ValueError: If on_conflict is not "ignore" or "update".
+        """
+        if on_conflict not in ("ignore", "update"):
+            raise ValueError(f"Unknown conflict policy: {on_conflict}")
+
+        or_ignore = "OR IGNORE" if on_conflict == "ignore" else ""
+        upsert = _UPDATE_ON_CONFLICT if on_conflict == "update" else ""
+        if use_staging:
+            insert_sql = f"INSERT INTO weather_staging ({_WEATHER_COLUMNS}) VALUES (?, ?, ?, ?, ?);"
+        else:
+            insert_sql = f"""
+            INSERT {or_ignore} INTO weather ({_WEATHER_COLUMNS}, {_DATE_KEY_COLUMNS})
+            VALUES (?1, ?2, ?3, ?4, ?5, {_date_keys_sql("?2")}) {upsert};
+            """
+
+        total = 0
+        touched = set()
+        rows = iter(rows)
+        with DBCM(self.db_name) as cursor:
+            if use_staging:
+                cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS weather_staging (
+                    station_id INTEGER, sample_date TEXT, min_temp REAL, max_temp REAL, avg_temp REAL
+                );
+                """)
+                cursor.execute("DELETE FROM weather_staging;")
+
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                cursor.executemany(insert_sql, batch)
+                touched.update((row[0], row[1][:7]) for row in batch)
+                total += len(batch)
+
+            if use_staging:
+                # WHERE true keeps the ON CONFLICT clause from being parsed as a join constraint
+                cursor.execute(f"""
+                INSERT {or_ignore} INTO weather ({_WEATHER_COLUMNS}, {_DATE_KEY_COLUMNS})
+                SELECT {_WEATHER_COLUMNS}, {_date_keys_sql("sample_date")}
+                FROM weather_staging WHERE true {upsert};
+                """)
+                cursor.execute("DROP TABLE weather_staging;")
+
+            with span("db.refresh_rollups"):
+                self.rollups.refresh((station_id, int(month[:4]), int(month[5:7]))
+                                     for station_id, month in touched)
+            if touched:
+                self._bump_data_version(cursor, {station_id for station_id, _ in touched})
+        count("db.rows_written", total)
+        return total
+
+    def _bump_data_version(self, cursor, station_ids):
+        """
+        Give stations a new data version, taken from a database-wide counter.
+        :param cursor: The cursor of the transaction that changed the stations' data.
+        :param station_ids: The stations whose data changed.
+        """
+        cursor.execute("""
+        INSERT INTO meta (key, value) VALUES ('data_version', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1 RETURNING value;
+        """)
+        version = cursor.fetchone()[0]
+        cursor.executemany("INSERT OR REPLACE INTO station_versions (station_id, data_version) VALUES (?, ?);",
+                           [(station_id, version) for station_id in station_ids])
+
+    def data_versions(self, station_ids=DEFAULT_STATION_ID):
         """
+        Fetch the data versions of stations.
+
+        A station's version changes whenever its rows are inserted, updated or purged,
+        by this process or any other, so it can key caches of results computed from them.
+
+        :param station_ids: A station ID or a list of them.
+        :return: A tuple of versions in the order of station_ids, 0 for stations never changed.
+        """
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        station_ids = list(station_ids)
         with DBCM(self.db_name) as cursor:
-            for date, data in weather_data.items():
-                min_temp = data.get('Min')
-                max_temp = data.get('Max')
-                avg_temp = data.get('Mean')
-                cursor.execute(insert_sql, (date, min_temp, max_temp, avg_temp))
+            cursor.execute(f"""
+            SELECT station_id, data_version FROM station_versions
+            WHERE station_id IN ({", ".join("?" * len(station_ids))});
+            """, station_ids)
+            versions = dict(cursor.fetchall())
+        return tuple(versions.get(station_id, 0) for station_id in station_ids)
 
-    def fetch_data(self, start_date, end_date):
+    def _columnar_store(self, source):
+        """
+        Return the columnar store for a fetch, or None when the fetch reads SQLite.
+        :param source: "sqlite" or "columnar".
+        :return: A ColumnarStore or None.
+        :raises ValueError: If the source is unknown, or "columnar" is used without a columnar_dir.
+        """
+        if source == "sqlite":
+            return None
+        if source != "columnar":
+            raise ValueError(f"Unknown data source: {source}")
+        if not self.columnar_dir:
+            raise ValueError("The columnar source needs a columnar_dir.")
+        return ColumnarStore(self.columnar_dir)
+
+    @traced("db.fetch_data")
+    def fetch_data(self, start_date, end_date, station_id=DEFAULT_STATION_ID, source="sqlite"):
         """
         Fetch data from the database within the specified date range.
         :param start_date: The start date in YYYY-MM-DD format.
         :param end_date: The end date in YYYY-MM-DD format.
+        :param station_id: The station to fetch data for.
+        :param source: "sqlite", or "columnar" to read the export in columnar_dir.
         :return: A tuple of rows containing the fetched records.
         """
+        store = self._columnar_store(source)
+        if store is not None:
+            return store.fetch_data(start_date, end_date, station_id)
+
         select_sql = """
         SELECT sample_date, min_temp, max_temp, avg_temp FROM weather
-        WHERE sample_date BETWEEN ? AND ?;
+        WHERE station_id = ? AND sample_date BETWEEN ? AND ?
+        ORDER BY sample_date;
         """
         with DBCM(self.db_name) as cursor:
-            cursor.execute(select_sql, (start_date, end_date))
+            cursor.execute(select_sql, (station_id, start_date, end_date))
             rows = cursor.fetchall()
         return rows
 
+    @traced("db.fetch_columns")
+    def fetch_columns(self, start_date, end_date, station_ids=DEFAULT_STATION_ID, source="sqlite"):
+        """
+        Fetch data within the specified date range as NumPy column arrays.
+
+        The rows are converted in one step from the cursor results: dates come from the
+        integer epoch_day column and missing temperatures become NaN.
+
+        :param start_date: The start date in YYYY-MM-DD format, or a datetime.date.
+        :param end_date: The end date in YYYY-MM-DD format, or a datetime.date.
+        :param station_ids: A station ID or a list of them.
+        :param source: "sqlite", or "columnar" to read the export in columnar_dir.
+        :return: A WeatherColumns tuple of equal-length arrays sorted by station and date:
+            station_id (int64), date (datetime64[D]) and min_temp, max_temp, avg_temp (float64).
+        """
+        store = self._columnar_store(source)
+        if store is not None:
+            return store.fetch_columns(start_date, end_date, station_ids)
+
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        station_ids = list(station_ids)
+        first_day, last_day = np.array([start_date, end_date], dtype="datetime64[D]").astype(np.int64)
+        select_sql = COLUMNS_QUERY.format(stations=", ".join("?" * len(station_ids)))
+        with DBCM(self.db_name) as cursor:
+            cursor.execute(select_sql, (*station_ids, int(first_day), int(last_day)))
+            data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 5)
+
+        return WeatherColumns(station_id=data[:, 0].astype(np.int64),
+                              date=data[:, 1].astype(np.int64).astype("datetime64[D]"),
+                              min_temp=data[:, 2], max_temp=data[:, 3], avg_temp=data[:, 4])
+
+    def list_stations(self):
+        """
+        List the stations that have data in the database.
+        :return: A list of station IDs.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("SELECT DISTINCT station_id FROM weather ORDER BY station_id;")
+            return [station_id for (station_id,) in cursor.fetchall()]
+
+    def month_day_counts(self, start_date, end_date, station_id=DEFAULT_STATION_ID):
+        """
+        Count the stored days of each month within the specified date range.
+        :param start_date: The start date in YYYY-MM-DD format.
+        :param end_date: The end date in YYYY-MM-DD format.
+        :param station_id: The station to count days for.
+        :return: A dictionary mapping (year, month) to the number of stored days.
+        """
+        select_sql = """
+        SELECT sample_year, sample_month, COUNT(*) FROM weather
+        WHERE station_id = ? AND sample_year BETWEEN ? AND ? AND sample_date BETWEEN ? AND ?
+        GROUP BY sample_year, sample_month;
+        """
+        params = (station_id, int(start_date[:4]), int(end_date[:4]), start_date, end_date)
+        with DBCM(self.db_name) as cursor:
+            cursor.execute(select_sql, params)
+            rows = cursor.fetchall()
+        return {(year, month): count for year, month, count in rows}
+
+    def complete_months(self, station_id=DEFAULT_STATION_ID):
+        """
+        Fetch the months recorded as complete for a station.
+        :param station_id: The station to check.
+        :return: A set of (year, month) tuples.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("SELECT year, month FROM month_status WHERE station_id = ? AND complete = 1;",
+                           (station_id,))
+            return set(cursor.fetchall())
+
+    def record_month_status(self, statuses, station_id=DEFAULT_STATION_ID):
+        """
+        Record how many days each month has and whether it is complete.
+        :param statuses: An iterable of (year, month, days_present, days_expected, complete) tuples.
+        :param station_id: The station the months belong to.
+        """
+        insert_sql = """
+        INSERT OR REPLACE INTO month_status
+            (station_id, year, month, days_present, days_expected, complete, checked_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'));
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.executemany(insert_sql, [(station_id, year, month, present, expected, int(complete))
+                                            for year, month, present, expected, complete in statuses])
+
+    def get_checkpoint(self, station_id, start_date):
+        """
+        Fetch the progress of a station's backfill.
+        :param station_id: The station being backfilled.
+        :param start_date: The first date of the backfill in YYYY-MM-DD format.
+        :return: A tuple of (end date, next month to fetch or None if finished), or None if never started.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            SELECT end_date, next_month FROM scrape_checkpoints WHERE station_id = ? AND start_date = ?;
+            """, (station_id, start_date))
+            return cursor.fetchone()
+
+    def save_checkpoint(self, station_id, start_date, end_date, next_month):
+        """
+        Record the progress of a station's backfill.
+
+        Call this inside the same DBCM block as the insert of the month it follows,
+        so the checkpoint is committed together with the data.
+
+        :param station_id: The station being backfilled.
+        :param start_date: The first date of the backfill in YYYY-MM-DD format.
+        :param end_date: The last date of the backfill in YYYY-MM-DD format.
+        :param next_month: The first day of the next month to fetch, or None once the backfill is finished.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            INSERT OR REPLACE INTO scrape_checkpoints (station_id, start_date, end_date, next_month, updated_at)
+            VALUES (?, ?, ?, ?, datetime('now'));
+            """, (station_id, start_date, end_date, next_month))
+
+    def explain_query_plan(self, query, params=()):
+        """
+        Return SQLite's query plan for a query.
+        :param query: The SQL query to explain.
+        :param params: Parameters for the SQL query.
+        :return: A list of plan detail strings, one per plan step.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
     def purge_data(self):
         """
         Purge all data from the database but keep the schema intact.
+        Every station that had data is given a new data version.
         """
         delete_sql = "DELETE FROM weather;"
         with DBCM(self.db_name) as cursor:
+            cursor.execute("SELECT station_id FROM station_versions UNION SELECT DISTINCT station_id FROM weather;")
+            station_ids = [station_id for (station_id,) in cursor.fetchall()]
             cursor.execute(delete_sql)
+            cursor.execute("DELETE FROM month_status;")
+            cursor.execute("DELETE FROM scrape_checkpoints;")
+            cursor.execute("DELETE FROM scrape_jobs;")
+            self.rollups.purge()
+            self._bump_data_version(cursor, station_ids)
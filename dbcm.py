@@ -4,27 +4,183 @@ This module provides a context manager class for managing SQLite database connec
 The `DBCM` (Database Context Manager) class simplifies database operations by
 automatically handling connection setup, cursor creation, and cleanup upon
 completion of a database transaction or operation.
+
+Each thread keeps one connection per database file in a `ConnectionPool`. Nested `DBCM`
+blocks in the same thread share one transaction, committed or rolled back by the outermost
+block. A forked process starts with fresh pools and never touches its parent's connections.
 """
 
+import os
 import sqlite3
+import threading
+import time
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+}
+
+
+class ConnectionPool:
+    """
+    A pool of per-thread SQLite connections to one database file.
+
+    Every thread reuses a single connection, so a connection is never shared between
+    threads while in use. Connections left behind by threads that have exited are
+    closed the next time a new connection is opened.
+
+    Attributes:
+        db_name (str): The name of the SQLite database file.
+        pragmas (dict): The pragmas applied to each new connection.
+        cached_statements (int): The size of each connection's prepared-statement cache.
+    """
+    def __init__(self, db_name, pragmas=None, cached_statements=256):
+        """
+        Initialize the pool.
+        :param db_name: The name of the SQLite database file.
+        :param pragmas: The pragmas applied to each new connection, defaulting to DEFAULT_PRAGMAS.
+        :param cached_statements: The size of each connection's prepared-statement cache.
+        """
+        self.db_name = db_name
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._stats = {"opened": 0, "acquires": 0, "acquire_seconds": 0.0, "max_acquire_seconds": 0.0}
+
+    def _open(self):
+        """
+        Open a connection for the calling thread and apply the pragmas.
+        :return: The new connection.
+        """
+        connection = sqlite3.connect(self.db_name, cached_statements=self.cached_statements,
+                                     check_same_thread=False)
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value};")
+
+        alive = {thread.ident for thread in threading.enumerate()}
+        with self._lock:
+            for ident in [ident for ident in self._connections if ident not in alive]:
+                self._connections.pop(ident).close()
+            self._connections[threading.get_ident()] = connection
+            self._stats["opened"] += 1
+        return connection
+
+    def acquire(self):
+        """
+        Return the calling thread's connection, opening it on first use.
+        :return: A sqlite3 connection.
+        """
+        start = time.perf_counter()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._open()
+            self._local.depth = 0
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["acquires"] += 1
+            self._stats["acquire_seconds"] += elapsed
+            self._stats["max_acquire_seconds"] = max(self._stats["max_acquire_seconds"], elapsed)
+        return connection
+
+    def close_thread(self):
+        """
+        Close the calling thread's connection, if it has one.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            self._local.connection = None
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+            connection.close()
+
+    def close_all(self):
+        """
+        Close every connection in the pool. Only call this when no thread is using the pool.
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def stats(self):
+        """
+        Return a snapshot of the pool instrumentation.
+        :return: A dictionary with open connections, connections opened, acquires and acquire times.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = len(self._connections)
+        stats["mean_acquire_seconds"] = stats["acquire_seconds"] / stats["acquires"] if stats["acquires"] else 0.0
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# The parent's connections in a forked child, kept referenced so they are never closed there
+_inherited_pools = []
+
+
+def _reset_after_fork():
+    """
+    Replace the pools inherited from the parent process with empty ones, in a forked child.
+    """
+    global _pools_lock
+    _inherited_pools.extend(_pools.values())
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_pool(db_name):
+    """
+    Return the connection pool for a database file, creating it on first use.
+    :param db_name: The name of the SQLite database file.
+    :return: The ConnectionPool for the file.
+    """
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name)
+        return pool
+
 
 class DBCM:
     """
     A context manager class for managing SQLite database connections.
 
     The `DBCM` class automates the management of SQLite database connections,
-    including opening a connection, creating a cursor for executing queries,
-    committing changes, and closing the connection.
+    including borrowing the thread's pooled connection, creating a cursor for
+    executing queries, and committing or rolling back changes.
 
     Attributes:
         db_name (str): The name of the SQLite database file.
 
     Methods:
         __enter__():
-            Establishes the database connection and returns a cursor for executing queries.
+            Acquires the pooled connection and returns a cursor for executing queries.
 
         __exit__(exc_type, exc_value, traceback):
-            Commits any changes if no exceptions occurred and closes the database connection.
+            Commits any changes if no exceptions occurred, or rolls them back otherwise.
+
+        close_thread():
+            Closes the calling thread's connections to every database.
+
+        close_all(db_name=None):
+            Closes all pooled connections, to one database or to all of them.
+
+        stats(db_name):
+            Returns the pool instrumentation for a database.
     """
     def __init__(self, db_name):
         """
@@ -35,16 +191,54 @@ class DBCM:
 
     def __enter__(self):
         """
-        Establish the database connection and return a cursor for querying.
+        Acquire the thread's pooled connection and return a cursor for querying.
         """
-        self.connection = sqlite3.connect(self.db_name)
+        self.pool = get_pool(self.db_name)
+        self.connection = self.pool.acquire()
+        self.pool._local.depth += 1
         self.cursor = self.connection.cursor()
         return self.cursor
 
     def __exit__(self, exc_type, exc_value, traceback):
         """
-        Commit any changes and close the connection when the context ends.
+        Commit any changes when the outermost block ends, or roll them back on an exception.
+        The connection stays open in the pool.
+        """
+        self.cursor.close()
+        self.pool._local.depth -= 1
+        if self.pool._local.depth == 0:
+            if exc_type is None:
+                self.connection.commit()  # Commit if no exceptions
+            else:
+                self.connection.rollback()
+
+    @staticmethod
+    def close_thread():
+        """
+        Close the calling thread's connections to every database.
+        Long-running worker threads should call this before they exit.
+        """
+        with _pools_lock:
+            pools = list(_pools.values())
+        for pool in pools:
+            pool.close_thread()
+
+    @staticmethod
+    def close_all(db_name=None):
+        """
+        Close all pooled connections.
+        :param db_name: The database whose connections are closed, or None for every database.
+        """
+        with _pools_lock:
+            pools = [_pools[db_name]] if db_name in _pools else ([] if db_name else list(_pools.values()))
+        for pool in pools:
+            pool.close_all()
+
+    @staticmethod
+    def stats(db_name):
+        """
+        Return the pool instrumentation for a database.
+        :param db_name: The name of the SQLite database file.
+        :return: A dictionary with open connections, connections opened, acquires and acquire times.
         """
-        if exc_type is None:
-            self.connection.commit()  # Commit if no exceptions
-        self.connection.close()
+        return get_pool(db_name).stats()
@@ -0,0 +1,210 @@
+"""
+This module provides a pooled HTTP client used to download weather pages.
+
+The `HTTPClient` class wraps a persistent `requests.Session` and adds:
+- Keep-alive connection pooling shared by all threads using the client.
+- Retries with exponential backoff on 429 and 5xx responses, timeouts and connection errors.
+- An optional `AdaptiveLimiter` from `rate_control`, told the outcome of every request.
+- Conditional GETs of recently fetched pages using ETag/Last-Modified.
+- Counters for requests, connection reuses, retries, 304 responses and bytes received.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import count
+from rate_control import parse_retry_after
+
+
+class FetchError(Exception):
+    """
+    Raised when a page cannot be fetched after all retries are used up.
+    """
+
+
+class HTTPClient:
+    """
+    A thread-safe HTTP client with connection pooling, retries and conditional requests.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    THROTTLE_STATUSES = {429, 503}
+    MAX_RETRY_AFTER = 60
+
+    def __init__(self, pool_size=10, max_retries=3, backoff_factor=0.5, timeout=10, limiter=None,
+                 max_cached_pages=256):
+        """
+        Initialize the client and its connection pools.
+
+        :param pool_size: The number of keep-alive connections kept open per host.
+        :param max_retries: How many times a failed request is retried.
+        :param backoff_factor: Base delay in seconds, doubled after every retry.
+        :param timeout: Default timeout in seconds for each request.
+        :param limiter: An AdaptiveLimiter shared by every request, or None to send requests as they come.
+        :param max_cached_pages: How many recently fetched pages get_text keeps to revalidate.
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_cached_pages = max_cached_pages
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._validators = OrderedDict()
+        self._counters = {"requests": 0, "retries": 0, "not_modified": 0, "bytes": 0}
+
+    def _count(self, name, amount=1):
+        """
+        Increase one of the client counters.
+        :param name: The counter name.
+        :param amount: The amount to add.
+        """
+        with self._lock:
+            self._counters[name] += amount
+
+    def _send(self, url, headers, timeout, stream):
+        """
+        Send one GET request, holding a slot of the limiter if there is one and reporting how it went.
+        :param url: The URL to fetch.
+        :param headers: The request headers.
+        :param timeout: The timeout in seconds.
+        :param stream: Whether to leave the body unread.
+        :return: The `requests.Response`.
+        """
+        if self.limiter is None:
+            return self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+
+        sent_at = self.limiter.acquire()
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+        except requests.exceptions.Timeout:
+            self.limiter.release(sent_at, timed_out=True)
+            raise
+        except BaseException:
+            self.limiter.release(sent_at, failed=True)
+            raise
+        if response.status_code in self.THROTTLE_STATUSES:
+            self.limiter.release(sent_at, throttled=True,
+                                 retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        else:
+            self.limiter.release(sent_at)
+        return response
+
+    def fetch(self, url, etag=None, last_modified=None, timeout=None, stream=False):
+        """
+        Send a GET request, retrying 429 and 5xx responses, timeouts, connection errors and truncated bodies.
+
+        :param url: The URL to fetch.
+        :param etag: An ETag from an earlier response, sent as If-None-Match.
+        :param last_modified: A Last-Modified value from an earlier response, sent as If-Modified-Since.
+        :param timeout: The timeout in seconds, or None to use the client default.
+        :param stream: When True the body is not read up front; only its Content-Length is counted.
+        :return: The `requests.Response`, with status 200 or 304.
+        :raises FetchError: If the request still fails after all retries.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                self._count("requests")
+                response = self._send(url, headers, timeout or self.timeout, stream)
+                if response.status_code not in self.RETRY_STATUSES:
+                    response.raise_for_status()
+                    size = int(response.headers.get("Content-Length", 0)) if stream else len(response.content)
+                    self._count("bytes", size)
+                    count("http.bytes", size)
+                    if response.status_code == 304:
+                        self._count("not_modified")
+                    return response
+                kind = "Too Many Requests" if response.status_code == 429 else "Server Error"
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} {kind} for url: {url}", response=response)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                error = e
+            except requests.exceptions.RequestException as e:
+                raise FetchError(f"Failed to fetch page: {e}") from e
+
+            if attempt >= self.max_retries:
+                raise FetchError(f"Failed to fetch page: {error}") from error
+            self._count("retries")
+            count("http.retries")
+            time.sleep(max(self.backoff_factor * (2 ** attempt), min(retry_after or 0, self.MAX_RETRY_AFTER)))
+            attempt += 1
+
+    def get_text(self, url, timeout=None):
+        """
+        Return the body of a page, using a conditional GET if it is among the max_cached_pages
+        most recently fetched pages.
+
+        :param url: The URL to fetch.
+        :param timeout: The timeout in seconds, or None to use the client default.
+        :return: HTML content of the page as a string.
+        :raises FetchError: If the request fails after all retries.
+        """
+        with self._lock:
+            etag, last_modified, text = self._validators.get(url, (None, None, None))
+            if text is not None:
+                self._validators.move_to_end(url)
+
+        response = self.fetch(url, etag, last_modified, timeout)
+        if response.status_code == 304 and text is not None:
+            return text
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            with self._lock:
+                self._remember(url, etag, last_modified, response.text)
+        return response.text
+
+    def _remember(self, url, etag, last_modified, text):
+        """
+        Keep a page and its validators for get_text, dropping the least recently used page
+        past max_cached_pages. Call with the lock held.
+        :param url: The page URL.
+        :param etag: The ETag header of the response.
+        :param last_modified: The Last-Modified header of the response.
+        :param text: The page body.
+        """
+        self._validators[url] = (etag, last_modified, text)
+        self._validators.move_to_end(url)
+        while len(self._validators) > self.max_cached_pages:
+            self._validators.popitem(last=False)
+
+    def stats(self):
+        """
+        Return a snapshot of the client counters, with connection reuses taken from the urllib3 pools.
+        :return: A dictionary with requests, reuses, retries, not_modified and bytes.
+        """
+        pools = self._adapter.poolmanager.pools
+        served = opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                served += pool.num_requests
+                opened += pool.num_connections
+
+        with self._lock:
+            stats = dict(self._counters)
+        stats["reuses"] = max(served - opened, 0)
+        return stats
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self.session.close()
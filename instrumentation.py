@@ -0,0 +1,484 @@
+"""
+This module provides lightweight tracing, metrics and profiling hooks for the hot paths.
+
+Instrumentation is off by default. While it is off, `span` returns a shared no-op
+context manager and functions wrapped with `traced` only check a module flag, so the
+instrumented code runs at practically full speed. Once `enable` is called:
+- Every span records its duration in a latency histogram named after the span, and
+  spans that raise also count an `<name>.errors` event.
+- `count` adds to named counters, such as rows written or bytes downloaded, and
+  `gauge` sets named values that go up and down, such as a concurrency limit.
+- `MetricsRegistry.to_json` and `MetricsRegistry.to_prometheus` export everything
+  recorded, and `merge` folds in snapshots taken in worker processes.
+
+`capture` additionally runs cProfile, and optionally tracemalloc, around a block of code.
+cProfile only sees the thread the block runs on.
+
+The environment can switch all of this on without changing any code:
+- WEATHER_METRICS=path writes the metrics to the path when the process exits, as
+  Prometheus text if the path ends in .prom or .txt and as JSON otherwise.
+- WEATHER_PROFILE=path captures a profile of the whole process and dumps it to the
+  path at exit, for `python -m pstats path`. WEATHER_TRACEMALLOC=1 adds a memory capture.
+"""
+
+import atexit
+import cProfile
+import functools
+import inspect
+import io
+import json
+import math
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = False
+
+
+class Histogram:
+    """
+    A latency histogram with fixed buckets, so histograms from several processes can be added up.
+
+    Attributes:
+        counts (list): The number of observations in each bucket, the last one unbounded.
+        count (int): The number of observations.
+        total (float): The sum of the observations in seconds.
+        min (float): The smallest observation in seconds.
+        max (float): The largest observation in seconds.
+    """
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """
+        Record one observation.
+        :param seconds: The duration in seconds.
+        """
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in.
+        :param q: The quantile, between 0 and 1.
+        :return: The estimate in seconds, never more than the largest observation.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+        Return the histogram as a dictionary with raw bucket counts and summary statistics in milliseconds.
+        """
+        return {
+            "count": self.count,
+            "sum_seconds": self.total,
+            "min_ms": self.min * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p90_ms": self.quantile(0.9) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+            "buckets": list(self.counts),
+        }
+
+    def merge(self, data):
+        """
+        Add a histogram exported with to_dict to this one.
+        :param data: The exported histogram.
+        """
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, data["buckets"])]
+        if data["count"]:
+            self.min = min(self.min, data["min_ms"] / 1000)
+            self.max = max(self.max, data["max_ms"] / 1000)
+        self.count += data["count"]
+        self.total += data["sum_seconds"]
+
+
+class MetricsRegistry:
+    """
+    A thread-safe store of span histograms, counters and gauges.
+
+    Methods:
+        observe(name, seconds):
+            Record the duration of a span.
+
+        increment(name, amount=1):
+            Add to a counter.
+
+        set_gauge(name, value):
+            Set a gauge to its current value.
+
+        merge(snapshot):
+            Add a snapshot, for example one taken in a worker process, to the registry.
+
+        snapshot():
+            Return everything recorded as a dictionary.
+
+        to_json():
+            Return the snapshot as JSON text.
+
+        to_prometheus(namespace="weather"):
+            Return everything recorded in the Prometheus text exposition format.
+
+        write(path):
+            Write the metrics to a file.
+
+        reset():
+            Forget everything recorded.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, seconds):
+        """
+        Record the duration of a span.
+        :param name: The span name.
+        :param seconds: The duration in seconds.
+        """
+        with self._lock:
+            histogram = self._spans.get(name)
+            if histogram is None:
+                histogram = self._spans[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1):
+        """
+        Add to a counter.
+        :param name: The counter name.
+        :param amount: The amount to add.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        """
+        Set a gauge to its current value.
+        :param name: The gauge name.
+        :param value: The value.
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def merge(self, snapshot):
+        """
+        Add a snapshot taken with snapshot() to the registry.
+
+        Gauges are added up too, so the limits of several worker processes merge into their total.
+
+        :param snapshot: The snapshot dictionary.
+        """
+        with self._lock:
+            for name, data in snapshot["spans"].items():
+                self._spans.setdefault(name, Histogram()).merge(data)
+            for name, value in snapshot["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, value in snapshot.get("gauges", {}).items():
+                self._gauges[name] = self._gauges.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        Return everything recorded.
+        :return: A dictionary with a "spans" dictionary of exported histograms, and "counters" and "gauges" dictionaries.
+        """
+        with self._lock:
+            return {"spans": {name: histogram.to_dict() for name, histogram in sorted(self._spans.items())},
+                    "counters": dict(sorted(self._counters.items())),
+                    "gauges": dict(sorted(self._gauges.items()))}
+
+    def to_json(self, indent=2):
+        """
+        Return the snapshot as JSON text.
+        :param indent: The JSON indentation.
+        :return: The JSON text.
+        """
+        return json.dumps({"buckets_seconds": list(BUCKETS), **self.snapshot()}, indent=indent)
+
+    def to_prometheus(self, namespace="weather"):
+        """
+        Return everything recorded in the Prometheus text exposition format.
+
+        Spans become one histogram metric labelled by span, and every counter and gauge
+        its own metric, with dots in names replaced by underscores.
+
+        :param namespace: The prefix of every metric name.
+        :return: The exposition text.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        if snapshot["spans"]:
+            metric = f"{namespace}_span_seconds"
+            lines += [f"# HELP {metric} Duration of instrumented spans.", f"# TYPE {metric} histogram"]
+            for name, data in snapshot["spans"].items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), data["buckets"]):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {data["sum_seconds"]}')
+                lines.append(f'{metric}_count{{span="{name}"}} {data["count"]}')
+        for name, value in snapshot["counters"].items():
+            metric = f"{namespace}_{name.replace('.', '_').replace('-', '_')}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in snapshot["gauges"].items():
+            metric = f"{namespace}_{name.replace('.', '_').replace('-', '_')}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the metrics to a file.
+        :param path: The file path; .prom and .txt files get Prometheus text, anything else JSON.
+        """
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def reset(self):
+        """
+        Forget everything recorded.
+        """
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def enable():
+    """
+    Start recording spans and counters.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Stop recording spans and counters. What was recorded is kept.
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """
+    Return whether spans and counters are being recorded.
+    """
+    return _enabled
+
+
+class _NullSpan:
+    """
+    The span returned while instrumentation is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    Times a block and records it in the registry.
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        REGISTRY.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            REGISTRY.increment(f"{self.name}.errors")
+        return False
+
+
+def span(name):
+    """
+    Return a context manager timing a block as a span.
+    :param name: The span name, such as "db.bulk_insert".
+    :return: A context manager; a shared no-op one while instrumentation is disabled.
+    """
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def count(name, amount=1):
+    """
+    Add to a counter if instrumentation is enabled.
+    :param name: The counter name, such as "db.rows".
+    :param amount: The amount to add.
+    """
+    if _enabled:
+        REGISTRY.increment(name, amount)
+
+
+def gauge(name, value):
+    """
+    Set a gauge if instrumentation is enabled.
+    :param name: The gauge name, such as "rate.concurrency_limit".
+    :param value: The current value.
+    """
+    if _enabled:
+        REGISTRY.set_gauge(name, value)
+
+
+def traced(name):
+    """
+    Decorate a function or coroutine function so every call is timed as a span.
+    :param name: The span name.
+    :return: The decorator.
+    """
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await function(*args, **kwargs)
+                with _Span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Capture:
+    """
+    The results of a profiling capture.
+
+    Attributes:
+        profiler (cProfile.Profile): The profiler, or None if only memory was captured.
+        memory_peak (int): The peak traced memory in bytes, if memory was captured.
+        memory_top (list): The tracemalloc statistics of the lines that allocated the most, if memory was captured.
+    """
+    def __init__(self):
+        self.profiler = None
+        self.memory_peak = None
+        self.memory_top = []
+
+    def report(self, limit=25, sort="cumulative"):
+        """
+        Return a text report of the capture.
+        :param limit: The number of functions and allocation sites listed.
+        :param sort: The pstats sort key of the function list.
+        :return: The report text.
+        """
+        out = io.StringIO()
+        if self.profiler is not None:
+            pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        if self.memory_peak is not None:
+            out.write(f"Peak traced memory: {self.memory_peak / 2 ** 20:.1f} MiB\n")
+            for statistic in self.memory_top[:limit]:
+                out.write(f"{statistic}\n")
+        return out.getvalue()
+
+    def dump(self, path):
+        """
+        Write the profile in the binary pstats format.
+        :param path: The file path.
+        """
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
+
+
+@contextmanager
+def capture(profile=True, memory=False, limit=25):
+    """
+    Record metrics, and profile the block with cProfile and tracemalloc.
+
+    :param profile: Whether to run cProfile.
+    :param memory: Whether to trace memory allocations.
+    :param limit: The number of allocation sites kept.
+    :return: A context manager yielding a Capture, filled in when the block ends.
+    """
+    result = Capture()
+    was_enabled = _enabled
+    started_tracing = memory and not tracemalloc.is_tracing()
+    enable()
+    if started_tracing:
+        tracemalloc.start()
+    if profile:
+        result.profiler = cProfile.Profile()
+        result.profiler.enable()
+    try:
+        yield result
+    finally:
+        if profile:
+            result.profiler.disable()
+        if memory:
+            result.memory_peak = tracemalloc.get_traced_memory()[1]
+            result.memory_top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+            if started_tracing:
+                tracemalloc.stop()
+        if not was_enabled:
+            disable()
+
+
+def _configure_from_environment():
+    """
+    Turn on the instrumentation requested by the WEATHER_METRICS, WEATHER_PROFILE and WEATHER_TRACEMALLOC variables.
+    """
+    metrics_path = os.environ.get("WEATHER_METRICS")
+    profile_path = os.environ.get("WEATHER_PROFILE")
+    memory = os.environ.get("WEATHER_TRACEMALLOC", "") not in ("", "0")
+    if metrics_path:
+        enable()
+        atexit.register(REGISTRY.write, metrics_path)
+    if profile_path or memory:
+        session = capture(profile=bool(profile_path), memory=memory)
+        result = session.__enter__()
+
+        def finish():
+            session.__exit__(None, None, None)
+            if profile_path:
+                result.dump(profile_path)
+            if memory:
+                print(result.report(limit=10))
+        atexit.register(finish)
+
+
+_configure_from_environment()
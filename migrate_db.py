@@ -0,0 +1,110 @@
+"""
+This module provides a command line tool that migrates existing weather databases.
+
+It upgrades a `weather_data.db` file created by an older version of the application
+to the current schema (stations, integer date keys, covering indexes, monthly
+rollups and data versions), then prints SQLite's EXPLAIN QUERY PLAN for the queries the application
+relies on. With `--check` the tool exits with an error if any of those queries would
+scan the weather table instead of searching an index, or if the stored rollups no
+longer match the rows they summarize.
+
+Usage:
+    python migrate_db.py weather_data.db [--check]
+"""
+
+import argparse
+import sys
+from dbcm import DBCM
+from db_operations import COLUMNS_QUERY, DBOperations, SCHEMA_VERSION
+from rollup_operations import MONTHLY_ROLLUP_QUERY, RollupOperations
+from stations import DEFAULT_STATION_ID
+
+PLAN_CHECKS = {
+    "box plot": (MONTHLY_ROLLUP_QUERY, (DEFAULT_STATION_ID, 2000, 2024)),
+    "line plot": (COLUMNS_QUERY.format(stations="?"), (DEFAULT_STATION_ID, 19723, 19753)),
+    "fetch data": ("""
+        SELECT sample_date, min_temp, max_temp, avg_temp FROM weather
+        WHERE station_id = ? AND sample_date BETWEEN ? AND ? ORDER BY sample_date;
+        """, (DEFAULT_STATION_ID, "2024-01-01", "2024-12-31")),
+    "month day counts": ("""
+        SELECT sample_year, sample_month, COUNT(*) FROM weather
+        WHERE station_id = ? AND sample_year BETWEEN ? AND ? AND sample_date BETWEEN ? AND ?
+        GROUP BY sample_year, sample_month;
+        """, (DEFAULT_STATION_ID, 2000, 2024, "2000-01-01", "2024-12-31")),
+}
+
+
+def migrate(db_name):
+    """
+    Migrate a database to the current schema.
+    :param db_name: The name of the SQLite database file.
+    :return: A tuple of (schema version before, schema version after).
+    """
+    with DBCM(db_name) as cursor:
+        cursor.execute("PRAGMA user_version;")
+        before = cursor.fetchone()[0]
+    DBOperations(db_name).initialize_db()
+    return before, SCHEMA_VERSION
+
+
+def check_query_plans(db_name):
+    """
+    Print the query plan of each checked query.
+    :param db_name: The name of the SQLite database file.
+    :return: The names of the queries that scan the weather table.
+    """
+    db = DBOperations(db_name)
+    failures = []
+    for name, (query, params) in PLAN_CHECKS.items():
+        plan = db.explain_query_plan(query, params)
+        print(f"{name}:")
+        for step in plan:
+            print(f"    {step}")
+        if any(step.startswith("SCAN weather") for step in plan):
+            failures.append(name)
+    return failures
+
+
+def check_rollups(db_name):
+    """
+    Rebuild the monthly rollups in memory and print where the stored rows differ.
+    :param db_name: The name of the SQLite database file.
+    :return: The list of differences found.
+    """
+    differences = RollupOperations(db_name).check()
+    for station_id, year, month, field, stored, rebuilt in differences[:20]:
+        print(f"    station {station_id} {year}-{month:02d} {field}: stored {stored}, rebuilt {rebuilt}")
+    print(f"Rollup differences: {len(differences)}")
+    return differences
+
+
+def main():
+    """
+    Run the migration tool from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Migrate a weather database to the current schema.")
+    parser.add_argument("db_name", nargs="?", default="weather_data.db", help="The database file to migrate.")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with an error if a checked query scans the weather table "
+                             "or the rollups are inconsistent.")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Recompute the monthly rollups from the weather table.")
+    args = parser.parse_args()
+
+    before, after = migrate(args.db_name)
+    print(f"Migrated {args.db_name} from schema version {before} to {after}.")
+
+    if args.rebuild_rollups:
+        RollupOperations(args.db_name).rebuild()
+        print("Rebuilt the monthly rollups.")
+
+    failures = check_query_plans(args.db_name)
+    if failures:
+        print(f"Queries scanning the weather table: {', '.join(failures)}")
+    differences = check_rollups(args.db_name)
+    if args.check and (failures or differences):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+This module provides a local stand-in for the climate website, for load testing the scrapers.
+
+`MockClimateServer` answers the same URLs the scrapers build: month pages at
+`/climate_data/daily_data_e.html?StationID=...&Year=...&Month=...` and yearly bulk CSV
+files at `/climate_data/bulk_data_e.html?format=csv&stationID=...&Year=...`. Data comes
+from a `weather_data.db` (`DatabaseSource`) or is generated (`SyntheticSource`); months
+without data are served as pages without rows, which ends a scrape as on the real site.
+
+Faults can be injected to see how the scrapers cope:
+- A fixed latency plus random jitter before every response, growing in proportion to
+  the requests in progress beyond a capacity, as a busy server queues work.
+- A token bucket throttle that answers 429 with a Retry-After header when exhausted.
+- A rate of random 500/502/503/504 responses.
+- A rate of truncated responses, cut off partway through the body.
+
+Point a scraper at it with the `base_url` argument, or from the command line:
+
+    python mock_climate_server.py --port 8000 --latency 0.05 --rate-limit 20 --error-rate 0.02
+    python scrape_jobs.py --db load_test.db --base-url http://127.0.0.1:8000 --cache-dir ""
+"""
+
+import argparse
+import calendar
+import csv
+import io
+import math
+import random
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from db_operations import DBOperations
+from dbcm import DBCM
+from scrape_csv import CSVWeatherScraper
+from scrape_weather import WeatherScraper
+
+_ERROR_STATUSES = (500, 502, 503, 504)
+_CSV_HEADER = ("Longitude (x)", "Latitude (y)", "Station Name", "Climate ID", "Date/Time", "Year", "Month",
+               "Day", "Data Quality", "Max Temp (°C)", "Max Temp Flag", "Min Temp (°C)", "Min Temp Flag",
+               "Mean Temp (°C)", "Mean Temp Flag")
+
+
+def synthetic_month_records(station_id, year, month, seed=0):
+    """
+    Generate a month of plausible daily temperatures for a station.
+
+    About one day in fifty is missing its mean, as on the real pages.
+
+    :param station_id: The station the records belong to.
+    :param year: The year of the month.
+    :param month: The month number.
+    :param seed: The random seed, so the same month always has the same records.
+    :return: A dictionary of weather data indexed by date.
+    """
+    rng = random.Random(f"{seed}-{station_id}-{year}-{month}")
+    records = {}
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        max_temp = round(rng.uniform(-30, 35), 1)
+        min_temp = round(max_temp - rng.uniform(0, 15), 1)
+        mean_temp = None if rng.random() < 0.02 else round((max_temp + min_temp) / 2, 1)
+        records[date(year, month, day).isoformat()] = {"Max": max_temp, "Min": min_temp, "Mean": mean_temp}
+    return records
+
+
+def _cell(value):
+    """
+    Format a temperature for a page cell.
+    :param value: The temperature, or None.
+    :return: The text of the cell, "M" when missing.
+    """
+    return "M" if value is None else f"{value:.1f}"
+
+
+def render_month_page(year, month, records):
+    """
+    Render a month page shaped like the climate website's daily data table.
+
+    :param year: The year of the month.
+    :param month: The month number.
+    :param records: A dictionary of weather data indexed by date; an empty one renders a page without rows.
+    :return: The HTML of the page.
+    """
+    if not records:
+        return "<html><body><p>No data available for this month.</p></body></html>"
+
+    rows = ["<tr><th>DAY</th><th>Max Temp</th><th>Min Temp</th><th>Mean Temp</th></tr>"]
+    for sample_date, weather in sorted(records.items()):
+        day = int(sample_date[8:])
+        rows.append(f'<tr><th scope="row"><abbr title="{calendar.month_name[month]} {day}, {year}">'
+                    f"{day:02d}</abbr></th><td>{_cell(weather['Max'])}</td><td>{_cell(weather['Min'])}</td>"
+                    f"<td>{_cell(weather['Mean'])}</td><td>&nbsp;</td></tr>")
+    for summary in ("Sum", "Avg", "Xtrm"):
+        rows.append(f'<tr><th scope="row"><abbr title="{summary}">{summary}</abbr></th>'
+                    f"<td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td></tr>")
+    return f"<html><body><table><tbody>{''.join(rows)}</tbody></table></body></html>"
+
+
+def render_year_csv(station_id, year, records):
+    """
+    Render a yearly bulk CSV file like the one the climate website exports.
+
+    :param station_id: The station of the file.
+    :param year: The year of the file.
+    :param records: A dictionary of the year's weather data indexed by date.
+    :return: The CSV text, starting with a byte order mark.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(_CSV_HEADER)
+    for day in range(date(year, 12, 31).toordinal() - date(year, 1, 1).toordinal() + 1):
+        sample_date = date.fromordinal(date(year, 1, 1).toordinal() + day)
+        weather = records.get(sample_date.isoformat(), {})
+        temperatures = ("" if weather.get(key) is None else weather[key] for key in ("Max", "Min", "Mean"))
+        writer.writerow(("-75.0", "45.0", f"STATION {station_id}", str(station_id), sample_date.isoformat(),
+                         year, f"{sample_date.month:02d}", f"{sample_date.day:02d}", "",
+                         *(item for value in temperatures for item in (value, ""))))
+    return "\ufeff" + buffer.getvalue()
+
+
+class SyntheticSource:
+    """
+    Generated weather data for any station over a range of years.
+    """
+    def __init__(self, first_year=1990, last_year=None, seed=0):
+        """
+        Initialize the source.
+
+        :param first_year: The first year with data; older months are empty.
+        :param last_year: The last year with data, defaulting to this year. Days after today are never served.
+        :param seed: The random seed of the generated temperatures.
+        """
+        self.first_year = first_year
+        self.last_year = last_year or date.today().year
+        self.seed = seed
+
+    def month_records(self, station_id, year, month):
+        """
+        Return the records of a month.
+        :param station_id: The station.
+        :param year: The year.
+        :param month: The month number.
+        :return: A dictionary of weather data indexed by date, empty outside the range of years.
+        """
+        if not self.first_year <= year <= self.last_year:
+            return {}
+        today = date.today().isoformat()
+        return {sample_date: weather for sample_date, weather
+                in synthetic_month_records(station_id, year, month, self.seed).items() if sample_date <= today}
+
+
+class DatabaseSource:
+    """
+    Weather data served from the weather table of a database.
+    """
+    def __init__(self, db_name="weather_data.db"):
+        """
+        Initialize the source.
+        :param db_name: The name of the SQLite database file.
+        """
+        self.db_operations = DBOperations(db_name)
+
+    def month_records(self, station_id, year, month):
+        """
+        Return the records of a month.
+        :param station_id: The station.
+        :param year: The year.
+        :param month: The month number.
+        :return: A dictionary of weather data indexed by date.
+        """
+        first_day = date(year, month, 1).isoformat()
+        last_day = date(year, month, calendar.monthrange(year, month)[1]).isoformat()
+        return {sample_date: {"Max": max_temp, "Min": min_temp, "Mean": avg_temp}
+                for sample_date, min_temp, max_temp, avg_temp
+                in self.db_operations.fetch_data(first_day, last_day, station_id)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Hands every GET request to the MockClimateServer.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "MockClimate/1.0"
+
+    def do_GET(self):
+        self.server.respond(self)
+
+    def finish(self):
+        super().finish()
+        DBCM.close_thread()
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            super().log_message(*args)
+
+
+class MockClimateServer(ThreadingHTTPServer):
+    """
+    A threaded HTTP server that stands in for the climate website, with fault injection.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, source=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, rate_limit=None,
+                 burst=None, error_rate=0.0, truncate_rate=0.0, seed=None, verbose=False, capacity=None):
+        """
+        Bind the server.
+
+        :param source: The source of the weather data, defaulting to a SyntheticSource.
+        :param host: The address to listen on.
+        :param port: The port to listen on, or 0 for any free port.
+        :param latency: Seconds added before every response.
+        :param jitter: The upper bound of a random number of seconds added to the latency.
+        :param rate_limit: Requests per second allowed before answering 429, or None for no limit.
+        :param burst: The number of requests allowed at once, defaulting to one second of rate_limit.
+        :param error_rate: The share of requests answered with a random 5xx status.
+        :param truncate_rate: The share of responses cut off partway through the body.
+        :param seed: The random seed of the injected faults.
+        :param verbose: Whether to log every request.
+        :param capacity: Requests served at full speed at once; beyond it the latency grows in proportion.
+        """
+        super().__init__((host, port), _Handler)
+        self.source = source or SyntheticSource()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.burst = burst or max(rate_limit or 0, 1)
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.verbose = verbose
+        self.capacity = capacity
+
+        self._active = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._thread = None
+        self._counters = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "truncated": 0,
+                          "not_found": 0, "bytes": 0}
+
+    @property
+    def url(self):
+        """
+        The base URL of the server, to give to a scraper as base_url.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, name, amount=1):
+        """
+        Increase one of the server counters.
+        :param name: The counter name.
+        :param amount: The amount to add.
+        """
+        with self._lock:
+            self._counters[name] += amount
+
+    def _throttle(self):
+        """
+        Take a token from the rate limit bucket.
+        :return: 0 if the request may proceed, otherwise the seconds until a token is available.
+        """
+        if not self.rate_limit:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate_limit
+
+    def _render(self, path, query):
+        """
+        Render the page or CSV file a request asks for.
+        :param path: The request path.
+        :param query: The parsed query parameters.
+        :return: A tuple of (status, content type, body bytes).
+        """
+        try:
+            if path == WeatherScraper.PAGE_PATH:
+                station_id, year, month = (int(query[name][0]) for name in ("StationID", "Year", "Month"))
+                html = render_month_page(year, month, self.source.month_records(station_id, year, month))
+                return 200, "text/html; charset=utf-8", html.encode("utf-8")
+            if path == CSVWeatherScraper.BULK_PATH:
+                station_id, year = (int(query[name][0]) for name in ("stationID", "Year"))
+                records = {}
+                for month in range(1, 13):
+                    records.update(self.source.month_records(station_id, year, month))
+                return 200, "text/csv; charset=utf-8", render_year_csv(station_id, year, records).encode("utf-8")
+        except (KeyError, ValueError):
+            return 400, "text/plain", b"Bad request parameters."
+        return 404, "text/plain", b"Not found."
+
+    def respond(self, handler):
+        """
+        Answer a request, injecting the configured latency and faults.
+        :param handler: The request handler.
+        """
+        with self._lock:
+            self._counters["requests"] += 1
+            self._active += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            if self.capacity and self._active > self.capacity:
+                delay *= self._active / self.capacity
+            fail = self._rng.random() < self.error_rate
+            truncate = self._rng.random() < self.truncate_rate
+            error_status = self._rng.choice(_ERROR_STATUSES)
+        try:
+            if delay:
+                time.sleep(delay)
+            self._answer(handler, fail, truncate, error_status)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _answer(self, handler, fail, truncate, error_status):
+        """
+        Send the response chosen for a request.
+        :param handler: The request handler.
+        :param fail: Whether to answer with an injected error.
+        :param truncate: Whether to truncate a successful response.
+        :param error_status: The status of an injected error.
+        """
+        wait = self._throttle()
+        if wait:
+            self._count("throttled")
+            self._send(handler, 429, "text/plain", b"Too many requests.",
+                       {"Retry-After": str(max(1, math.ceil(wait)))})
+            return
+        if fail:
+            self._count("errors")
+            self._send(handler, error_status, "text/plain", b"Injected server error.")
+            return
+
+        parts = urlsplit(handler.path)
+        status, content_type, body = self._render(parts.path, parse_qs(parts.query))
+        if status == 404:
+            self._count("not_found")
+        if truncate and status == 200:
+            self._count("truncated")
+            self._send(handler, status, content_type, body, truncate=True)
+            return
+        if status == 200:
+            self._count("ok")
+        self._send(handler, status, content_type, body)
+
+    def _send(self, handler, status, content_type, body, headers=None, truncate=False):
+        """
+        Write a response.
+        :param handler: The request handler.
+        :param status: The HTTP status.
+        :param content_type: The Content-Type header.
+        :param body: The body bytes.
+        :param headers: Extra headers.
+        :param truncate: Whether to send only part of the body and then close the connection.
+        """
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if truncate:
+            body = body[:len(body) // 2]
+            handler.close_connection = True
+        handler.wfile.write(body)
+        self._count("bytes", len(body))
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        :return: The server, so it can be started where it is created.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-climate-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the socket.
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def stats(self):
+        """
+        Return a snapshot of the request counters.
+        :return: A dictionary with requests, ok, throttled, errors, truncated, not_found and bytes.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    """
+    Run the stand-in server from the command line until interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Serve climate pages locally with fault injection.")
+    parser.add_argument("--db", help="Serve the weather table of this database instead of generated data.")
+    parser.add_argument("--first-year", type=int, default=1990, help="The first year of generated data.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="The port to listen on.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added before every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds of latency, up to this.")
+    parser.add_argument("--capacity", type=int, default=None,
+                        help="Requests served at full speed at once; beyond it latency grows in proportion.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before 429s.")
+    parser.add_argument("--burst", type=float, default=None, help="Requests allowed at once before 429s.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 5xx.")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of responses cut off early.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed of the injected faults.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    source = DatabaseSource(args.db) if args.db else SyntheticSource(args.first_year)
+    server = MockClimateServer(source, args.host, args.port, args.latency, args.jitter, args.rate_limit,
+                               args.burst, args.error_rate, args.truncate_rate, args.seed, args.verbose,
+                               args.capacity)
+    print(f"Serving climate pages at {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Requests: {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+This module provides an on-disk cache for the raw month pages of the climate website.
+
+The `PageCache` class stores gzip-compressed page bodies under their SHA-256 digest,
+with a small SQLite index of each URL's digest, HTTP validators and access times.
+Pages of settled months are served without touching the network; others are
+revalidated with conditional requests. The least recently used pages are evicted
+once the cache grows past its size limit.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from urllib.parse import urlparse, parse_qs
+from dbcm import DBCM
+
+CachedPage = namedtuple("CachedPage", ["text", "etag", "last_modified", "fetched_at"])
+
+
+def settled_date(year, month):
+    """
+    Return the first day a month's data can no longer change.
+
+    Late corrections are still published during the following month, so a month
+    is settled from the start of the month after next.
+
+    :param year: The year of the month.
+    :param month: The month (1-12).
+    :return: A datetime.date.
+    """
+    year, month = divmod(year * 12 + month + 1, 12)
+    return date(year, month + 1, 1)
+
+
+class PageCache:
+    """
+    A compressed, content-addressed on-disk cache of month pages keyed by URL.
+    """
+    def __init__(self, cache_dir="page_cache", max_bytes=256 * 1024 * 1024, offline=False):
+        """
+        Initialize the cache and create its directory and index if needed.
+        :param cache_dir: The directory holding the index and the page objects.
+        :param max_bytes: The compressed size the cache is trimmed to after each write.
+        :param offline: When True, pages are only ever served from the cache.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.index_name = os.path.join(cache_dir, "index.db")
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        with DBCM(self.index_name) as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                accessed_at REAL
+            );
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_pages_accessed ON pages (accessed_at);")
+
+    def _object_path(self, digest):
+        """
+        Return the file path of a page object.
+        :param digest: The SHA-256 hex digest of the page body.
+        :return: The path of the compressed object file.
+        """
+        return os.path.join(self.cache_dir, "objects", digest[:2], f"{digest}.gz")
+
+    def get(self, url):
+        """
+        Return the cached page for a URL and mark it as recently used.
+        :param url: The page URL.
+        :return: A CachedPage, or None if the URL is not cached or its object is missing.
+        """
+        with self._lock, DBCM(self.index_name) as cursor:
+            cursor.execute(
+                "SELECT digest, etag, last_modified, fetched_at FROM pages WHERE url = ?;", (url,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute("UPDATE pages SET accessed_at = ? WHERE url = ?;", (time.time(), url))
+
+        digest, etag, last_modified, fetched_at = row
+        try:
+            with gzip.open(self._object_path(digest), "rt", encoding="utf-8") as f:
+                return CachedPage(f.read(), etag, last_modified, fetched_at)
+        except OSError:
+            return None
+
+    def put(self, url, text, etag=None, last_modified=None):
+        """
+        Store a page body and its validators, then evict old pages if the cache is too large.
+
+        :param url: The page URL.
+        :param text: The page body.
+        :param etag: The ETag header of the response, if any.
+        :param last_modified: The Last-Modified header of the response, if any.
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            with DBCM(self.index_name) as cursor:
+                cursor.execute("""
+                INSERT OR REPLACE INTO pages (url, digest, size, etag, last_modified, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?);
+                """, (url, digest, os.path.getsize(path), etag, last_modified, now, now))
+            self._evict()
+
+    def touch(self, url):
+        """
+        Record that a cached page was successfully revalidated.
+        :param url: The page URL.
+        """
+        now = time.time()
+        with self._lock, DBCM(self.index_name) as cursor:
+            cursor.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?;", (now, now, url))
+
+    def _evict(self):
+        """
+        Drop least recently used pages until the cache fits in max_bytes.
+        The caller must hold the cache lock.
+        """
+        with DBCM(self.index_name) as cursor:
+            cursor.execute("SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM pages GROUP BY digest);")
+            total = cursor.fetchone()[0] or 0
+            if total <= self.max_bytes:
+                return
+
+            cursor.execute("SELECT url, digest, size FROM pages ORDER BY accessed_at;")
+            victims = []
+            for url, digest, size in cursor.fetchall():
+                if total <= self.max_bytes:
+                    break
+                victims.append((url, digest))
+                total -= size
+
+            cursor.executemany("DELETE FROM pages WHERE url = ?;", [(url,) for url, _ in victims])
+            for _, digest in victims:
+                cursor.execute("SELECT 1 FROM pages WHERE digest = ? LIMIT 1;", (digest,))
+                if cursor.fetchone() is None:
+                    try:
+                        os.remove(self._object_path(digest))
+                    except FileNotFoundError:
+                        pass
+
+    def is_immutable(self, url, today=None, fetched_at=None):
+        """
+        Tell whether a cached page of a month URL is final: its month has settled, and
+        the page was fetched after it did.
+        :param url: A month page URL with Year and Month query parameters.
+        :param today: The reference date, defaulting to today.
+        :param fetched_at: The time the cached page was fetched or last revalidated, as a
+            POSIX timestamp, or None to judge by the month alone.
+        :return: True if the cached page can be served without revalidation.
+        """
+        query = parse_qs(urlparse(url).query)
+        try:
+            year = int(query["Year"][0])
+            month = int(query["Month"][0])
+        except (KeyError, ValueError):
+            return False
+
+        settled = settled_date(year, month)
+        if (today or date.today()) < settled:
+            return False
+        return fetched_at is None or date.fromtimestamp(fetched_at) >= settled
+
+    def iter_pages(self):
+        """
+        Yield every cached page, for reprocessing the archive offline.
+        :return: A generator of (url, text) tuples.
+        """
+        with DBCM(self.index_name) as cursor:
+            cursor.execute("SELECT url FROM pages ORDER BY url;")
+            urls = [url for (url,) in cursor.fetchall()]
+
+        for url in urls:
+            page = self.get(url)
+            if page is not None:
+                yield url, page.text
@@ -0,0 +1,140 @@
+"""
+This module provides an in-memory LRU cache for plot data and rendered plots.
+
+`PlotOperations` stores the data behind each plot, and optionally its rendered PNG,
+under keys that include the data versions of the stations plotted (see
+`DBOperations.data_versions`). Inserting or purging a station's rows gives it a new
+version, so stale entries are never returned; they simply stop being used and age
+out. The cache is bounded both by the number of entries and by an estimate of the
+bytes they hold, evicting the least recently used entries first.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def estimate_size(value):
+    """
+    Estimate the memory held by a cached value.
+
+    NumPy arrays count their buffers, containers count their items, and everything
+    else counts its own size.
+
+    :param value: The value to measure.
+    :return: The estimated size in bytes.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes + sys.getsizeof(value) if value.base is None else value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class PlotCache:
+    """
+    A thread-safe least recently used cache with entry and memory caps.
+
+    Attributes:
+        max_bytes (int): The estimated size the cache is trimmed to after each insert.
+        max_entries (int): The number of entries the cache is trimmed to after each insert.
+
+    Methods:
+        get(key):
+            Return the cached value for a key, or None if it is not cached.
+
+        put(key, value):
+            Cache a value, then evict the least recently used entries if needed.
+
+        get_or_compute(key, compute):
+            Return the cached value for a key, computing and caching it on a miss.
+
+        clear():
+            Remove every entry.
+
+        stats():
+            Return a snapshot of the cache counters.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=256):
+        """
+        Initialize an empty cache.
+
+        :param max_bytes: The estimated size the cache is trimmed to after each insert.
+        :param max_entries: The number of entries the cache is trimmed to after each insert.
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        """
+        Return the cached value for a key and mark it as recently used.
+        :param key: A hashable key.
+        :return: The cached value, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache a value, then evict the least recently used entries until the cache fits its caps.
+
+        A value larger than max_bytes on its own is not cached.
+
+        :param key: A hashable key.
+        :param value: The value to cache.
+        """
+        size = estimate_size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counters["evictions"] += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for a key, computing and caching it on a miss.
+        :param key: A hashable key.
+        :param compute: A function of no arguments returning the value.
+        :return: The value.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Return a snapshot of the cache counters.
+        :return: A dictionary with hits, misses, evictions, entries and bytes.
+        """
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries), "bytes": self._bytes}
@@ -5,12 +5,102 @@ The `PlotOperations` class includes methods to:
 - Generate box plots that show the distribution of monthly mean temperatures over a range of years.
 - Generate line plots that illustrate daily mean temperatures for a specific month and year.
 
+- Render either plot to PNG bytes, cached with its data in a `PlotCache`.
+- Write every plot of a range of years to files with a pool of worker processes.
+
+Box plots can pool several climate stations and are drawn from the monthly rollups.
+Run the module to render plots to files from the command line:
+
+    python plot_operations.py --db weather_data.db --out plots --years 1996-2024
+
 These visualizations aid in the analysis and interpretation of historical weather data.
 """
 
-import sqlite3
-from datetime import datetime
+import argparse
+import calendar
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from db_operations import DBOperations
+from instrumentation import traced
+from plot_cache import PlotCache
+from rollup_operations import RollupOperations, box_stats_by_month
+from stations import DEFAULT_STATION_ID, load_station_ids, parse_station_ids
+
+MONTH_LABELS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+BATCH_FORMATS = ("png", "svg")
+
+
+class FigureRenderer:
+    """
+    An off-screen figure reused to render many plots to files.
+
+    Allocating a figure, canvas and axes dominates the cost of small plots, so the
+    renderer keeps one of each and clears the axes between plots instead.
+    """
+
+    def __init__(self, figsize=(10, 6)):
+        """
+        Create the figure and its Agg canvas.
+        :param figsize: The size of the figure in inches.
+        """
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+
+    def render(self, draw, path_stem, formats=BATCH_FORMATS, dpi=100):
+        """
+        Draw a plot and save it in each format.
+        :param draw: A function drawing the plot on the Axes it is given.
+        :param path_stem: The path of the files without their extension.
+        :param formats: The file formats to save, e.g. "png" and "svg".
+        :param dpi: The resolution of raster images.
+        :return: The paths written.
+        """
+        self.ax.clear()
+        draw(self.ax)
+        paths = []
+        for file_format in formats:
+            path = f"{path_stem}.{file_format}"
+            self.figure.savefig(path, format=file_format, dpi=dpi)
+            paths.append(path)
+        return paths
+
+
+# The plotter and renderer of a batch worker process, created once by _init_batch_worker
+_worker_plotter = None
+_worker_renderer = None
+
+
+def _init_batch_worker(db_name):
+    """
+    Set up a batch worker process with its own plot data cache, connection and reusable figure.
+    :param db_name: The name of the SQLite database file.
+    """
+    global _worker_plotter, _worker_renderer
+    matplotlib.use("Agg")
+    _worker_plotter = PlotOperations(db_name)
+    _worker_renderer = FigureRenderer()
+
+
+def _render_batch_year(station_id, year, output_dir, formats, dpi):
+    """
+    Render the plots of one year of a station in a batch worker process.
+    :param station_id: The station to plot.
+    :param year: The year to plot.
+    :param output_dir: The directory the plots are written to.
+    :param formats: The file formats to save.
+    :param dpi: The resolution of raster images.
+    :return: The number of files written.
+    """
+    return len(_worker_plotter.render_year(station_id, year, output_dir, formats, dpi, _worker_renderer))
+
 
 class PlotOperations:
     """
@@ -22,87 +112,345 @@ class PlotOperations:
 
         Attributes:
             db_name (str): The name of the SQLite database file that stores weather data.
+            cache (PlotCache): The cache of plot data and rendered PNGs.
 
         Methods:
-            plot_boxplot(start_year, end_year):
+            plot_boxplot(start_year, end_year, station_ids=DEFAULT_STATION_ID):
                 Generates a box plot for monthly mean temperatures between the specified years.
 
-            plot_lineplot(year, month):
+            plot_lineplot(year, month, station_id=DEFAULT_STATION_ID):
                 Generates a line plot for daily mean temperatures for a specific month and year.
+
+            boxplot_stats(start_year, end_year, station_ids=DEFAULT_STATION_ID):
+                Returns the cached box plot statistics of a year range.
+
+            lineplot_data(year, month, station_id=DEFAULT_STATION_ID):
+                Returns the cached days and mean temperatures of a month.
+
+            boxplot_png(start_year, end_year, station_ids=DEFAULT_STATION_ID, dpi=100):
+                Returns a cached PNG rendering of a box plot.
+
+            lineplot_png(year, month, station_id=DEFAULT_STATION_ID, dpi=100):
+                Returns a cached PNG rendering of a line plot.
+
+            data_years(station_id=DEFAULT_STATION_ID):
+                Returns the years a station has data for.
+
+            render_year(station_id, year, output_dir, formats=("png", "svg"), dpi=100, renderer=None):
+                Writes the box plot of a year and the line plot of each of its months to files.
+
+            render_batch(output_dir, station_ids=DEFAULT_STATION_ID, years=None, formats=("png", "svg"),
+                         dpi=100, processes=None):
+                Writes the plots of every month of every year, using a pool of worker processes.
     """
-    def __init__(self, db_name="weather_data.db"):
+    def __init__(self, db_name="weather_data.db", cache=None):
         """
         Initialize the PlotOperations with the database name.
         :param db_name: The name of the SQLite database file.
+        :param cache: The PlotCache to use. A new cache is created if omitted.
         """
         self.db_name = db_name
+        self.db_operations = DBOperations(db_name)
+        self.rollups = RollupOperations(db_name)
+        self.cache = cache if cache is not None else PlotCache()
 
-    def _fetch_data(self, query, params=None):
+    def _station_rollups(self, station_id, version):
         """
-        Fetch data from the database based on a query and parameters.
-        :param query: SQL query to execute.
-        :param params: Parameters for the SQL query.
-        :return: Fetched data as a list of tuples.
+        Return every rollup row of a station, from the cache when possible.
+        :param station_id: The station to fetch.
+        :param version: The station's current data version.
+        :return: A list of rollup rows as returned by RollupOperations.fetch_monthly.
         """
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
+        return self.cache.get_or_compute(("rollups", station_id, version),
+                                         lambda: self.rollups.fetch_monthly(date.min.year, date.max.year,
+                                                                            station_id))
 
-    def plot_boxplot(self, start_year, end_year):
+    def _year_columns(self, station_id, year, version):
         """
-        Generate a boxplot for mean temperatures for each month between the specified years.
+        Return a year of a station's daily columns, from the cache when possible.
+        :param station_id: The station to fetch.
+        :param year: The year to fetch.
+        :param version: The station's current data version.
+        :return: A WeatherColumns tuple.
+        """
+        return self.cache.get_or_compute(("columns", station_id, year, version),
+                                         lambda: self.db_operations.fetch_columns(date(year, 1, 1),
+                                                                                  date(year, 12, 31),
+                                                                                  station_id))
+
+    @traced("plot.boxplot_stats")
+    def boxplot_stats(self, start_year, end_year, station_ids=DEFAULT_STATION_ID):
+        """
+        Return the box plot statistics of each month between the specified years.
         :param start_year: The start year for the data.
         :param end_year: The end year for the data.
+        :param station_ids: The station to plot, or a list of stations whose values are pooled.
+        :return: A list of twelve statistics dictionaries accepted by Axes.bxp.
         """
-        query = """
-        SELECT sample_date, avg_temp FROM weather
-        WHERE sample_date BETWEEN ? AND ?;
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        station_ids = tuple(station_ids)
+        versions = self.db_operations.data_versions(station_ids)
+
+        def compute():
+            rows = (row for station_id, version in zip(station_ids, versions)
+                    for row in self._station_rollups(station_id, version) if start_year <= row[0] <= end_year)
+            return box_stats_by_month(rows, MONTH_LABELS)
+
+        return self.cache.get_or_compute(("boxplot", start_year, end_year, station_ids, versions), compute)
+
+    @traced("plot.lineplot_data")
+    def lineplot_data(self, year, month, station_id=DEFAULT_STATION_ID):
+        """
+        Return the daily mean temperatures of a month.
+        :param year: The year for the data.
+        :param month: The month for the data (1-12).
+        :param station_id: The station to plot.
+        :return: A tuple of (day of month array, mean temperature array).
+        """
+        version, = self.db_operations.data_versions(station_id)
+
+        def compute():
+            columns = self._year_columns(station_id, year, version)
+            first_day = np.datetime64(date(year, month, 1), "D")
+            next_month = date(year, month, calendar.monthrange(year, month)[1]) + timedelta(days=1)
+            start, stop = np.searchsorted(columns.date, [first_day, np.datetime64(next_month, "D")])
+
+            # Days of the month from the dates, in one array operation
+            days = (columns.date[start:stop] - first_day).astype(np.int64) + 1
+            return days, columns.avg_temp[start:stop].copy()
+
+        return self.cache.get_or_compute(("lineplot", year, month, station_id, version), compute)
+
+    def _draw_boxplot(self, ax, stats, station_ids):
         """
-        start_date = f"{start_year}-01-01"
-        end_date = f"{end_year}-12-31"
-        data = self._fetch_data(query, (start_date, end_date))
+        Draw a box plot on an Axes.
+        :param ax: The Axes to draw on.
+        :param stats: The statistics returned by boxplot_stats.
+        :param station_ids: The station or stations plotted.
+        """
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        stations = ", ".join(str(station_id) for station_id in station_ids)
+        station_label = "Stations" if len(station_ids) > 1 else "Station"
 
-        # Organize data by month
-        monthly_data = {month: [] for month in range(1, 13)}
-        for sample_date, avg_temp in data:
-            date = datetime.strptime(sample_date, "%Y-%m-%d")
-            monthly_data[date.month].append(avg_temp)
+        # Create the boxplot from the merged monthly histograms
+        ax.bxp(stats)
+        ax.set_title(f"Monthly Mean Temperature Distribution - {station_label} {stations}")
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Mean Temperature (\u00b0C)")
+        ax.grid(True, linestyle="--", alpha=0.7)
 
-        # Create the boxplot
+    def _draw_lineplot(self, ax, days, temperatures, year, month, station_id):
+        """
+        Draw a line plot on an Axes.
+        :param ax: The Axes to draw on.
+        :param days: The days of the month.
+        :param temperatures: The mean temperature of each day.
+        :param year: The year plotted.
+        :param month: The month plotted.
+        :param station_id: The station plotted.
+        """
+        first_day = date(year, month, 1)
+        ax.plot(days, temperatures, marker="o", linestyle="-", color="b")
+        ax.set_title(f"Daily Mean Temperatures - {first_day.strftime('%B %Y')}"
+                     f" - Station {station_id}")
+        ax.set_xlabel("Day of Month")
+        ax.set_ylabel("Mean Temperature (\u00b0C)")
+        ax.set_xticks(range(1, calendar.monthrange(year, month)[1] + 1))
+        ax.grid(True, linestyle="--", alpha=0.7)
+
+    @staticmethod
+    @traced("plot.render_png")
+    def _render_png(draw, dpi):
+        """
+        Render a plot to PNG bytes on an off-screen figure.
+        :param draw: A function drawing the plot on the Axes it is given.
+        :param dpi: The resolution of the image.
+        :return: The PNG bytes.
+        """
+        figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(figure)
+        draw(figure.add_subplot())
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png", dpi=dpi)
+        return buffer.getvalue()
+
+    def plot_boxplot(self, start_year, end_year, station_ids=DEFAULT_STATION_ID):
+        """
+        Generate a boxplot for mean temperatures for each month between the specified years.
+        :param start_year: The start year for the data.
+        :param end_year: The end year for the data.
+        :param station_ids: The station to plot, or a list of stations whose values are pooled.
+        """
+        stats = self.boxplot_stats(start_year, end_year, station_ids)
         plt.figure(figsize=(10, 6))
-        plt.boxplot([monthly_data[month] for month in range(1, 13)],
-                    labels=["Jan", "Feb", "Mar", "Apr", "May", "Jun",
-                            "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
-        plt.title("Monthly Mean Temperature Distribution")
-        plt.xlabel("Month")
-        plt.ylabel("Mean Temperature (\u00b0C)")
-        plt.grid(True, linestyle="--", alpha=0.7)
+        self._draw_boxplot(plt.gca(), stats, station_ids)
         plt.show()
 
-    def plot_lineplot(self, year, month):
+    def plot_lineplot(self, year, month, station_id=DEFAULT_STATION_ID):
         """
         Generate a line plot for daily mean temperatures for a specific month and year.
         :param year: The year for the data.
         :param month: The month for the data (1-12).
+        :param station_id: The station to plot.
         """
-        query = """
-        SELECT sample_date, avg_temp FROM weather
-        WHERE sample_date LIKE ?;
+        days, temperatures = self.lineplot_data(year, month, station_id)
+        plt.figure(figsize=(10, 6))
+        self._draw_lineplot(plt.gca(), days, temperatures, year, month, station_id)
+        plt.show()
+
+    def boxplot_png(self, start_year, end_year, station_ids=DEFAULT_STATION_ID, dpi=100):
         """
-        date_pattern = f"{year}-{month:02d}-%"
-        data = self._fetch_data(query, (date_pattern,))
+        Render a box plot to PNG bytes, from the cache when the data has not changed.
+        :param start_year: The start year for the data.
+        :param end_year: The end year for the data.
+        :param station_ids: The station to plot, or a list of stations whose values are pooled.
+        :param dpi: The resolution of the image.
+        :return: The PNG bytes.
+        """
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        station_ids = tuple(station_ids)
+        versions = self.db_operations.data_versions(station_ids)
 
-        # Extract days and temperatures
-        days = [datetime.strptime(sample_date, "%Y-%m-%d").day for sample_date, _ in data]
-        temperatures = [avg_temp for _, avg_temp in data]
+        def draw(ax):
+            self._draw_boxplot(ax, self.boxplot_stats(start_year, end_year, station_ids), station_ids)
 
-        # Create the line plot
-        plt.figure(figsize=(10, 6))
-        plt.plot(days, temperatures, marker="o", linestyle="-", color="b")
-        plt.title(f"Daily Mean Temperatures - {datetime(year, month, 1).strftime('%B %Y')}")
-        plt.xlabel("Day of Month")
-        plt.ylabel("Mean Temperature (\u00b0C)")
-        plt.xticks(range(1, max(days) + 1))
-        plt.grid(True, linestyle="--", alpha=0.7)
-        plt.show()
+        return self.cache.get_or_compute(("boxplot.png", start_year, end_year, station_ids, versions, dpi),
+                                         lambda: self._render_png(draw, dpi))
+
+    def lineplot_png(self, year, month, station_id=DEFAULT_STATION_ID, dpi=100):
+        """
+        Render a line plot to PNG bytes, from the cache when the data has not changed.
+        :param year: The year for the data.
+        :param month: The month for the data (1-12).
+        :param station_id: The station to plot.
+        :param dpi: The resolution of the image.
+        :return: The PNG bytes.
+        """
+        version, = self.db_operations.data_versions(station_id)
+
+        def draw(ax):
+            days, temperatures = self.lineplot_data(year, month, station_id)
+            self._draw_lineplot(ax, days, temperatures, year, month, station_id)
+
+        return self.cache.get_or_compute(("lineplot.png", year, month, station_id, version, dpi),
+                                         lambda: self._render_png(draw, dpi))
+
+    def data_years(self, station_id=DEFAULT_STATION_ID):
+        """
+        Return the years a station has data for, from its rollups.
+        :param station_id: The station to look up.
+        :return: A sorted list of years.
+        """
+        version, = self.db_operations.data_versions(station_id)
+        return sorted({row[0] for row in self._station_rollups(station_id, version)})
+
+    def render_year(self, station_id, year, output_dir, formats=BATCH_FORMATS, dpi=100, renderer=None):
+        """
+        Write the box plot of a year and the line plot of each month with data to files.
+        Nothing is written for a year without data.
+
+        Files are named after the station, year and month, e.g. "27174/2020.png" for the
+        box plot and "27174/2020-03.png" for the line plot of March.
+
+        :param station_id: The station to plot.
+        :param year: The year to plot.
+        :param output_dir: The directory the station's directory of plots is created in.
+        :param formats: The file formats to save, e.g. "png" and "svg".
+        :param dpi: The resolution of raster images.
+        :param renderer: The FigureRenderer to draw with. A new one is created if omitted.
+        :return: The paths written.
+        """
+        stats = self.boxplot_stats(year, year, station_id)
+        if all(np.isnan(month_stats["med"]) for month_stats in stats):
+            return []
+
+        renderer = renderer or FigureRenderer()
+        station_dir = os.path.join(output_dir, str(station_id))
+        os.makedirs(station_dir, exist_ok=True)
+        paths = renderer.render(lambda ax: self._draw_boxplot(ax, stats, station_id),
+                                os.path.join(station_dir, str(year)), formats, dpi)
+        for month in range(1, 13):
+            days, temperatures = self.lineplot_data(year, month, station_id)
+            if len(days) == 0:
+                continue
+            paths += renderer.render(lambda ax: self._draw_lineplot(ax, days, temperatures, year, month,
+                                                                    station_id),
+                                     os.path.join(station_dir, f"{year}-{month:02d}"), formats, dpi)
+        return paths
+
+    def render_batch(self, output_dir, station_ids=DEFAULT_STATION_ID, years=None, formats=BATCH_FORMATS,
+                     dpi=100, processes=None):
+        """
+        Write the plots of every month of every year to files, using a pool of worker processes.
+
+        Each (station, year) is one task; a worker reads the year's columns in one query and
+        draws its thirteen plots on the figure it keeps for the whole batch.
+
+        :param output_dir: The directory the plots are written to.
+        :param station_ids: The station to plot, or a list of stations.
+        :param years: The years to plot, defaulting to every year each station has data for.
+        :param formats: The file formats to save, e.g. "png" and "svg".
+        :param dpi: The resolution of raster images.
+        :param processes: The number of worker processes, defaulting to the number of CPUs.
+        :return: The number of files written.
+        """
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        tasks = [(station_id, year) for station_id in station_ids
+                 for year in (years if years is not None else self.data_years(station_id))]
+        if not tasks:
+            return 0
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_batch_worker,
+                                 initargs=(self.db_name,)) as executor:
+            futures = [executor.submit(_render_batch_year, station_id, year, output_dir, tuple(formats), dpi)
+                       for station_id, year in tasks]
+            return sum(future.result() for future in futures)
+
+
+def parse_years(text):
+    """
+    Parse a year or an inclusive range of years such as "1996-2024".
+    :param text: The year or range.
+    :return: A list of years.
+    :raises ValueError: If the text is not a year or a range of years.
+    """
+    first, _, last = text.partition("-")
+    first = int(first)
+    last = int(last) if last else first
+    if last < first:
+        raise ValueError(f"The year range {text} ends before it starts.")
+    return list(range(first, last + 1))
+
+
+def main():
+    """
+    Render plots to files from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Render the weather plots of every month of every year to files.")
+    parser.add_argument("--db", default="weather_data.db", help="The database file to plot.")
+    parser.add_argument("--out", default="plots", help="The directory the plots are written to.")
+    parser.add_argument("--stations", default=str(DEFAULT_STATION_ID), help="Comma separated station IDs.")
+    parser.add_argument("--stations-file", default=None,
+                        help="A file of station IDs, one or more per line, used instead of --stations.")
+    parser.add_argument("--years", default=None,
+                        help="A year or range of years, e.g. 1996-2024 (default: every year with data).")
+    parser.add_argument("--formats", default=",".join(BATCH_FORMATS), help="Comma separated file formats.")
+    parser.add_argument("--dpi", type=int, default=100, help="The resolution of raster images.")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="The number of worker processes (default: the number of CPUs).")
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    years = parse_years(args.years) if args.years else None
+    formats = [file_format.strip() for file_format in args.formats.split(",") if file_format.strip()]
+    station_ids = load_station_ids(args.stations_file) if args.stations_file else parse_station_ids(args.stations)
+    written = PlotOperations(args.db).render_batch(args.out, station_ids, years, formats, args.dpi, args.processes)
+    print(f"Wrote {written} files to {args.out}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+This module provides adaptive concurrency and rate control for downloading pages.
+
+`AdaptiveLimiter` caps the number of requests in flight with additive-increase/
+multiplicative-decrease (AIMD):
+- Every window of requests answered without a slowdown raises the limit by `increase`.
+- A 429 or 503 response, a timeout, or latency rising well above the lowest seen
+  multiplies the limit by `decrease`. A Retry-After header also pauses every request.
+- A `TokenBucket` caps the request rate. A throttled response sets the rate to a fraction
+  of the recent success rate, and successes raise it again up to requests_per_second.
+
+`HTTPClient` and `AsyncHTTPClient` report the outcome of every request to their limiter.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from instrumentation import count, gauge
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header.
+
+    :param value: The header value, either a number of seconds or an HTTP date, or None.
+    :return: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket allowing short bursts above a steady request rate.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Initialize a full bucket.
+
+        :param rate: The steady rate in requests per second.
+        :param burst: The number of requests allowed at once, defaulting to one second of rate.
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """
+        Add the tokens earned since the last update. Call with the lock held.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Take a token, borrowing it from the future if the bucket is empty.
+        :return: The seconds to wait before sending the request.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def set_rate(self, rate, burst=None):
+        """
+        Change the rate, keeping the tokens earned at the old rate.
+        :param rate: The new steady rate in requests per second.
+        :param burst: The new number of requests allowed at once, or None to keep it.
+        """
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            if burst is not None:
+                self.burst = burst
+                self._tokens = min(self._tokens, burst)
+
+    def acquire(self):
+        """
+        Block until a request is allowed.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdaptiveLimiter:
+    """
+    A thread-safe AIMD limit on the number of requests in flight, with an adaptive rate cap.
+
+    Attributes:
+        bucket (TokenBucket): The request rate cap, or None until a cap is given or the server throttles.
+        in_flight (int): The number of requests holding a slot.
+        history (deque): The latest (seconds since creation, limit) changes.
+    """
+    SMOOTHING = 0.2
+    MIN_RATE = 0.5
+    RATE_SAMPLES = 20
+
+    def __init__(self, initial=4, minimum=1, maximum=32, increase=1.0, decrease=0.5, latency_tolerance=2.0,
+                 requests_per_second=None, burst=None, latency_slack=0.05):
+        """
+        Initialize the limiter.
+        :param initial: The starting limit.
+        :param minimum: The lowest the limit goes.
+        :param maximum: The highest the limit goes.
+        :param increase: How much the limit grows per window of successful requests.
+        :param decrease: The factor the limit is multiplied by on congestion.
+        :param latency_tolerance: How many times the lowest latency seen counts as congestion.
+        :param requests_per_second: A request rate shared by everything using the limiter, or None for no cap.
+        :param burst: The number of requests the rate cap allows at once.
+        :param latency_slack: Seconds of latency above the tolerance allowed, so jitter on fast round trips is not congestion.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.latency_slack = latency_slack
+        self.max_rate = requests_per_second
+        self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self.in_flight = 0
+        self.history = deque(maxlen=1000)
+
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._baseline = None
+        self._smoothed = None
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._created = time.monotonic()
+        self._successes = deque(maxlen=self.RATE_SAMPLES)
+        self._condition = threading.Condition()
+        self._counters = {"requests": 0, "throttled": 0, "timeouts": 0, "latency_backoffs": 0, "decreases": 0,
+                          "paused_seconds": 0.0}
+        self._record_limit()
+
+    @property
+    def limit(self):
+        """
+        The current number of requests allowed in flight.
+        """
+        return max(self.minimum, int(self._limit))
+
+    def _wait_time(self, now):
+        """
+        Return how long a request must wait for a slot. Call with the condition held.
+        :param now: The current monotonic time.
+        :return: 0 if a slot is free, the remaining pause if paused, or None to wait for a release.
+        """
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight < self.limit:
+            return 0
+        return None
+
+    def _take_slot(self):
+        """
+        Take a slot if one is free. Call with the condition held.
+        :return: 0 if a slot was taken, otherwise as _wait_time.
+        """
+        wait = self._wait_time(time.monotonic())
+        if wait == 0:
+            self.in_flight += 1
+            self._counters["requests"] += 1
+        return wait
+
+    def acquire(self):
+        """
+        Block until a request may be sent, and take a slot. Every acquire must be followed by a release.
+        :return: The monotonic time the request is sent at, to give to release.
+        """
+        with self._condition:
+            while self._take_slot() != 0:
+                self._condition.wait(self._wait_time(time.monotonic()))
+        if self.bucket is not None:
+            try:
+                self.bucket.acquire()
+                # A pause may have started while this request waited for a token
+                time.sleep(self._pause_remaining())
+            except BaseException:
+                self._give_back_slot()
+                raise
+        return time.monotonic()
+
+    def _give_back_slot(self):
+        """
+        Give back the slot of a request that was never sent, such as one interrupted while it waited for a token.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._counters["requests"] -= 1
+            self._condition.notify_all()
+
+    def _pause_remaining(self):
+        """
+        Return the seconds left of the current Retry-After pause, or 0 if there is none.
+        """
+        with self._condition:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def release(self, sent_at, throttled=False, timed_out=False, failed=False, retry_after=None):
+        """
+        Give back a slot and adjust the limit to how the request went.
+
+        A request that got a normal response reports its latency; one that failed for
+        another reason, such as a refused connection, says nothing about congestion.
+
+        :param sent_at: The time returned by acquire.
+        :param throttled: Whether the server answered 429 or 503.
+        :param timed_out: Whether the request timed out.
+        :param failed: Whether the request failed without a response.
+        :param retry_after: The seconds the server asked to wait, if it sent a Retry-After header.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled or timed_out:
+                self._counters["throttled" if throttled else "timeouts"] += 1
+                count("rate.throttled" if throttled else "rate.timeouts")
+                if retry_after:
+                    self._pause(now, retry_after)
+                if self._decrease_limit(now, sent_at) and throttled:
+                    self._decrease_rate()
+            elif not failed:
+                self._successes.append(now)
+                self._observe_latency(now, sent_at)
+                self._increase_rate()
+            self._condition.notify_all()
+
+    def _pause(self, now, seconds):
+        """
+        Hold back every request until the server's Retry-After has passed. Call with the condition held.
+        :param now: The current monotonic time.
+        :param seconds: The seconds to pause.
+        """
+        paused_until = now + seconds
+        if paused_until > self._paused_until:
+            self._counters["paused_seconds"] += paused_until - max(now, self._paused_until)
+            self._paused_until = paused_until
+            count("rate.retry_after_pauses")
+
+    def _observe_latency(self, now, sent_at):
+        """
+        Grow the limit after a quick response, or shrink it if latency shows the server queueing.
+        Call with the condition held.
+        :param now: The current monotonic time.
+        :param sent_at: The time the request was sent.
+        """
+        latency = now - sent_at
+        if self._baseline is None:
+            self._baseline = self._smoothed = latency
+        else:
+            # The baseline follows the lowest latency, drifting up slowly in case the route changes
+            self._baseline = min(latency, self._baseline + (latency - self._baseline) * 0.01)
+            self._smoothed += self.SMOOTHING * (latency - self._smoothed)
+
+        if self._smoothed > self._baseline * self.latency_tolerance + self.latency_slack:
+            if self._decrease_limit(now, sent_at):
+                self._counters["latency_backoffs"] += 1
+                count("rate.latency_backoffs")
+        elif self._limit < self.maximum:
+            self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+            self._record_limit()
+
+    def _decrease_limit(self, now, sent_at):
+        """
+        Multiply the limit by the decrease factor, unless the request was sent before the last
+        decrease or less than a round trip has passed since. Call with the condition held.
+        :param now: The current monotonic time.
+        :param sent_at: The time the request reporting congestion was sent.
+        :return: Whether the limit was decreased.
+        """
+        if sent_at < self._last_decrease or now - self._last_decrease < (self._smoothed or 0.1):
+            return False
+        self._last_decrease = now
+        self._limit = max(self.minimum, self._limit * self.decrease)
+        self._counters["decreases"] += 1
+        self._record_limit()
+        return True
+
+    def _decrease_rate(self):
+        """
+        Pace requests evenly at a fraction of the rate of the latest successful responses.
+        Call with the condition held.
+        """
+        rate = self.bucket.rate if self.bucket is not None else float("inf")
+        if len(self._successes) > 1 and self._successes[-1] > self._successes[0]:
+            rate = min(rate, (len(self._successes) - 1) / (self._successes[-1] - self._successes[0]))
+        if rate == float("inf"):
+            rate = self.limit / (self._smoothed or 1.0)
+        rate = max(self.MIN_RATE, rate * self.decrease)
+        # Successes before a throttle, or spread across a pause, no longer show what the server allows
+        self._successes.clear()
+        if self.bucket is None:
+            self.bucket = TokenBucket(rate, 1)
+        else:
+            self.bucket.set_rate(rate, 1)
+        gauge("rate.requests_per_second", rate)
+
+    def _increase_rate(self):
+        """
+        Raise the request rate after a successful response, up to max_rate. Call with the condition held.
+        """
+        if self.bucket is None or (self.max_rate is not None and self.bucket.rate >= self.max_rate):
+            return
+        rate = self.bucket.rate + self.increase / self.bucket.rate
+        if self.max_rate is not None:
+            rate = min(rate, self.max_rate)
+        self.bucket.set_rate(rate)
+        gauge("rate.requests_per_second", rate)
+
+    def _record_limit(self):
+        """
+        Record the current limit in the history and the concurrency limit gauge. Call with the condition held.
+        """
+        limit = self.limit
+        if not self.history or self.history[-1][1] != limit:
+            self.history.append((time.monotonic() - self._created, limit))
+            gauge("rate.concurrency_limit", limit)
+
+    def stats(self):
+        """
+        Return a snapshot of the limiter state and counters.
+        :return: A dictionary with limit, in_flight, rate (None if uncapped), baseline and smoothed
+            latency in seconds, and the counters.
+        """
+        with self._condition:
+            return {"limit": self.limit, "in_flight": self.in_flight,
+                    "rate": self.bucket.rate if self.bucket is not None else None,
+                    "baseline_latency": self._baseline, "smoothed_latency": self._smoothed, **self._counters}
@@ -0,0 +1,282 @@
+"""
+This module reads and writes scraped weather records as files, one record at a time.
+
+Records are `{'Max', 'Min', 'Mean'}` dictionaries keyed by a YYYY-MM-DD date, as produced
+by `WeatherScraper`. The file format is chosen by the file extension:
+- `.jsonl`: one JSON object per line, such as `{"date": "2024-12-01", "Max": -8.8, ...}`.
+- `.csv`: a `date,Max,Min,Mean` header followed by one row per day, blank where missing.
+- `.bin`: a 4-byte magic header followed by fixed-width little-endian records of a
+  days-since-1970 int32 and three float64 temperatures, NaN where missing.
+- `.txt`: the legacy `date: {dict}` lines written by older versions, read with
+  `ast.literal_eval` rather than `eval`.
+
+`load_file` streams any of these files into the database through `DBOperations.bulk_insert`.
+
+Usage:
+    python record_io.py weather_data.txt [--db weather_data.db] [--station 27174]
+"""
+
+import abc
+import argparse
+import ast
+import csv
+import json
+import math
+import os
+import struct
+from datetime import date, timedelta
+from db_operations import DBOperations
+from stations import DEFAULT_STATION_ID
+
+BINARY_MAGIC = b"WXR1"
+BINARY_RECORD = struct.Struct("<i3d")
+_EPOCH = date(1970, 1, 1)
+_KEYS = ("Max", "Min", "Mean")
+
+
+def _format_of(file_name):
+    """
+    Determine the record format from a file name.
+    :param file_name: The name of the file.
+    :return: The extension without the dot, such as "jsonl".
+    :raises ValueError: If the extension is not a supported format.
+    """
+    extension = os.path.splitext(file_name)[1].lower().lstrip(".")
+    if extension not in _WRITERS:
+        raise ValueError(f"Unsupported record file type: {file_name}")
+    return extension
+
+
+class RecordWriter(abc.ABC):
+    """
+    The base class of the streaming record writers. Subclasses implement _write_record.
+
+    Writers are context managers; records given to write() are written immediately
+    through the file's buffer and the file is closed when the block ends.
+
+    Attributes:
+        file_name (str): The name of the file being written.
+        count (int): The number of records written so far.
+    """
+    mode = "w"
+
+    def __init__(self, file_name):
+        """
+        Open the file and write any header.
+        :param file_name: The name of the file to write.
+        """
+        self.file_name = file_name
+        self.count = 0
+        self.file = open(file_name, self.mode, **({} if "b" in self.mode else {"newline": "", "encoding": "utf-8"}))
+        self._write_header()
+
+    def _write_header(self):
+        """
+        Write the header of the format, if it has one.
+        """
+
+    @abc.abstractmethod
+    def _write_record(self, sample_date, weather):
+        """
+        Write one record.
+        :param sample_date: The date in YYYY-MM-DD format.
+        :param weather: The dictionary of 'Max', 'Min' and 'Mean' temperatures.
+        """
+
+    def write(self, records):
+        """
+        Write records.
+        :param records: A dictionary of weather data indexed by date.
+        """
+        for sample_date, weather in records.items():
+            self._write_record(sample_date, weather)
+        self.count += len(records)
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JSONLinesWriter(RecordWriter):
+    """
+    Writes one JSON object per line.
+    """
+    def _write_record(self, sample_date, weather):
+        self.file.write(json.dumps({"date": sample_date, **{key: weather.get(key) for key in _KEYS}}) + "\n")
+
+
+class CSVRecordWriter(RecordWriter):
+    """
+    Writes a date,Max,Min,Mean CSV file.
+    """
+    def _write_header(self):
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(("date", *_KEYS))
+
+    def _write_record(self, sample_date, weather):
+        self.writer.writerow((sample_date, *("" if weather.get(key) is None else weather[key] for key in _KEYS)))
+
+
+class BinaryRecordWriter(RecordWriter):
+    """
+    Writes fixed-width struct records after a magic header.
+    """
+    mode = "wb"
+
+    def _write_header(self):
+        self.file.write(BINARY_MAGIC)
+
+    def _write_record(self, sample_date, weather):
+        day = (date.fromisoformat(sample_date) - _EPOCH).days
+        self.file.write(BINARY_RECORD.pack(day, *(math.nan if weather.get(key) is None else weather[key]
+                                                  for key in _KEYS)))
+
+
+class LegacyTextWriter(RecordWriter):
+    """
+    Writes the legacy `date: {dict}` lines, for tools that still read them.
+    """
+    def _write_record(self, sample_date, weather):
+        self.file.write(f"{sample_date}: {weather}\n")
+
+
+_WRITERS = {
+    "jsonl": JSONLinesWriter,
+    "csv": CSVRecordWriter,
+    "bin": BinaryRecordWriter,
+    "txt": LegacyTextWriter,
+}
+
+
+def open_writer(file_name):
+    """
+    Open a streaming writer for the format given by the file extension.
+    :param file_name: The name of the file to write.
+    :return: A RecordWriter.
+    :raises ValueError: If the extension is not a supported format.
+    """
+    return _WRITERS[_format_of(file_name)](file_name)
+
+
+def _read_jsonl(file_name):
+    """
+    Stream the records of a JSON lines file.
+    :param file_name: The name of the file to read.
+    :return: A generator of (sample_date, weather dictionary) tuples.
+    """
+    with open(file_name, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["date"], {key: record.get(key) for key in _KEYS}
+
+
+def _read_csv(file_name):
+    """
+    Stream the records of a CSV file.
+    :param file_name: The name of the file to read.
+    :return: A generator of (sample_date, weather dictionary) tuples.
+    """
+    with open(file_name, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield row["date"], {key: float(row[key]) if row[key] else None for key in _KEYS}
+
+
+def _read_bin(file_name, chunk_records=4096):
+    """
+    Stream the records of a binary file, unpacking a chunk of records at a time.
+    :param file_name: The name of the file to read.
+    :param chunk_records: The number of records read per chunk.
+    :return: A generator of (sample_date, weather dictionary) tuples.
+    """
+    with open(file_name, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{file_name} is not a binary weather record file.")
+        while True:
+            chunk = f.read(BINARY_RECORD.size * chunk_records)
+            if not chunk:
+                break
+            if len(chunk) % BINARY_RECORD.size:
+                raise ValueError(f"{file_name} ends with a truncated record.")
+            for day, *temperatures in BINARY_RECORD.iter_unpack(chunk):
+                yield ((_EPOCH + timedelta(days=day)).isoformat(),
+                       {key: None if math.isnan(value) else value for key, value in zip(_KEYS, temperatures)})
+
+
+def _read_txt(file_name):
+    """
+    Stream the records of a legacy text dump without evaluating code.
+    :param file_name: The name of the file to read.
+    :return: A generator of (sample_date, weather dictionary) tuples.
+    """
+    with open(file_name, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            sample_date, separator, data = line.partition(": ")
+            try:
+                weather = ast.literal_eval(data)
+            except (SyntaxError, ValueError) as e:
+                raise ValueError(f"{file_name}:{line_number}: unreadable record ({e})") from e
+            if not separator or not isinstance(weather, dict):
+                raise ValueError(f"{file_name}:{line_number}: expected 'date: {{...}}'")
+            yield sample_date.strip(), {key: weather.get(key) for key in _KEYS}
+
+
+_READERS = {
+    "jsonl": _read_jsonl,
+    "csv": _read_csv,
+    "bin": _read_bin,
+    "txt": _read_txt,
+}
+
+
+def read_records(file_name):
+    """
+    Stream the records of a file in the format given by its extension.
+    :param file_name: The name of the file to read.
+    :return: A generator of (sample_date, weather dictionary) tuples.
+    :raises ValueError: If the extension is unsupported or the file is malformed.
+    """
+    return _READERS[_format_of(file_name)](file_name)
+
+
+def load_file(file_name, db_operations, station_id=DEFAULT_STATION_ID, on_conflict="update"):
+    """
+    Load a record file into the database in bulk.
+    :param file_name: The name of the file to load.
+    :param db_operations: The DBOperations of the target database.
+    :param station_id: The station the records were recorded at.
+    :param on_conflict: "update" to overwrite existing days, or "ignore" to keep them.
+    :return: The number of records loaded.
+    """
+    rows = ((station_id, sample_date, weather["Min"], weather["Max"], weather["Mean"])
+            for sample_date, weather in read_records(file_name))
+    return db_operations.bulk_insert(rows, on_conflict=on_conflict)
+
+
+def main():
+    """
+    Load a record file, such as an old weather_data.txt dump, into the database.
+    """
+    parser = argparse.ArgumentParser(description="Load a weather record file into the database.")
+    parser.add_argument("file_name", help="A .jsonl, .csv, .bin or legacy .txt record file.")
+    parser.add_argument("--db", default="weather_data.db", help="The database file to load into.")
+    parser.add_argument("--station", type=int, default=DEFAULT_STATION_ID, help="The station of the records.")
+    args = parser.parse_args()
+
+    db = DBOperations(args.db)
+    db.initialize_db()
+    print(f"Loaded {load_file(args.file_name, db, args.station)} records from {args.file_name}.")
+
+
+if __name__ == "__main__":
+    main()
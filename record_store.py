@@ -0,0 +1,190 @@
+"""
+This module provides a compact, array-backed store for scraped weather records.
+
+A dictionary of date strings to `{'Max', 'Min', 'Mean'}` dictionaries costs several
+hundred bytes per day. `WeatherRecordStore` keeps the same data in three `array('d')`
+columns indexed by day, plus a `bytearray` of presence flags, for about 25 bytes per
+day. Missing temperatures are stored as NaN.
+
+The store is a `MutableMapping` with date string keys, so code written for the
+dictionary keeps working: values are returned as fresh `{'Max', 'Min', 'Mean'}`
+dictionaries, iteration is in date order, and `update()` accepts dictionaries or
+other stores. Bulk consumers should use `iter_rows()`, which reads the columns
+directly without building the per-day dictionaries.
+"""
+
+import math
+from array import array
+from collections.abc import MutableMapping
+from datetime import date, timedelta
+
+_EPOCH = date(1970, 1, 1)
+_KEYS = ("Max", "Min", "Mean")
+
+
+def _epoch_day(sample_date):
+    """
+    Convert a YYYY-MM-DD date to days since 1970-01-01.
+    :param sample_date: The date string.
+    :return: The day number.
+    """
+    return (date.fromisoformat(sample_date) - _EPOCH).days
+
+
+def _value(number):
+    """
+    Convert a stored float back to a temperature.
+    :param number: The stored float.
+    :return: The float, or None if it is NaN.
+    """
+    return None if math.isnan(number) else number
+
+
+class WeatherRecordStore(MutableMapping):
+    """
+    A dictionary-compatible store of daily weather records backed by dense arrays.
+
+    The columns cover a contiguous range of days starting at `first_day`. The range
+    grows in either direction by doubling, so scraping newest first and oldest first
+    are both amortized constant time per day.
+
+    Unlike a dictionary, iteration is in date order rather than insertion order: the
+    columns do not record when a day was added. A scrape, which fills months newest
+    first, therefore saves and writes its records oldest first.
+
+    Attributes:
+        first_day (int): The epoch day stored at index 0 of the columns.
+
+    Methods:
+        iter_rows(station_id):
+            Yields database rows for every stored day, in date order.
+
+        memory_bytes():
+            Returns the bytes held by the columns and presence flags.
+    """
+    __slots__ = ("first_day", "_columns", "_present", "_count")
+
+    def __init__(self, records=None):
+        """
+        Initialize the store.
+        :param records: An optional dictionary or store of weather data indexed by date.
+        """
+        self.first_day = 0
+        self._columns = tuple(array("d") for _ in _KEYS)
+        self._present = bytearray()
+        self._count = 0
+        if records:
+            self.update(records)
+
+    def _index(self, sample_date):
+        """
+        Return the column index of a date, or None if it lies outside the stored range.
+        :param sample_date: The date string.
+        :return: The index or None.
+        """
+        index = _epoch_day(sample_date) - self.first_day
+        return index if 0 <= index < len(self._present) else None
+
+    def _reserve(self, day):
+        """
+        Grow the columns so that they cover a day.
+        :param day: The epoch day to cover.
+        :return: The column index of the day.
+        """
+        size = len(self._present)
+        if not size:
+            self.first_day = day
+        index = day - self.first_day
+        if index < 0:
+            grow = max(-index, size, 32)
+            self.first_day -= grow
+            padding = array("d", [math.nan]) * grow
+            for column in self._columns:
+                column[0:0] = padding
+            self._present[0:0] = bytes(grow)
+            index += grow
+        elif index >= size:
+            grow = max(index - size + 1, size, 32)
+            padding = array("d", [math.nan]) * grow
+            for column in self._columns:
+                column.extend(padding)
+            self._present.extend(bytes(grow))
+        return index
+
+    def __getitem__(self, sample_date):
+        index = self._index(sample_date)
+        if index is None or not self._present[index]:
+            raise KeyError(sample_date)
+        return {key: _value(column[index]) for key, column in zip(_KEYS, self._columns)}
+
+    def __setitem__(self, sample_date, weather):
+        index = self._reserve(_epoch_day(sample_date))
+        for key, column in zip(_KEYS, self._columns):
+            value = weather.get(key)
+            column[index] = math.nan if value is None else value
+        if not self._present[index]:
+            self._present[index] = 1
+            self._count += 1
+
+    def __delitem__(self, sample_date):
+        index = self._index(sample_date)
+        if index is None or not self._present[index]:
+            raise KeyError(sample_date)
+        self._present[index] = 0
+        for column in self._columns:
+            column[index] = math.nan
+        self._count -= 1
+
+    def __contains__(self, sample_date):
+        try:
+            index = self._index(sample_date)
+        except (TypeError, ValueError):
+            return False
+        return index is not None and bool(self._present[index])
+
+    def __iter__(self):
+        for index, present in enumerate(self._present):
+            if present:
+                yield (_EPOCH + timedelta(days=self.first_day + index)).isoformat()
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return f"WeatherRecordStore({self._count} days)"
+
+    def update(self, records=(), **kwargs):
+        """
+        Merge records into the store.
+        :param records: A dictionary or store of weather data indexed by date.
+        """
+        if isinstance(records, WeatherRecordStore):
+            for index, present in enumerate(records._present):
+                if present:
+                    target = self._reserve(records.first_day + index)
+                    for column, source in zip(self._columns, records._columns):
+                        column[target] = source[index]
+                    if not self._present[target]:
+                        self._present[target] = 1
+                        self._count += 1
+            return
+        super().update(records, **kwargs)
+
+    def iter_rows(self, station_id):
+        """
+        Yield database rows for every stored day, in date order.
+        :param station_id: The station the records were recorded at.
+        :return: A generator of (station_id, sample_date, min_temp, max_temp, avg_temp) tuples.
+        """
+        max_column, min_column, mean_column = self._columns
+        for index, present in enumerate(self._present):
+            if present:
+                yield (station_id, (_EPOCH + timedelta(days=self.first_day + index)).isoformat(),
+                       _value(min_column[index]), _value(max_column[index]), _value(mean_column[index]))
+
+    def memory_bytes(self):
+        """
+        Return the bytes held by the columns and presence flags.
+        :return: The size in bytes.
+        """
+        return sum(column.itemsize * len(column) for column in self._columns) + len(self._present)
@@ -0,0 +1,307 @@
+"""
+This module maintains pre-aggregated monthly rollups of the daily mean temperatures.
+
+The `RollupOperations` class keeps a `monthly_rollup` table with one row per station
+and month: the number of days with a mean temperature, their minimum, maximum, mean,
+sum and sum of squares, and a histogram of the values at 0.1 °C resolution. Source
+data is published to one decimal place, so the histogram is an exact quantile sketch:
+it merges across months and years without losing precision. A `yearly_rollup` view
+sums the monthly rows per year.
+
+Rollups are refreshed for exactly the months touched by each insert, so box plots
+and summaries over decades read a few hundred rollup rows instead of every day.
+A consistency checker rebuilds the rollups from the raw rows and reports differences.
+"""
+
+import json
+import numpy as np
+from dbcm import DBCM
+
+_ROLLUP_COLUMNS = "station_id, year, month, day_count, min_temp, max_temp, mean_temp, sum_temp, sum_sq_temp"
+
+_AGGREGATE_SQL = """
+SELECT w.station_id, w.sample_year, w.sample_month, COUNT(w.avg_temp), MIN(w.avg_temp),
+       MAX(w.avg_temp), AVG(w.avg_temp), SUM(w.avg_temp), SUM(w.avg_temp * w.avg_temp)
+FROM {source}
+GROUP BY w.station_id, w.sample_year, w.sample_month
+"""
+
+_HISTOGRAM_SQL = """
+SELECT w.station_id, w.sample_year, w.sample_month, CAST(round(w.avg_temp * 10) AS INTEGER), COUNT(*)
+FROM {source}
+WHERE w.avg_temp IS NOT NULL
+GROUP BY w.station_id, w.sample_year, w.sample_month, 4
+"""
+
+MONTHLY_ROLLUP_QUERY = """
+SELECT year, month, day_count, min_temp, max_temp, mean_temp, sum_temp, sum_sq_temp, histogram
+FROM monthly_rollup WHERE station_id = ? AND year BETWEEN ? AND ?
+ORDER BY year, month;
+"""
+
+# CROSS JOIN keeps the touched months as the outer loop, so each one is a range search
+_TOUCHED_SOURCE = """
+rollup_touched t CROSS JOIN weather w
+  ON w.station_id = t.station_id AND w.sample_year = t.year AND w.sample_month = t.month
+"""
+
+
+def merge_histograms(histograms):
+    """
+    Merge several histograms into one.
+    :param histograms: An iterable of dictionaries mapping tenths of a degree to counts.
+    :return: A tuple of (sorted bucket array, count array).
+    """
+    buckets = []
+    counts = []
+    for histogram in histograms:
+        buckets.extend(histogram.keys())
+        counts.extend(histogram.values())
+    buckets, inverse = np.unique(np.array(buckets, dtype=np.int64), return_inverse=True)
+    return buckets, np.bincount(inverse, weights=counts, minlength=len(buckets)).astype(np.int64)
+
+
+def box_stats(buckets, counts, label=None):
+    """
+    Compute matplotlib box plot statistics from a merged histogram.
+
+    The quartiles use the same linear interpolation as numpy.percentile, and the
+    whiskers reach the furthest values within 1.5 times the interquartile range,
+    so the result matches what plt.boxplot would draw from the raw values.
+
+    :param buckets: The sorted array of tenths of a degree.
+    :param counts: The array of counts of each bucket.
+    :param label: The label of the box.
+    :return: A statistics dictionary accepted by Axes.bxp.
+    """
+    total = int(counts.sum())
+    if not total:
+        nan = float("nan")
+        return {"label": label, "med": nan, "q1": nan, "q3": nan, "whislo": nan, "whishi": nan,
+                "mean": nan, "fliers": []}
+
+    values = buckets / 10
+    cumulative = np.cumsum(counts)
+    positions = np.array([0.25, 0.5, 0.75]) * (total - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, total - 1)
+    # The value at sorted index i is the first bucket whose cumulative count exceeds i
+    low_values = values[np.searchsorted(cumulative, lower, side="right")]
+    high_values = values[np.searchsorted(cumulative, upper, side="right")]
+    q1, med, q3 = low_values + (high_values - low_values) * (positions - lower)
+
+    iqr = q3 - q1
+    outside = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+    inside = values[~outside]
+    return {"label": label, "med": float(med), "q1": float(q1), "q3": float(q3),
+            "whislo": float(inside.min()) if inside.size else float(q1),
+            "whishi": float(inside.max()) if inside.size else float(q3),
+            "mean": float((buckets * counts).sum()) / 10 / total,
+            "fliers": np.repeat(values[outside], counts[outside])}
+
+
+def box_stats_by_month(rows, labels=None):
+    """
+    Compute box plot statistics for each calendar month from rollup rows.
+    :param rows: An iterable of rows as returned by RollupOperations.fetch_monthly, from any stations.
+    :param labels: Twelve box labels, January first.
+    :return: A list of twelve statistics dictionaries accepted by Axes.bxp.
+    """
+    by_month = {month: [] for month in range(1, 13)}
+    for row in rows:
+        by_month[row[1]].append(row[-1])
+    labels = labels or [None] * 12
+    return [box_stats(*merge_histograms(by_month[month]), labels[month - 1]) for month in range(1, 13)]
+
+
+class RollupOperations:
+    """
+    A class to maintain and query the monthly rollups of the weather table.
+
+    Attributes:
+        db_name (str): The name of the SQLite database file.
+
+    Methods:
+        initialize_db():
+            Creates the rollup table and view, building the rollups if the table is new.
+
+        refresh(months):
+            Recomputes the rollups of the given (station_id, year, month) keys from raw data.
+
+        rebuild():
+            Recomputes every rollup from raw data.
+
+        fetch_monthly(start_year, end_year, station_id):
+            Returns the rollup rows of a station for a year range.
+
+        monthly_box_stats(start_year, end_year, station_ids):
+            Returns box plot statistics for each calendar month over a year range.
+
+        check():
+            Rebuilds the rollups in memory and reports where the stored rows differ.
+    """
+    def __init__(self, db_name="weather_data.db"):
+        """
+        Initialize the RollupOperations with the database name.
+        :param db_name: The name of the SQLite database file.
+        """
+        self.db_name = db_name
+
+    def initialize_db(self):
+        """
+        Create the rollup table and the yearly view, building the rollups if the table is new.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_rollup';")
+            is_new = cursor.fetchone() is None
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_rollup (
+                station_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                day_count INTEGER NOT NULL,
+                min_temp REAL,
+                max_temp REAL,
+                mean_temp REAL,
+                sum_temp REAL,
+                sum_sq_temp REAL,
+                histogram TEXT NOT NULL DEFAULT '{}',
+                PRIMARY KEY (station_id, year, month)
+            );
+            """)
+            cursor.execute("""
+            CREATE VIEW IF NOT EXISTS yearly_rollup AS
+            SELECT station_id, year, SUM(day_count) AS day_count, MIN(min_temp) AS min_temp,
+                   MAX(max_temp) AS max_temp, SUM(sum_temp) / SUM(day_count) AS mean_temp,
+                   SUM(sum_temp) AS sum_temp, SUM(sum_sq_temp) AS sum_sq_temp
+            FROM monthly_rollup GROUP BY station_id, year;
+            """)
+            if is_new:
+                self.rebuild()
+
+    def _compute(self, cursor, source="weather w"):
+        """
+        Aggregate raw rows into rollup rows.
+        :param cursor: The cursor to run the queries with.
+        :param source: The FROM clause, which may join the weather table to restrict the months.
+        :return: A dictionary mapping (station_id, year, month) to (aggregate tuple, histogram JSON).
+        """
+        cursor.execute(_AGGREGATE_SQL.format(source=source))
+        rows = {row[:3]: row for row in cursor.fetchall()}
+        histograms = {key: {} for key in rows}
+        cursor.execute(_HISTOGRAM_SQL.format(source=source))
+        for station_id, year, month, bucket, count in cursor.fetchall():
+            histograms[(station_id, year, month)][bucket] = count
+        return {key: (row, json.dumps(histograms[key], separators=(",", ":")))
+                for key, row in rows.items()}
+
+    def _store(self, cursor, computed):
+        """
+        Write computed rollup rows.
+        :param cursor: The cursor to write with.
+        :param computed: The result of _compute.
+        """
+        cursor.executemany(f"""
+        INSERT OR REPLACE INTO monthly_rollup ({_ROLLUP_COLUMNS}, histogram)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """, [(*row, histogram) for row, histogram in computed.values()])
+
+    def refresh(self, months):
+        """
+        Recompute the rollups of the given months from the raw weather rows.
+        Months without any raw rows left lose their rollup row.
+
+        :param months: An iterable of (station_id, year, month) tuples.
+        """
+        months = list(months)
+        if not months:
+            return
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS rollup_touched (
+                station_id INTEGER, year INTEGER, month INTEGER,
+                PRIMARY KEY (station_id, year, month)
+            );
+            """)
+            cursor.execute("DELETE FROM rollup_touched;")
+            cursor.executemany("INSERT OR IGNORE INTO rollup_touched VALUES (?, ?, ?);", months)
+            cursor.execute("""
+            DELETE FROM monthly_rollup WHERE (station_id, year, month) IN
+                (SELECT station_id, year, month FROM rollup_touched);
+            """)
+            self._store(cursor, self._compute(cursor, _TOUCHED_SOURCE))
+            cursor.execute("DELETE FROM rollup_touched;")
+
+    def rebuild(self):
+        """
+        Recompute every rollup from the raw weather rows.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("DELETE FROM monthly_rollup;")
+            self._store(cursor, self._compute(cursor))
+
+    def purge(self):
+        """
+        Delete every rollup row.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("DELETE FROM monthly_rollup;")
+
+    def fetch_monthly(self, start_year, end_year, station_id):
+        """
+        Fetch the rollup rows of a station for a year range.
+        :param start_year: The first year.
+        :param end_year: The last year.
+        :param station_id: The station to fetch.
+        :return: A list of (year, month, day_count, min, max, mean, sum, sum_sq, histogram dict) tuples.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute(MONTHLY_ROLLUP_QUERY, (station_id, start_year, end_year))
+            rows = cursor.fetchall()
+        return [(*row[:-1], {int(bucket): count for bucket, count in json.loads(row[-1]).items()})
+                for row in rows]
+
+    def monthly_box_stats(self, start_year, end_year, station_ids, labels=None):
+        """
+        Compute box plot statistics for each calendar month over a year range.
+        :param start_year: The first year.
+        :param end_year: The last year.
+        :param station_ids: A station ID or a list of them, whose values are pooled.
+        :param labels: Twelve box labels, January first.
+        :return: A list of twelve statistics dictionaries accepted by Axes.bxp.
+        """
+        if isinstance(station_ids, int):
+            station_ids = [station_ids]
+        return box_stats_by_month((row for station_id in station_ids
+                                   for row in self.fetch_monthly(start_year, end_year, station_id)), labels)
+
+    def check(self, tolerance=1e-6):
+        """
+        Rebuild the rollups in memory from the raw rows and diff them against the stored rows.
+        :param tolerance: The largest difference allowed between stored and rebuilt numbers.
+        :return: A list of (station_id, year, month, field, stored value, rebuilt value) tuples.
+        """
+        with DBCM(self.db_name) as cursor:
+            expected = self._compute(cursor)
+            cursor.execute(f"SELECT {_ROLLUP_COLUMNS}, histogram FROM monthly_rollup;")
+            stored = {row[:3]: (row[:-1], row[-1]) for row in cursor.fetchall()}
+
+        fields = _ROLLUP_COLUMNS.split(", ") + ["histogram"]
+        differences = []
+        for key in sorted(set(expected) | set(stored)):
+            if key not in stored:
+                differences.append((*key, "row", None, "present"))
+                continue
+            if key not in expected:
+                differences.append((*key, "row", "present", None))
+                continue
+            stored_values = (*stored[key][0], json.loads(stored[key][1]))
+            expected_values = (*expected[key][0], json.loads(expected[key][1]))
+            for field, have, want in zip(fields, stored_values, expected_values):
+                if isinstance(have, float) and isinstance(want, float):
+                    if abs(have - want) <= tolerance * max(1.0, abs(want)):
+                        continue
+                elif have == want:
+                    continue
+                differences.append((*key, field, have, want))
+        return differences
@@ -0,0 +1,254 @@
+"""
+This module provides a WeatherScraper backend that uses the bulk CSV download endpoint.
+
+The climate website can export a full year of daily data for a station as one CSV file,
+so a year costs one request instead of twelve HTML month pages. The `CSVWeatherScraper`
+class streams each yearly file through the `csv` module without loading it whole and
+maps the rows to the same `{'Max', 'Min', 'Mean'}` records as `WeatherScraper`.
+When a yearly CSV cannot be fetched or read, the months of that year are scraped
+from the HTML pages instead.
+
+A `csv_dir` can be given to read `<station>_<year>.csv` files from disk instead of the
+network, which is how the backend is exercised with local fixture files.
+"""
+
+import calendar
+import csv
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from itertools import islice
+from http_client import FetchError
+from instrumentation import count, traced
+from scrape_weather import WeatherScraper, HostRateLimiter
+
+_COLUMNS = {"Date/Time": "date", "Max Temp": "Max", "Min Temp": "Min", "Mean Temp": "Mean"}
+
+
+class CSVWeatherScraper(WeatherScraper):
+    """
+    A WeatherScraper that downloads one bulk CSV per year, falling back to HTML month pages.
+
+    Attributes:
+        csv_dir (str): A directory of local `<station>_<year>.csv` files used instead of the network.
+
+    Methods:
+        iter_scrape(start_date, end_date, max_workers=1, requests_per_second=None):
+            Yield the records of each month in the range, one yearly download at a time.
+
+        scrape(start_date, end_date):
+            Scrape weather data for the given date range one year at a time.
+
+        scrape_months(months, max_workers=8, requests_per_second=None):
+            Scrape only the given months, downloading each year they fall in once.
+
+        parse_csv_lines(lines, start_date, end_date):
+            Map the lines of a bulk CSV file to weather records.
+    """
+    BULK_PATH = "/climate_data/bulk_data_e.html"
+
+    def __init__(self, *args, csv_dir=None, **kwargs):
+        """
+        Initialize the scraper.
+
+        :param csv_dir: A directory of local `<station>_<year>.csv` files used instead of the network.
+        Other arguments are passed to WeatherScraper.
+        """
+        super().__init__(*args, **kwargs)
+        self.csv_dir = csv_dir
+
+    def _generate_csv_url(self, year, station_id=None):
+        """
+        Generate the bulk CSV download URL for a year of daily data.
+
+        :param year: The year to download.
+        :param station_id: The station to fetch, defaulting to the scraper's station.
+        :return: The URL of the yearly CSV file.
+        """
+        station_id = station_id or self.station_id
+        return (f"{self.base_url}{self.BULK_PATH}?format=csv&stationID={station_id}&Year={year}"
+                f"&Month=1&Day=1&timeframe=2&submit=Download+Data")
+
+    def _iter_csv_lines(self, year, timeout=30):
+        """
+        Stream the lines of the CSV file for a year.
+
+        :param year: The year to read.
+        :param timeout: The maximum time in seconds to wait for a response.
+        :return: A generator of decoded text lines.
+        :raises: FetchError if the file cannot be downloaded.
+        """
+        if self.csv_dir:
+            path = os.path.join(self.csv_dir, f"{self.station_id}_{year}.csv")
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                yield from f
+            return
+
+        url = self._generate_csv_url(year)
+        print(f"Scraping: {url}")
+        response = self.http_client.fetch(url, timeout=timeout, stream=True)
+        with response:
+            response.encoding = "utf-8-sig"
+            yield from response.iter_lines(decode_unicode=True)
+
+    def parse_csv_lines(self, lines, start_date, end_date):
+        """
+        Map the lines of a bulk CSV file to weather records.
+
+        :param lines: An iterable of CSV text lines, header first.
+        :param start_date: Rows before the first day of this date's month are skipped.
+        :param end_date: Rows after this date are skipped.
+        :return: A dictionary of weather data indexed by date.
+        :raises ValueError: If the header lacks a date or temperature column.
+        """
+        reader = csv.reader(lines)
+        header = next(reader, [])
+        positions = {}
+        for index, name in enumerate(header):
+            name = name.lstrip("\ufeff").strip()
+            for prefix, key in _COLUMNS.items():
+                if name.startswith(prefix) and key not in positions:
+                    positions[key] = index
+        if len(positions) != len(_COLUMNS):
+            raise ValueError(f"Unexpected CSV header: {header}")
+
+        first_day = start_date.replace(day=1).isoformat()
+        last_day = end_date.isoformat()
+        date_index = positions.pop("date")
+        width = max(positions.values()) + 1
+
+        records = {}
+        for row in reader:
+            if len(row) < width or not first_day <= row[date_index] <= last_day:
+                continue
+            weather = {}
+            for key, index in positions.items():
+                value = row[index].strip()
+                weather[key] = float(value) if value and value != "M" else None
+            if any(value is not None for value in weather.values()):
+                records[row[date_index]] = {"Max": weather["Max"], "Min": weather["Min"],
+                                            "Mean": weather["Mean"]}
+        count("scrape.records", len(records))
+        return records
+
+    @traced("scrape.csv_year")
+    def _scrape_year(self, year, start_date, end_date):
+        """
+        Scrape one year, from the CSV file if possible and from the HTML pages otherwise.
+
+        :param year: The year to scrape.
+        :param start_date: The start date of the whole scrape.
+        :param end_date: The end date of the whole scrape.
+        :return: A dictionary of weather data indexed by date.
+        """
+        year_start = max(start_date, date(year, 1, 1))
+        year_end = min(end_date, date(year, 12, 31))
+        try:
+            return self.parse_csv_lines(self._iter_csv_lines(year), year_start, year_end)
+        except (FetchError, OSError, csv.Error, ValueError) as e:
+            print(f"CSV download for {year} failed ({e}), falling back to HTML pages.")
+
+        records = {}
+        for month_date in self._iter_months(year_start, year_end):
+            url = self._generate_url_for_month(month_date)
+            print(f"Scraping: {url}")
+            records.update(self._parse_page(self._get_html(url))[1])
+        return records
+
+    def iter_scrape(self, start_date, end_date, max_workers=1, requests_per_second=None):
+        """
+        Scrape the given date range one year at a time, newest first, yielding each month's records.
+
+        Up to max_workers years are fetched ahead of the one being yielded. Every month
+        of a year is yielded, empty or not, and the scrape stops at the first year
+        without any records, except for the newest year, which may simply not have data yet.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :param max_workers: The maximum number of years fetched at the same time.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :return: A generator of (month date, dictionary of weather data indexed by date) tuples.
+        """
+        limiter = HostRateLimiter(requests_per_second)
+        years = iter(range(end_date.year, start_date.year - 1, -1))
+
+        def fetch(year):
+            limiter.wait(self._generate_csv_url(year))
+            return self._scrape_year(year, start_date, end_date)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            window = deque()
+
+            def fill():
+                for year in islice(years, max(max_workers - len(window), 0)):
+                    window.append((year, executor.submit(fetch, year)))
+
+            try:
+                fill()
+                while window:
+                    year, future = window.popleft()
+                    records = future.result()
+                    if not records and year != end_date.year:
+                        print("No more data found. Stopping scrape.")
+                        return
+
+                    fill()
+                    by_month = {}
+                    for sample_date, weather in records.items():
+                        by_month.setdefault(int(sample_date[5:7]), {})[sample_date] = weather
+                    for month_date in self._iter_months(max(start_date, date(year, 1, 1)),
+                                                        min(end_date, date(year, 12, 31))):
+                        yield month_date, by_month.get(month_date.month, {})
+            finally:
+                for _, future in window:
+                    future.cancel()
+
+    def scrape(self, start_date, end_date):
+        """
+        Scrape weather data for the given date range one year at a time, newest first.
+
+        The scrape stops at the first year without any records, except for the
+        newest year, which may simply not have data yet.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :return: A dictionary of weather data indexed by date.
+        """
+        for _, records in self.iter_scrape(start_date, end_date):
+            self._store_records(records)
+
+        return self.weather_data
+
+    def scrape_months(self, months, max_workers=8, requests_per_second=None):
+        """
+        Scrape only the given months, downloading each year they fall in once.
+
+        :param months: An iterable of dates, one in each month to fetch.
+        :param max_workers: The maximum number of years fetched at the same time.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :return: A dictionary mapping (year, month) to that month's dictionary of weather data.
+        """
+        limiter = HostRateLimiter(requests_per_second)
+        by_year = {}
+        for month_date in months:
+            by_year.setdefault(month_date.year, set()).add(month_date.month)
+
+        def fetch(year):
+            limiter.wait(self._generate_csv_url(year))
+            first = min(by_year[year])
+            last = max(by_year[year])
+            last_day = date(year, last, calendar.monthrange(year, last)[1])
+            return self._scrape_year(year, date(year, first, 1), last_day)
+
+        by_month = {(year, month): {} for year, wanted in by_year.items() for month in wanted}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for year, records in zip(by_year, executor.map(fetch, by_year)):
+                for sample_date, weather in records.items():
+                    key = (year, int(sample_date[5:7]))
+                    if key in by_month:
+                        by_month[key][sample_date] = weather
+
+        for records in by_month.values():
+            self._store_records(records)
+        return by_month
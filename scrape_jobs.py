@@ -0,0 +1,496 @@
+"""
+This module provides a persistent job queue for backfilling weather data with several processes.
+
+Every station/month of a backfill is a row of the `scrape_jobs` table. Worker processes
+claim a few jobs at a time and run them through a `ScrapePipeline`, saving each month in
+the same transaction that marks its job done. So:
+- A crash never loses or duplicates work, and running the backfill again resumes it.
+- Claims expire after a lease, and failed jobs are retried up to a number of attempts.
+- A done month fetched before it settled is queued again by the next run.
+
+Usage:
+    python scrape_jobs.py [--db weather_data.db] [--stations 27174 | --stations-file stations.txt]
+                          [--processes 4] [--metrics metrics.json]
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from db_operations import DBOperations, iter_weather_rows
+from dbcm import DBCM
+from http_client import HTTPClient
+from instrumentation import REGISTRY, enable, is_enabled
+from page_cache import PageCache, settled_date
+from rate_control import AdaptiveLimiter
+from scrape_pipeline import ScrapePipeline
+from scrape_weather import WeatherScraper
+from stations import DEFAULT_STATION_ID, load_station_ids, parse_station_ids
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+
+def worker_name():
+    """
+    Name the calling process as a worker, so its claims can be traced back to it.
+    :return: A "host:pid" string.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _is_orphaned(worker_id):
+    """
+    Check whether a worker named by worker_name() ran on this host and has exited.
+    :param worker_id: The name stored with a claim.
+    :return: True if the worker's process is known to be gone.
+    """
+    host, _, pid = (worker_id or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class JobQueue:
+    """
+    A table of station/month scrape jobs shared by worker processes.
+
+    The table itself is created by DBOperations.initialize_db.
+
+    Attributes:
+        db_name (str): The name of the SQLite database file.
+        lease_seconds (float): How long a claim lasts before the job can be claimed again.
+        max_attempts (int): The number of attempts after which a failed job is left alone.
+
+    Methods:
+        enqueue(station_ids, start_date, end_date):
+            Adds a job for every station and month in a range that has none yet, and reopens
+            done jobs fetched before their month settled.
+
+        claim(worker_id, limit=1):
+            Claims up to limit jobs, newest month first.
+
+        complete(station_id, year, month, record_count):
+            Marks a job done.
+
+        fail(station_id, year, month, error):
+            Records a failed attempt.
+
+        release(worker_id, error=None):
+            Returns the jobs a worker still holds to the queue, or records them as failed.
+
+        release_orphaned():
+            Returns the jobs claimed by worker processes that no longer exist to the queue.
+
+        retry_failed():
+            Gives failed jobs a fresh set of attempts.
+
+        progress():
+            Counts the jobs in each status.
+
+        reset(statuses=None):
+            Deletes jobs, all of them or those in the given statuses.
+    """
+    def __init__(self, db_name="weather_data.db", lease_seconds=300, max_attempts=3):
+        """
+        Initialize the job queue.
+        :param db_name: The name of the SQLite database file.
+        :param lease_seconds: How long a claim lasts before the job can be claimed again.
+        :param max_attempts: The number of attempts after which a failed job is left alone.
+        """
+        self.db_name = db_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, station_ids, start_date, end_date):
+        """
+        Add a job for every station and month in a range that has no job yet, and reopen
+        done jobs fetched before their month settled.
+        :param station_ids: The stations to backfill.
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :return: The number of jobs added or reopened.
+        """
+        months = [(year, month)
+                  for year in range(start_date.year, end_date.year + 1)
+                  for month in range(1, 13)
+                  if (start_date.year, start_date.month) <= (year, month) <= (end_date.year, end_date.month)]
+        jobs = [(station_id, year, month) for station_id in station_ids for year, month in months]
+        with DBCM(self.db_name) as cursor:
+            before = cursor.execute("SELECT COUNT(*) FROM scrape_jobs;").fetchone()[0]
+            cursor.executemany("INSERT OR IGNORE INTO scrape_jobs (station_id, year, month) VALUES (?, ?, ?);", jobs)
+            added = cursor.execute("SELECT COUNT(*) FROM scrape_jobs;").fetchone()[0] - before
+
+            # fetched_at is stored by SQLite's datetime('now'), which sorts as text against a date
+            cursor.executemany("""
+            UPDATE scrape_jobs SET status = 'pending', attempts = 0
+            WHERE station_id = ? AND year = ? AND month = ? AND status = 'done' AND fetched_at < ?;
+            """, [(station_id, year, month, str(settled_date(year, month))) for station_id, year, month in jobs])
+            return added + cursor.rowcount
+
+    def claim(self, worker_id, limit=1):
+        """
+        Claim up to limit jobs, newest month first, cycling through the stations of each month.
+
+        Pending jobs, failed jobs with attempts left and jobs whose claim has expired
+        can be claimed. The claim is a single UPDATE, so two workers never get the same job.
+
+        :param worker_id: A name for the claiming worker, stored with the claim.
+        :param limit: The maximum number of jobs to claim.
+        :return: A list of (station_id, year, month) tuples.
+        """
+        now = time.time()
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs
+            SET status = 'claimed', claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+            WHERE rowid IN (
+                SELECT rowid FROM scrape_jobs
+                WHERE status = 'pending'
+                   OR (status = 'failed' AND attempts < ?)
+                   OR (status = 'claimed' AND claimed_at < ?)
+                ORDER BY year DESC, month DESC, station_id
+                LIMIT ?
+            )
+            RETURNING station_id, year, month;
+            """, (worker_id, now, self.max_attempts, now - self.lease_seconds, limit))
+            return sorted(cursor.fetchall(), key=lambda job: (-job[1], -job[2], job[0]))
+
+    def complete(self, station_id, year, month, record_count):
+        """
+        Mark a job done. Call this inside the DBCM block that saves the month's records.
+        :param station_id: The station of the job.
+        :param year: The year of the job.
+        :param month: The month of the job.
+        :param record_count: The number of records saved.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs
+            SET status = 'done', record_count = ?, last_error = NULL, fetched_at = datetime('now'),
+                claimed_by = NULL, claimed_at = NULL
+            WHERE station_id = ? AND year = ? AND month = ?;
+            """, (record_count, station_id, year, month))
+
+    def fail(self, station_id, year, month, error):
+        """
+        Record a failed attempt. The job is retried until it reaches max_attempts.
+        :param station_id: The station of the job.
+        :param year: The year of the job.
+        :param month: The month of the job.
+        :param error: The exception or message describing the failure.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs SET status = 'failed', last_error = ?, claimed_by = NULL, claimed_at = NULL
+            WHERE station_id = ? AND year = ? AND month = ?;
+            """, (str(error), station_id, year, month))
+
+    def release(self, worker_id, error=None):
+        """
+        Return the jobs a worker still holds to the queue, such as those of a cancelled batch.
+        :param worker_id: The name the jobs were claimed with.
+        :param error: The exception or message to record them as failed with, or None to make them pending.
+        :return: The number of jobs released.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs
+            SET status = ?, last_error = COALESCE(?, last_error), claimed_by = NULL, claimed_at = NULL
+            WHERE status = 'claimed' AND claimed_by = ?;
+            """, (PENDING if error is None else FAILED, None if error is None else str(error), worker_id))
+            return cursor.rowcount
+
+    def release_orphaned(self):
+        """
+        Return jobs claimed by worker processes of this host that no longer exist to the queue,
+        without waiting for their lease to expire.
+        :return: The number of jobs released.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("SELECT DISTINCT claimed_by FROM scrape_jobs WHERE status = 'claimed';")
+            orphaned = [(worker_id,) for (worker_id,) in cursor.fetchall() if _is_orphaned(worker_id)]
+            cursor.executemany("""
+            UPDATE scrape_jobs SET status = 'pending', claimed_by = NULL, claimed_at = NULL
+            WHERE status = 'claimed' AND claimed_by = ?;
+            """, orphaned)
+            return cursor.rowcount if orphaned else 0
+
+    def retry_failed(self):
+        """
+        Give failed jobs a fresh set of attempts.
+        :return: The number of jobs reset.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("UPDATE scrape_jobs SET status = 'pending', attempts = 0 WHERE status = 'failed';")
+            return cursor.rowcount
+
+    def progress(self):
+        """
+        Count the jobs in each status.
+        :return: A dictionary mapping each status to its number of jobs.
+        """
+        with DBCM(self.db_name) as cursor:
+            cursor.execute("SELECT status, COUNT(*) FROM scrape_jobs GROUP BY status;")
+            counts = {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0}
+            counts.update(cursor.fetchall())
+            return counts
+
+    def reset(self, statuses=None):
+        """
+        Delete jobs so that their months are fetched again by the next backfill.
+        :param statuses: The statuses of the jobs to delete, or None for all jobs.
+        """
+        with DBCM(self.db_name) as cursor:
+            if statuses is None:
+                cursor.execute("DELETE FROM scrape_jobs;")
+            else:
+                cursor.executemany("DELETE FROM scrape_jobs WHERE status = ?;", [(status,) for status in statuses])
+
+
+class ClaimScheduler:
+    """
+    A source of (station, month) jobs for the fetcher threads of a ScrapePipeline,
+    claimed from a JobQueue a batch at a time.
+    """
+    def __init__(self, jobs, worker_id, batch_size=8):
+        """
+        Initialize the scheduler.
+        :param jobs: The JobQueue to claim jobs from.
+        :param worker_id: The name the jobs are claimed with.
+        :param batch_size: The number of jobs claimed at a time.
+        """
+        self.jobs = jobs
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self._claimed = deque()
+        self._lock = threading.Lock()
+
+    def next_job(self):
+        """
+        Return the next job, claiming another batch when the last one has been handed out.
+        :return: A (station ID, month date) tuple, or None when no jobs are left.
+        """
+        with self._lock:
+            if not self._claimed:
+                self._claimed.extend(self.jobs.claim(self.worker_id, self.batch_size))
+            if not self._claimed:
+                return None
+            station_id, year, month = self._claimed.popleft()
+            return station_id, date(year, month, 1)
+
+
+class JobPipeline(ScrapePipeline):
+    """
+    A ScrapePipeline that saves each month in the same transaction that marks its job done,
+    and records a month that fails as a failed job instead of stopping.
+
+    Attributes:
+        jobs (JobQueue): The queue the jobs come from.
+        done (int): The number of months saved.
+        failed (int): The number of failed attempts; a month is retried until it runs out of attempts.
+    """
+    def __init__(self, scraper, jobs, fetch_workers=8, parse_workers=None, queue_size=16,
+                 requests_per_second=None):
+        """
+        Initialize the pipeline.
+
+        :param scraper: The WeatherScraper used to build URLs and fetch pages.
+        :param jobs: The JobQueue the jobs come from.
+        :param fetch_workers: The number of fetcher threads.
+        :param parse_workers: The number of parser processes, or None for one per CPU.
+        :param queue_size: The maximum number of raw pages waiting to be parsed.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        """
+        super().__init__(scraper, None, fetch_workers, parse_workers, queue_size,
+                         requests_per_second=requests_per_second)
+        self.jobs = jobs
+        self.db_operations = DBOperations(jobs.db_name)
+        self.done = self.failed = 0
+        self._counts_lock = threading.Lock()
+
+    def _job_failed(self, job, error):
+        """
+        Record a month that could not be fetched, parsed or saved as a failed attempt.
+        :param job: The (station ID, month date) tuple that failed.
+        :param error: The exception raised.
+        """
+        station_id, month_date = job
+        self.jobs.fail(station_id, month_date.year, month_date.month, error)
+        with self._counts_lock:
+            self.failed += 1
+
+    def _save_month(self, batches, station_id, month_date, records):
+        """
+        Save a month's records and mark its job done in one transaction.
+        :param batches: Unused; every month is saved on its own.
+        :param station_id: The station the records belong to.
+        :param month_date: The month the records belong to.
+        :param records: A dictionary of weather data indexed by date.
+        :return: The number of records saved.
+        """
+        try:
+            with DBCM(self.jobs.db_name):
+                count = self.db_operations.bulk_insert(iter_weather_rows(records, station_id),
+                                                       on_conflict="update")
+                self.jobs.complete(station_id, month_date.year, month_date.month, count)
+        except Exception as e:
+            self._job_failed((station_id, month_date), e)
+            return 0
+        self.done += 1
+        return count
+
+    def _flush(self, batches):
+        """
+        Nothing is left to save; every month is saved as it arrives.
+        :return: 0.
+        """
+        return 0
+
+
+def run_worker(db_name, batch_size=8, requests_per_second=None, cache_dir=None, parser="fast",
+               base_url=None, adaptive=True, metrics=False, parse_workers=1):
+    """
+    Claim and process jobs until none are left. Runs in a worker process.
+
+    Claimed months go through a JobPipeline: batch_size fetcher threads download the
+    pages, parse_workers processes parse them, and a writer thread saves every month and
+    marks it done in its own transaction. With adaptive, an AdaptiveLimiter decides how
+    many of the fetcher threads have a request in flight.
+
+    :param db_name: The name of the SQLite database file.
+    :param batch_size: The number of jobs claimed and fetched at a time.
+    :param requests_per_second: Maximum requests per second this worker sends to each host.
+    :param cache_dir: Directory of the raw page cache, or None to always download pages.
+    :param parser: "fast" or "bs4".
+    :param base_url: The scheme and host pages are downloaded from, defaulting to the climate website.
+    :param adaptive: Whether to adapt the number of requests in flight to the latency and throttling the server shows.
+    :param metrics: Whether to record instrumentation spans and counters in this worker.
+    :param parse_workers: The number of processes parsing this worker's pages.
+    :return: A tuple of (months done, failed attempts, records saved, metrics snapshot or None).
+    """
+    if metrics:
+        # A forked worker starts with a copy of the parent's registry
+        REGISTRY.reset()
+        enable()
+    jobs = JobQueue(db_name)
+    worker_id = worker_name()
+    rate_limiter = AdaptiveLimiter(min(4, batch_size), maximum=batch_size,
+                                   requests_per_second=requests_per_second) if adaptive else None
+    scraper = WeatherScraper(HTTPClient(pool_size=max(10, batch_size), limiter=rate_limiter),
+                             PageCache(cache_dir) if cache_dir else None, parser, base_url=base_url)
+    pipeline = JobPipeline(scraper, jobs, fetch_workers=batch_size, parse_workers=parse_workers,
+                           requests_per_second=None if adaptive else requests_per_second)
+    try:
+        saved = pipeline.run_jobs(ClaimScheduler(jobs, worker_id, batch_size))
+    finally:
+        # Jobs claimed but not reached when the pipeline stopped go back to the queue
+        jobs.release(worker_id)
+        scraper.http_client.close()
+        DBCM.close_all(db_name)
+    return pipeline.done, pipeline.failed, saved, REGISTRY.snapshot() if metrics else None
+
+
+def run_backfill(db_name, station_ids, start_date, end_date, processes=2, batch_size=8,
+                 requests_per_second=None, cache_dir=None, parser="fast", base_url=None, adaptive=True,
+                 parse_workers=None):
+    """
+    Queue a backfill and work through it with several worker processes.
+
+    Months already done by an earlier run are not fetched again. Jobs left claimed by
+    workers that died are released, and failed jobs get a fresh set of attempts.
+    If instrumentation is enabled, the workers record metrics too and their snapshots
+    are merged into this process's registry.
+
+    :param db_name: The name of the SQLite database file.
+    :param station_ids: The stations to backfill.
+    :param start_date: The start date as a datetime.date object.
+    :param end_date: The end date as a datetime.date object.
+    :param processes: The number of worker processes.
+    :param batch_size: The number of jobs each worker claims and fetches at a time.
+    :param requests_per_second: Maximum requests per second to each host by all workers together.
+        Each worker gets an even share, so a worker left alone at the end of a backfill does not
+        use the others' share.
+    :param cache_dir: Directory of the raw page cache, or None to always download pages.
+    :param parser: "fast" or "bs4".
+    :param base_url: The scheme and host pages are downloaded from, defaulting to the climate website.
+    :param adaptive: Whether each worker adapts its number of requests in flight, up to batch_size.
+    :param parse_workers: The number of parser processes of each worker, or None to share the CPUs between them.
+    :return: The job counts by status once every worker has stopped.
+    """
+    DBOperations(db_name).initialize_db()
+    jobs = JobQueue(db_name)
+    added = jobs.enqueue(station_ids, start_date, end_date)
+    released = jobs.release_orphaned()
+    retried = jobs.retry_failed()
+    print(f"Queued {added} new or unsettled month jobs, released {released} orphaned and "
+          f"retrying {retried} failed; progress: {jobs.progress()}")
+
+    # Every worker paces and adapts its own share of the rate; none of them talks to the others
+    per_worker_rate = requests_per_second / processes if requests_per_second else None
+    parse_workers = parse_workers or max(1, (os.cpu_count() or 1) // processes)
+    metrics = is_enabled()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_worker, db_name, batch_size, per_worker_rate, cache_dir, parser,
+                                   base_url, adaptive, metrics, parse_workers)
+                   for _ in range(processes)]
+        for future in futures:
+            done, failed, saved, snapshot = future.result()
+            print(f"Worker finished: {done} months done, {failed} failed attempts, {saved} records saved.")
+            if snapshot is not None:
+                REGISTRY.merge(snapshot)
+
+    progress = jobs.progress()
+    print(f"Backfill progress: {progress}")
+    return progress
+
+
+def main():
+    """
+    Run a backfill from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Backfill weather data with resumable month jobs.")
+    parser.add_argument("--db", default="weather_data.db", help="The database file to fill.")
+    parser.add_argument("--stations", default=str(DEFAULT_STATION_ID), help="Comma separated station IDs.")
+    parser.add_argument("--stations-file", default=None,
+                        help="A file of station IDs, one or more per line, used instead of --stations.")
+    parser.add_argument("--start", default="2000-01-01", help="The first date, YYYY-MM-DD.")
+    parser.add_argument("--end", default=None, help="The last date, YYYY-MM-DD (default: today).")
+    parser.add_argument("--processes", type=int, default=2, help="The number of worker processes.")
+    parser.add_argument("--rps", type=float, default=10, help="Maximum requests per second.")
+    parser.add_argument("--cache-dir", default="page_cache", help="The raw page cache directory.")
+    parser.add_argument("--base-url", default=None,
+                        help="Download from this server instead of the climate website, e.g. a mock_climate_server.")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="Keep every worker thread's request in flight instead of adapting to the server.")
+    parser.add_argument("--metrics", default=None,
+                        help="Write span latencies and counters to this file (.prom for Prometheus text, else JSON).")
+    args = parser.parse_args()
+
+    if args.metrics:
+        enable()
+
+    end_date = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else date.today()
+    station_ids = load_station_ids(args.stations_file) if args.stations_file else parse_station_ids(args.stations)
+    run_backfill(args.db, station_ids, datetime.strptime(args.start, "%Y-%m-%d").date(),
+                 end_date, args.processes, requests_per_second=args.rps, cache_dir=args.cache_dir,
+                 base_url=args.base_url, adaptive=not args.fixed_concurrency)
+    if args.metrics:
+        REGISTRY.write(args.metrics)
+        print(f"Metrics written to {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+This module provides a producer/consumer pipeline for large weather data downloads.
+
+The `ScrapePipeline` class splits a scrape into three stages connected by bounded queues:
+- Fetcher threads take station/month jobs from a scheduler, such as a `StationScheduler`
+  or the claims of a `scrape_jobs.JobQueue`, download the month pages and push the raw
+  HTML onto a queue.
+- A dispatcher hands the pages to a `ProcessPoolExecutor` to parse.
+- A single writer thread batches the parsed records and saves them to SQLite.
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dbcm import DBCM
+from scrape_weather import WeatherScraper, HostRateLimiter
+
+_DONE = object()
+_worker_scraper = None
+
+
+def _parse_month_page(job, html, parser):
+    """
+    Parse a month page in a worker process.
+
+    :param job: The (station ID, month date) tuple the page belongs to.
+    :param html: HTML content of a month page.
+    :param parser: The parser the scraper in the parent process is configured with.
+    :return: A tuple of (job, dictionary of weather data indexed by date).
+    """
+    global _worker_scraper
+    if _worker_scraper is None:
+        _worker_scraper = WeatherScraper()
+    _worker_scraper.parser = parser
+    return job, _worker_scraper._parse_page(html)[1]
+
+
+class StationScheduler:
+    """
+    A thread-safe source of (station, month) jobs for the fetcher threads.
+
+    Jobs are handed out newest month first, cycling through every station for a
+    month before moving to the previous one, so the workers spread across stations
+    instead of draining one station's history at a time.
+    """
+    def __init__(self, scraper, station_ids, start_date, end_date):
+        """
+        Initialize the scheduler.
+
+        :param scraper: The WeatherScraper used to enumerate the months of the range.
+        :param station_ids: The stations to scrape.
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        """
+        months = list(scraper._iter_months(start_date, end_date))
+        self.total = len(months) * len(station_ids)
+        self._jobs = ((station_id, month_date) for month_date in months for station_id in station_ids)
+        self._lock = threading.Lock()
+
+    def next_job(self):
+        """
+        Return the next job.
+        :return: A (station ID, month date) tuple, or None when no jobs are left.
+        """
+        with self._lock:
+            return next(self._jobs, None)
+
+
+class ScrapePipeline:
+    """
+    A fetch, parse and write pipeline with backpressure between its stages.
+    """
+    def __init__(self, scraper, save_records, fetch_workers=8, parse_workers=None,
+                 queue_size=16, batch_size=1000, requests_per_second=None):
+        """
+        Initialize the pipeline.
+
+        :param scraper: The WeatherScraper used to build URLs and fetch pages.
+        :param save_records: Called with a dictionary of weather data and a station ID for each batch.
+        :param fetch_workers: The number of fetcher threads.
+        :param parse_workers: The number of parser processes, or None for one per CPU.
+        :param queue_size: The maximum number of raw pages waiting to be parsed.
+        :param batch_size: The number of records saved per batch.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        """
+        self.scraper = scraper
+        self.save_records = save_records
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.limiter = HostRateLimiter(requests_per_second)
+
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, target, item):
+        """
+        Put an item on a bounded queue, giving up if the pipeline is stopping.
+
+        :param target: The queue to put the item on.
+        :param item: The item to put.
+        :return: True if the item was queued.
+        """
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, error):
+        """
+        Record an error and stop all stages.
+        :param error: The exception raised by a stage.
+        """
+        self._errors.append(error)
+        self._stop.set()
+
+    def _job_failed(self, job, error):
+        """
+        Handle a month whose page could not be fetched or parsed. The pipeline stops at the
+        first such error; subclasses may record the failure and carry on with the other jobs.
+
+        :param job: The (station ID, month date) tuple that failed.
+        :param error: The exception raised.
+        """
+        self._fail(error)
+
+    def _save_month(self, batches, station_id, month_date, records):
+        """
+        Add a month's records to its station's batch, saving the batch once it is full.
+
+        :param batches: A dictionary of unsaved records per station, kept by the writer.
+        :param station_id: The station the records belong to.
+        :param month_date: The month the records belong to.
+        :param records: A dictionary of weather data indexed by date.
+        :return: The number of records saved.
+        """
+        batch = batches.setdefault(station_id, {})
+        batch.update(records)
+        if len(batch) < self.batch_size:
+            return 0
+        self.save_records(batches.pop(station_id), station_id)
+        return len(batch)
+
+    def _flush(self, batches):
+        """
+        Save the batches left once every month is written.
+        :param batches: A dictionary of unsaved records per station.
+        :return: The number of records saved.
+        """
+        saved = 0
+        for station_id, batch in batches.items():
+            if batch:
+                self.save_records(batch, station_id)
+                saved += len(batch)
+        return saved
+
+    def _fetch(self, scheduler, html_queue):
+        """
+        Fetcher stage: download pages until the scheduler runs out of jobs.
+
+        :param scheduler: The scheduler handing out (station, month) jobs.
+        :param html_queue: The bounded queue (job, raw page) tuples are pushed onto.
+        """
+        try:
+            while not self._stop.is_set():
+                job = scheduler.next_job()
+                if job is None:
+                    return
+
+                station_id, month_date = job
+                url = self.scraper._generate_url_for_month(month_date, station_id)
+                try:
+                    self.limiter.wait(url)
+                    print(f"Scraping: {url}")
+                    html = self.scraper._get_html(url)
+                except Exception as e:
+                    self._job_failed(job, e)
+                    continue
+                if not self._put(html_queue, (job, html)):
+                    return
+        except Exception as e:
+            self._fail(e)
+
+    def _write(self, record_queue, saved):
+        """
+        Writer stage: save the parsed records of each month.
+
+        :param record_queue: The bounded queue of (job, parsed page records) tuples.
+        :param saved: A one-item list the number of saved records is written to.
+        """
+        batches = {}
+        try:
+            while True:
+                item = record_queue.get()
+                if item is _DONE:
+                    break
+                (station_id, month_date), records = item
+                saved[0] += self._save_month(batches, station_id, month_date, records)
+            saved[0] += self._flush(batches)
+        except Exception as e:
+            self._fail(e)
+            while record_queue.get() is not _DONE:  # Drain so the dispatcher never blocks
+                pass
+        finally:
+            DBCM.close_thread()
+
+    def _collect(self, record_queue, job, future):
+        """
+        Pass a parsed page on to the writer.
+        :param record_queue: The bounded queue of (job, parsed page records) tuples.
+        :param job: The (station ID, month date) tuple the page belongs to.
+        :param future: The future of the parse.
+        """
+        try:
+            item = future.result()
+        except Exception as e:
+            self._job_failed(job, e)
+            return
+        self._put(record_queue, item)
+
+    def run(self, start_date, end_date, station_ids=None):
+        """
+        Scrape every month of every station in the range and save the parsed records.
+
+        Unlike WeatherScraper.scrape(), an empty month page does not end the run;
+        it simply yields no records.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :param station_ids: The stations to scrape, defaulting to the scraper's station.
+        :return: The number of records saved.
+        :raises: The first error raised by any stage.
+        """
+        return self.run_jobs(StationScheduler(self.scraper, station_ids or [self.scraper.station_id],
+                                              start_date, end_date))
+
+    def run_jobs(self, scheduler):
+        """
+        Scrape the jobs a scheduler hands out and save the parsed records.
+
+        :param scheduler: An object whose thread-safe next_job() returns a (station ID, month date)
+            tuple, or None when no jobs are left.
+        :return: The number of records saved.
+        :raises: The first error raised by any stage.
+        """
+        self._stop.clear()
+        self._errors = []
+        html_queue = queue.Queue(maxsize=self.queue_size)
+        record_queue = queue.Queue(maxsize=self.queue_size)
+        saved = [0]
+
+        fetchers = [threading.Thread(target=self._fetch, args=(scheduler, html_queue), daemon=True)
+                    for _ in range(self.fetch_workers)]
+        writer = threading.Thread(target=self._write, args=(record_queue, saved), daemon=True)
+        for thread in fetchers:
+            thread.start()
+        writer.start()
+
+        def fetchers_running():
+            return any(thread.is_alive() for thread in fetchers)
+
+        parse_workers = self.parse_workers or os.cpu_count() or 1
+        max_in_flight = 2 * parse_workers
+        with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+            in_flight = deque()
+            try:
+                while not self._stop.is_set():
+                    try:
+                        job, html = html_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        if fetchers_running() or not html_queue.empty():
+                            continue
+                        break
+                    in_flight.append((job, executor.submit(_parse_month_page, job, html, self.scraper.parser)))
+                    while len(in_flight) >= max_in_flight:
+                        self._collect(record_queue, *in_flight.popleft())
+                while in_flight and not self._stop.is_set():
+                    self._collect(record_queue, *in_flight.popleft())
+            except Exception as e:
+                self._fail(e)
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
+                record_queue.put(_DONE)
+
+        writer.join()
+        self._stop.set()
+        for thread in fetchers:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        return saved[0]
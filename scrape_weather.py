@@ -3,34 +3,103 @@ This module provides the WeatherScraper class, designed to scrape and process we
 from the Government of Canada Climate and Weather tracking website.
 
 The WeatherScraper class includes methods to:
-- Retrieve HTML content from a specified URL.
+- Retrieve HTML content from a specified URL, optionally through an on-disk page cache.
 - Parse and format dates into a standardized format.
 - Extract temperature data (maximum, minimum, and mean) from HTML rows.
-- Scrape weather data for a given date range and store it in a dictionary indexed by date.
-- Generate URLs dynamically for monthly weather data based on a specified date.
-- Save the scraped weather data to a text file for further use or analysis.
+- Scrape weather data for a given date range, fetching months concurrently.
+- Generate URLs dynamically for monthly weather data based on a station and a specified date.
+- Save the scraped weather data to a JSON lines, CSV or binary file.
 
-This module uses the `requests` library for HTTP requests and
-`BeautifulSoup` from `bs4` for parsing HTML.
-It also utilizes Python's `datetime` and `timedelta` for date manipulations.
+This module uses the pooled `HTTPClient` from `http_client` for HTTP requests and
+the streaming extractor in `table_parser` for parsing HTML, with `BeautifulSoup`
+from `bs4` kept as a fallback parser.
+
+Usage:
+    python scrape_weather.py weather_data.jsonl [--station 27174] [--start 2000-01-01] [--end 2024-12-31]
 """
 
 
-from datetime import datetime, timedelta
-import requests
+import argparse
+import calendar
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as date_cls, datetime, timedelta
+from itertools import islice
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+from http_client import HTTPClient, FetchError
+from instrumentation import count, span, traced
+from page_cache import PageCache
+from record_io import open_writer
+from record_store import WeatherRecordStore
+from table_parser import extract_rows
+from stations import DEFAULT_STATION_ID
+
+_MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+
+
+class HostRateLimiter:
+    """
+    A thread-safe limiter that spaces out requests made to the same host.
+    """
+    def __init__(self, requests_per_second=None):
+        """
+        Initialize the limiter.
+        :param requests_per_second: Maximum requests per second for each host, or None for no limit.
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """
+        Block until a request to the host of the given URL is allowed.
+        :param url: The URL about to be requested.
+        """
+        if not self.interval:
+            return
+
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
 
 class WeatherScraper:
     """
     A class built to scrape weather from the Government of Canada
     Climate and Weather tracking website.
     """
-    def __init__(self):
+    SITE_URL = "http://climate.weather.gc.ca"
+    PAGE_PATH = "/climate_data/daily_data_e.html"
+
+    def __init__(self, http_client=None, page_cache=None, parser="fast",
+                 station_id=DEFAULT_STATION_ID, base_url=None):
         """
-        Initialize the WeatherScraper with an empty weather data dictionary.
+        Initialize the WeatherScraper with an empty, dictionary-compatible WeatherRecordStore.
+
+        :param http_client: The HTTPClient used for downloads. A new pooled client is created if omitted.
+        :param page_cache: An optional PageCache holding raw month pages.
+        :param parser: "fast" for the streaming table extractor, or "bs4" for BeautifulSoup.
+        :param station_id: The climate station whose data is scraped.
+        :param base_url: The scheme and host pages are requested from, defaulting to SITE_URL,
+            e.g. a mock_climate_server.
         """
-        self.weather_data = {}
+        self.weather_data = WeatherRecordStore()
+        self.station_id = station_id
+        self.base_url = (base_url or self.SITE_URL).rstrip("/")
+        self.http_client = http_client or HTTPClient()
+        self.page_cache = page_cache
+        self.parser = parser
 
+    @traced("scrape.get_html")
     def _get_html(self, url, timeout=10):
         """
         Fetch HTML content from the provided URL.
@@ -38,14 +107,29 @@ class WeatherScraper:
         :param url: The URL to fetch the content from.
         :param timeout: The maximum time in seconds to wait for a response. Default is 10 seconds.
         :return: HTML content of the page as a string.
-        :raises: Exception if the request fails or times out.
+        :raises: FetchError if the request still fails or times out after retrying.
         """
-        try:
-            response = requests.get(url, timeout=timeout)
-            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
-            return response.text
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Failed to fetch page: {e}")
+        if self.page_cache is None:
+            return self.http_client.get_text(url, timeout=timeout)
+
+        cached = self.page_cache.get(url)
+        if cached is not None and (self.page_cache.offline or
+                                   self.page_cache.is_immutable(url, fetched_at=cached.fetched_at)):
+            return cached.text
+        if self.page_cache.offline:
+            raise FetchError(f"Page is not cached and the cache is offline: {url}")
+
+        if cached is not None:
+            response = self.http_client.fetch(url, cached.etag, cached.last_modified, timeout)
+            if response.status_code == 304:
+                self.page_cache.touch(url)
+                return cached.text
+        else:
+            response = self.http_client.fetch(url, timeout=timeout)
+
+        self.page_cache.put(url, response.text,
+                            response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.text
 
 
     def _parse_date(self, date_str):
@@ -55,12 +139,24 @@ class WeatherScraper:
         :param date_str: Date in the format "Month Day, Year".
         :return: Date in YYYY-MM-DD format.
         """
+        parts = date_str.split()
+        if len(parts) == 3 and parts[1].endswith(","):
+            month = _MONTH_NUMBERS.get(parts[0].lower())
+            day = parts[1][:-1]
+            year = parts[2]
+            if month and day.isdigit() and len(day) <= 2 and year.isdigit() and len(year) == 4:
+                try:
+                    return date_cls(int(year), month, int(day)).isoformat()
+                except ValueError:
+                    return None
+
         try:
             date = datetime.strptime(date_str, '%B %d, %Y')
             return date.strftime('%Y-%m-%d')
         except ValueError:
             return None
 
+    @traced("scrape.parse_weather_data")
     def _parse_weather_data(self, row):
         """
         Extract temperature data (Max, Min, Mean) from an HTML row.
@@ -68,14 +164,22 @@ class WeatherScraper:
         :param row: The HTML row containing weather data.
         :return: A dictionary of temperature data (Max, Min, Mean), or None if data is invalid.
         """
-        cells = row.find_all('td')
+        return self._parse_cells([cell.text for cell in row.find_all('td')])
+
+    def _parse_cells(self, cells):
+        """
+        Extract temperature data (Max, Min, Mean) from the cell texts of a row.
+
+        :param cells: The text of each `<td>` cell in the row.
+        :return: A dictionary of temperature data (Max, Min, Mean), or None if data is invalid.
+        """
         if len(cells) < 4:  # Ensure enough cells exist
             return None
 
         try:
-            max_temp = float(cells[0].text.strip()) if cells[0].text.strip() != "M" else None
-            min_temp = float(cells[1].text.strip()) if cells[1].text.strip() != "M" else None
-            mean_temp = float(cells[2].text.strip()) if cells[2].text.strip() != "M" else None
+            max_temp = float(cells[0].strip()) if cells[0].strip() != "M" else None
+            min_temp = float(cells[1].strip()) if cells[1].strip() != "M" else None
+            mean_temp = float(cells[2].strip()) if cells[2].strip() != "M" else None
 
             if max_temp is None and min_temp is None and mean_temp is None:
                 return None
@@ -84,61 +188,233 @@ class WeatherScraper:
         except ValueError:
             return None
 
-    def scrape(self, start_date, end_date):
+    def _iter_months(self, start_date, end_date):
         """
-        Scrape weather data for the given date range.
+        Yield one date per month, walking backwards from end_date to start_date.
 
         :param start_date: The start date as a datetime.date object.
         :param end_date: The end date as a datetime.date object.
-        :return: A dictionary of weather data indexed by date.
+        :return: A generator of dates, one in each month of the range, newest first.
         """
         current_date = end_date
         while current_date >= start_date:
-            url = self._generate_url_for_month(current_date)
+            yield current_date
+            current_date = (current_date.replace(day=1) - timedelta(days=1))
+
+    @traced("scrape.parse_page")
+    def _parse_page(self, html):
+        """
+        Parse a month page into weather records.
+
+        :param html: HTML content of a month page.
+        :return: A tuple of (whether the page had any table rows, dictionary of weather data by date).
+        """
+        if self.parser == "fast":
+            try:
+                return self._parse_page_fast(html)
+            except Exception as e:  # The BeautifulSoup parser copes with more broken markup
+                print(f"Fast parser failed ({e}), falling back to BeautifulSoup.")
+
+        soup = BeautifulSoup(html, 'html.parser')
+        rows = soup.find_all('tr')
+        records = {}
+
+        for row in rows:
+            date_link = row.find('abbr')
+            if date_link:
+                date_str = date_link['title']
+                date = self._parse_date(date_str)
+
+                if date:
+                    weather = self._parse_weather_data(row)
+                    if weather:
+                        records[date] = weather
+
+        count("scrape.pages")
+        count("scrape.records", len(records))
+        return bool(rows), records
+
+    def _parse_page_fast(self, html):
+        """
+        Parse a month page into weather records with the streaming table extractor.
+
+        :param html: HTML content of a month page.
+        :return: A tuple of (whether the page had any table rows, dictionary of weather data by date).
+        """
+        with span("scrape.extract_rows"):
+            row_count, rows = extract_rows(html)
+        records = {}
+
+        for date_str, cells in rows:
+            date = self._parse_date(date_str)
+
+            if date:
+                weather = self._parse_cells(cells)
+                if weather:
+                    records[date] = weather
+
+        count("scrape.pages")
+        count("scrape.records", len(records))
+        return row_count > 0, records
+
+    def iter_scrape(self, start_date, end_date, max_workers=1, requests_per_second=None):
+        """
+        Scrape the given date range one month at a time, newest first, yielding each month's records
+        instead of accumulating them in weather_data. The first empty page ends the scrape.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :param max_workers: The maximum number of months fetched at the same time.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :return: A generator of (month date, dictionary of weather data indexed by date) tuples.
+        """
+        limiter = HostRateLimiter(requests_per_second)
+        months = self._iter_months(start_date, end_date)
+
+        def fetch(month_date):
+            url = self._generate_url_for_month(month_date)
+            limiter.wait(url)
             print(f"Scraping: {url}")
+            return self._parse_page(self._get_html(url))
 
-            html = self._get_html(url)
-            soup = BeautifulSoup(html, 'html.parser')
-            rows = soup.find_all('tr')
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            window = deque()
 
-            if not rows:
-                print("No more data found. Stopping scrape.")
-                break
+            def fill():
+                for month_date in islice(months, max(2 * max_workers - len(window), 0)):
+                    window.append((month_date, executor.submit(fetch, month_date)))
 
-            for row in rows:
-                date_link = row.find('abbr')
-                if date_link:
-                    date_str = date_link['title']
-                    date = self._parse_date(date_str)
+            try:
+                fill()
+                while window:
+                    month_date, future = window.popleft()
+                    found_rows, records = future.result()
 
-                    if date:
-                        weather = self._parse_weather_data(row)
-                        if weather:
-                            self.weather_data[date] = weather
+                    if not found_rows:
+                        print("No more data found. Stopping scrape.")
+                        return
 
-            current_date = (current_date.replace(day=1) - timedelta(days=1))
+                    fill()
+                    yield month_date, records
+            finally:
+                for _, future in window:
+                    future.cancel()
+
+    def scrape(self, start_date, end_date):
+        """
+        Scrape weather data for the given date range.
+
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :return: A dictionary of weather data indexed by date.
+        """
+        for _, records in self.iter_scrape(start_date, end_date):
+            self._store_records(records)
 
         return self.weather_data
 
-    def _generate_url_for_month(self, date):
+    def scrape_months(self, months, max_workers=8, requests_per_second=None):
+        """
+        Scrape only the given months, fetching them in parallel. Empty pages do not stop the scrape.
+
+        :param months: An iterable of dates, one in each month to fetch.
+        :param max_workers: The maximum number of months fetched at the same time.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :return: A dictionary mapping (year, month) to that month's dictionary of weather data.
+        """
+        limiter = HostRateLimiter(requests_per_second)
+
+        def fetch(month_date):
+            url = self._generate_url_for_month(month_date)
+            limiter.wait(url)
+            print(f"Scraping: {url}")
+            return self._parse_page(self._get_html(url))[1]
+
+        months = list(months)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(fetch, months)
+            by_month = {(month_date.year, month_date.month): records
+                        for month_date, records in zip(months, results)}
+
+        for records in by_month.values():
+            self._store_records(records)
+        return by_month
+
+    def _generate_url_for_month(self, date, station_id=None):
         """
         Generate the URL for the specified month and year.
 
         :param date: The date to base the URL on.
+        :param station_id: The station to fetch, defaulting to the scraper's station.
         :return: The URL for the month’s data.
         """
         year = date.year
         month = date.month
-        url = f"http://climate.weather.gc.ca/climate_data/daily_data_e.html?StationID=27174&timeframe=2&StartYear=1840&EndYear=2018&Day=1&Year={year}&Month={month}"
+        station_id = station_id or self.station_id
+        url = (f"{self.base_url}{self.PAGE_PATH}?StationID={station_id}&timeframe=2&StartYear=1840"
+               f"&EndYear={year}&Day=1&Year={year}&Month={month}")
         return url
 
-    def save_to_file(self, file_name="weather_data.txt"):
+    def _store_records(self, records):
+        """
+        Merge parsed records into weather_data.
+
+        :param records: A dictionary of weather data indexed by date.
         """
-        Save the scraped weather data to a text file.
+        self.weather_data.update(records)
 
-        :param file_name: Name of the file to save the data.
+    def scrape_to_file(self, file_name, start_date, end_date, max_workers=8, requests_per_second=None):
         """
-        with open(file_name, 'w') as f:
-            for date, data in self.weather_data.items():
-                f.write(f"{date}: {data}\n")
-            print(f"Weather data saved to {file_name}")
+        Scrape the given date range straight to a file, writing each month as soon as it is parsed.
+
+        :param file_name: Name of the file; its extension (.jsonl, .csv, .bin or .txt) selects the format.
+        :param start_date: The start date as a datetime.date object.
+        :param end_date: The end date as a datetime.date object.
+        :param max_workers: The maximum number of months fetched at the same time.
+        :param requests_per_second: Maximum requests per second to each host, or None for no limit.
+        :return: The number of records written.
+        """
+        with open_writer(file_name) as writer:
+            for _, records in self.iter_scrape(start_date, end_date, max_workers, requests_per_second):
+                writer.write(records)
+        print(f"Weather data streamed to {file_name}")
+        return writer.count
+
+    def save_to_file(self, file_name="weather_data.jsonl"):
+        """
+        Save the scraped weather data to a file.
+
+        :param file_name: Name of the file; its extension (.jsonl, .csv, .bin or .txt) selects the format.
+        """
+        with open_writer(file_name) as writer:
+            writer.write(self.weather_data)
+        print(f"Weather data saved to {file_name}")
+
+
+def main():
+    """
+    Scrape a station's weather data to a record file from the command line.
+    The file can be loaded into a database later with record_io.py.
+    """
+    parser = argparse.ArgumentParser(description="Scrape weather data to a .jsonl, .csv, .bin or .txt record file.")
+    parser.add_argument("file_name", help="The record file to write; its extension selects the format.")
+    parser.add_argument("--station", type=int, default=DEFAULT_STATION_ID, help="The station to scrape.")
+    parser.add_argument("--start", default="2000-01-01", help="The first date, YYYY-MM-DD.")
+    parser.add_argument("--end", default=None, help="The last date, YYYY-MM-DD (default: today).")
+    parser.add_argument("--workers", type=int, default=8, help="The number of months fetched at the same time.")
+    parser.add_argument("--rps", type=float, default=10, help="Maximum requests per second.")
+    parser.add_argument("--cache-dir", default="page_cache", help="The raw page cache directory.")
+    parser.add_argument("--base-url", default=None,
+                        help="Scrape this server instead of the climate website, e.g. a mock_climate_server.")
+    args = parser.parse_args()
+
+    scraper = WeatherScraper(page_cache=PageCache(args.cache_dir) if args.cache_dir else None,
+                             station_id=args.station, base_url=args.base_url)
+    end_date = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else date_cls.today()
+    written = scraper.scrape_to_file(args.file_name, datetime.strptime(args.start, "%Y-%m-%d").date(), end_date,
+                                     args.workers, args.rps)
+    print(f"Wrote {written} records for station {args.station}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+This module provides the station helpers shared by the scraper, database and plotting code.
+
+Weather data is tracked per climate station, identified by the StationID used in the
+Government of Canada Climate and Weather website URLs. Winnipeg (27174) is the default
+station, matching the data the application has always collected.
+"""
+
+DEFAULT_STATION_ID = 27174
+
+
+def parse_station_ids(text):
+    """
+    Parse station IDs separated by commas, spaces or new lines.
+
+    :param text: The text holding the station IDs. Blank text means the default station.
+    :return: A list of unique station IDs as integers, in the order given.
+    :raises ValueError: If an entry is not a whole number.
+    """
+    station_ids = []
+    for entry in text.replace(",", " ").split():
+        station_id = int(entry)
+        if station_id not in station_ids:
+            station_ids.append(station_id)
+    return station_ids or [DEFAULT_STATION_ID]
+
+
+def load_station_ids(file_name):
+    """
+    Load station IDs from a text file, one or more per line. Lines starting with # are ignored.
+
+    :param file_name: The path of the station list file.
+    :return: A list of unique station IDs as integers.
+    """
+    with open(file_name) as f:
+        lines = [line for line in f if not line.lstrip().startswith("#")]
+    return parse_station_ids(" ".join(lines))
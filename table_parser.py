@@ -0,0 +1,162 @@
+"""
+This module provides a fast extractor for the daily data table of a climate month page.
+
+Building a full BeautifulSoup tree for every month page is the most expensive part of
+a scrape. The `DailyTableParser` class is an incremental `html.parser.HTMLParser`
+subclass that only keeps what `WeatherScraper` needs from each table row: the title
+of its first `<abbr>` tag and the text of its `<td>` cells. When `lxml` is installed,
+`extract_rows` uses it instead, which is faster still.
+
+Both paths follow the same rules as the BeautifulSoup code in `WeatherScraper`,
+which is kept as a fallback.
+"""
+
+import re
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional
+    lxml = None
+
+_TABLE_START = re.compile(r"<table\b", re.IGNORECASE)
+_TABLE_END = re.compile(r"</table\s*>", re.IGNORECASE)
+
+
+class DailyTableParser(HTMLParser):
+    """
+    An incremental HTML parser that collects the dated rows of a month page.
+
+    Attributes:
+        row_count (int): The number of `<tr>` tags seen, dated or not.
+        rows (list): A list of (abbr title, [cell texts]) tuples for rows with an `<abbr>` title.
+    """
+    def __init__(self):
+        """
+        Initialize the parser with no rows collected.
+        """
+        super().__init__(convert_charrefs=True)
+        self.row_count = 0
+        self.rows = []
+        self._in_row = False
+        self._abbr_seen = False
+        self._title = None
+        self._cells = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        """
+        Track the start of rows, cells and the first `<abbr>` of each row.
+        """
+        if tag == "tr":
+            self._finish_row()
+            self.row_count += 1
+            self._in_row = True
+            self._abbr_seen = False
+            self._title = None
+            self._cells = []
+        elif not self._in_row:
+            return
+        elif tag == "td":
+            self._finish_cell()
+            self._cell = []
+        elif tag == "abbr" and not self._abbr_seen:
+            self._abbr_seen = True
+            self._title = dict(attrs).get("title")
+
+    def handle_endtag(self, tag):
+        """
+        Close the current cell or row.
+        """
+        if tag == "td":
+            self._finish_cell()
+        elif tag in ("tr", "table", "tbody", "thead", "tfoot"):
+            self._finish_row()
+
+    def handle_data(self, data):
+        """
+        Collect text that belongs to the current cell.
+        """
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def close(self):
+        """
+        Flush any row left open at the end of the document.
+        """
+        super().close()
+        self._finish_row()
+
+    def _finish_cell(self):
+        """
+        Store the text of the current cell, if one is open.
+        """
+        if self._cell is not None:
+            self._cells.append("".join(self._cell))
+            self._cell = None
+
+    def _finish_row(self):
+        """
+        Store the current row if it has an `<abbr>` title, and reset the row state.
+        """
+        if not self._in_row:
+            return
+        self._finish_cell()
+        if self._title is not None:
+            self.rows.append((self._title, self._cells))
+        self._in_row = False
+
+
+def _table_region(html):
+    """
+    Cut a page down to the part between its first `<table>` and last `</table>`.
+
+    :param html: HTML content of a page.
+    :return: The table region, or an empty string if the page has no table.
+    """
+    start = _TABLE_START.search(html)
+    if start is None:
+        return ""
+    end = None
+    for end in _TABLE_END.finditer(html, start.start()):
+        pass
+    return html[start.start():end.end() if end else len(html)]
+
+
+def _extract_rows_lxml(html):
+    """
+    Extract the dated rows of a page with lxml.
+
+    :param html: HTML content of a page.
+    :return: A tuple of (number of `<tr>` tags, list of (abbr title, [cell texts])).
+    """
+    document = lxml.html.fromstring(html)
+    row_count = 0
+    rows = []
+    for tr in document.iter("tr"):
+        row_count += 1
+        abbr = next(tr.iter("abbr"), None)
+        title = abbr.get("title") if abbr is not None else None
+        if title is not None:
+            rows.append((title, [td.text_content() for td in tr.iter("td")]))
+    return row_count, rows
+
+
+def extract_rows(html):
+    """
+    Extract the dated rows of a month page.
+
+    :param html: HTML content of a month page.
+    :return: A tuple of (number of `<tr>` tags, list of (abbr title, [cell texts])).
+    """
+    region = _table_region(html)
+    if not region:
+        return 0, []
+
+    if lxml is not None:
+        return _extract_rows_lxml(region)
+
+    parser = DailyTableParser()
+    parser.feed(region)
+    parser.close()
+    return parser.row_count, parser.rows
@@ -0,0 +1,11 @@
+"""
+Shared setup for the test suite.
+
+The application modules live at the top of the repository rather than in a package,
+so the repository root is put on the import path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
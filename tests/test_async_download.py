@@ -0,0 +1,93 @@
+"""
+Tests of the asyncio scrape engine and the resumable downloads the GUI runs with it.
+"""
+
+import asyncio
+from datetime import date
+import pytest
+from async_scraper import AsyncHTTPClient, AsyncWeatherScraper
+from http_client import FetchError
+from mock_climate_server import MockClimateServer, SyntheticSource, synthetic_month_records
+from page_cache import PageCache
+from scrape_jobs import JobQueue
+from weather_processor import WeatherProcessor
+
+
+class FailingScraper(AsyncWeatherScraper):
+    """
+    An AsyncWeatherScraper whose February pages always fail.
+    """
+    async def _get_html_async(self, url, timeout=10):
+        if "Month=2" in url:
+            raise FetchError("Failed to fetch page: injected")
+        return await super()._get_html_async(url, timeout)
+
+
+@pytest.fixture
+def server():
+    """
+    A mock climate server with generated data from 2000 on.
+    """
+    with MockClimateServer(SyntheticSource(first_year=2000)) as server:
+        yield server
+
+
+def _collect(scraper, jobs, **kwargs):
+    """
+    Run scrape_months_async to the end and return what it yielded, by (station, month).
+    """
+    async def run():
+        pages = {}
+        try:
+            async for station_id, month_date, records in scraper.scrape_months_async(jobs, 4, **kwargs):
+                pages[station_id, month_date.month] = records
+        finally:
+            await scraper.async_client.close()
+        return pages
+
+    return asyncio.run(run())
+
+
+def test_scrape_months_async_through_the_page_cache(server, tmp_path):
+    jobs = [(1, date(2020, month, 1)) for month in range(1, 4)]
+    for _ in range(2):
+        scraper = AsyncWeatherScraper(AsyncHTTPClient(), PageCache(str(tmp_path / "cache")), base_url=server.url)
+        pages = _collect(scraper, jobs)
+        assert pages == {(1, month): synthetic_month_records(1, 2020, month) for month in range(1, 4)}
+    # Settled months come from the cache the second time
+    assert server.stats()["requests"] == 3
+
+
+def test_scrape_months_async_raises_or_returns_failures(server):
+    jobs = [(1, date(2020, month, 1)) for month in range(1, 5)]
+    with pytest.raises(FetchError):
+        _collect(FailingScraper(AsyncHTTPClient(max_retries=0), base_url=server.url), jobs)
+
+    pages = _collect(FailingScraper(AsyncHTTPClient(max_retries=0), base_url=server.url), jobs,
+                     return_exceptions=True)
+    assert isinstance(pages.pop((1, 2)), FetchError)
+    assert pages == {(1, month): synthetic_month_records(1, 2020, month) for month in (1, 3, 4)}
+
+
+def test_backfill_jobs_async_fails_only_the_failing_month(server, tmp_path):
+    db_name = str(tmp_path / "weather.db")
+    processor = WeatherProcessor(db_name, cache_dir=None, station_ids=[1, 2], base_url=server.url)
+    scraper = FailingScraper(AsyncHTTPClient(max_retries=0), base_url=server.url)
+
+    async def run():
+        months = processor._backfill_jobs_async(scraper, date(2020, 1, 1), date(2020, 4, 30), 8)
+        try:
+            return sum([count async for count in months])
+        finally:
+            await scraper.async_client.close()
+
+    saved = asyncio.run(run())
+    progress = JobQueue(db_name).progress()
+    assert progress == {"pending": 0, "claimed": 0, "done": 6, "failed": 2}
+    expected = sum(len(synthetic_month_records(station_id, 2020, month))
+                   for station_id in (1, 2) for month in (1, 3, 4))
+    assert saved == expected
+    for station_id in (1, 2):
+        rows = processor.db_operations.fetch_data("2020-01-01", "2020-04-30", station_id)
+        assert {row[0] for row in rows} == {sample_date for month in (1, 3, 4)
+                                            for sample_date in synthetic_month_records(station_id, 2020, month)}
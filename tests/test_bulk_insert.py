@@ -0,0 +1,106 @@
+"""
+Tests of DBOperations.bulk_insert.
+"""
+
+import sqlite3
+import pytest
+from db_operations import DBOperations
+from dbcm import DBCM
+
+ROWS = [
+    (1, "2024-01-01", -10.0, -2.0, -6.0),
+    (1, "2024-01-02", -12.0, -4.0, -8.0),
+    (1, "2024-02-01", -20.0, -9.0, None),
+    (2, "2024-01-01", -5.0, 1.0, -2.0),
+]
+CHANGED = [
+    (1, "2024-01-02", -1.0, 1.0, 0.0),
+    (1, "2024-01-03", -3.0, 3.0, 0.5),
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    A DBOperations of an empty, initialized database.
+    """
+    db = DBOperations(str(tmp_path / "weather.db"))
+    db.initialize_db()
+    return db
+
+
+def _stored(db):
+    """
+    Return every stored weather row.
+    """
+    with DBCM(db.db_name) as cursor:
+        cursor.execute("""
+        SELECT station_id, sample_date, min_temp, max_temp, avg_temp FROM weather ORDER BY station_id, sample_date;
+        """)
+        return cursor.fetchall()
+
+
+@pytest.mark.parametrize("use_staging", [False, True])
+def test_inserts_rows_and_returns_the_count(db, use_staging):
+    assert db.bulk_insert(iter(ROWS), batch_size=3, use_staging=use_staging) == len(ROWS)
+    assert _stored(db) == sorted(ROWS)
+    with DBCM(db.db_name) as cursor:
+        cursor.execute("SELECT sample_year, sample_month FROM weather WHERE sample_date = '2024-02-01';")
+        assert cursor.fetchone() == (2024, 2)
+
+
+@pytest.mark.parametrize("use_staging", [False, True])
+def test_ignore_keeps_existing_rows(db, use_staging):
+    db.bulk_insert(ROWS)
+    # The count is of rows processed, including those that were ignored
+    assert db.bulk_insert(CHANGED, on_conflict="ignore", use_staging=use_staging) == len(CHANGED)
+    assert _stored(db) == sorted(ROWS + CHANGED[1:])
+
+
+@pytest.mark.parametrize("use_staging", [False, True])
+def test_update_overwrites_existing_rows(db, use_staging):
+    db.bulk_insert(ROWS)
+    assert db.bulk_insert(CHANGED, on_conflict="update", use_staging=use_staging) == len(CHANGED)
+    assert _stored(db) == sorted([row for row in ROWS if row[:2] != CHANGED[0][:2]] + CHANGED)
+
+
+def test_unknown_conflict_policy(db):
+    with pytest.raises(ValueError):
+        db.bulk_insert(ROWS, on_conflict="replace")
+    assert _stored(db) == []
+
+
+@pytest.mark.parametrize("use_staging", [False, True])
+def test_failing_batch_rolls_back_every_batch(db, use_staging):
+    db.bulk_insert(ROWS[:1])
+    versions = db.data_versions([1, 2])
+
+    def rows():
+        yield from ROWS[1:]
+        raise RuntimeError("The source failed partway through.")
+
+    with pytest.raises(RuntimeError):
+        db.bulk_insert(rows(), batch_size=1, use_staging=use_staging)
+    assert _stored(db) == ROWS[:1]
+    assert db.data_versions([1, 2]) == versions
+
+
+def test_malformed_row_rolls_back(db):
+    with pytest.raises(sqlite3.Error):
+        db.bulk_insert(ROWS + [(1, "2024-03-01", 1.0)], batch_size=2)
+    assert _stored(db) == []
+
+
+def test_bumps_the_versions_of_touched_stations(db):
+    db.bulk_insert(ROWS)
+    before = db.data_versions([1, 2])
+    db.bulk_insert(CHANGED, on_conflict="update")
+    after = db.data_versions([1, 2])
+    assert after[0] > before[0]
+    assert after[1] == before[1]
+
+
+def test_empty_input(db):
+    versions = db.data_versions([1])
+    assert db.bulk_insert([]) == 0
+    assert db.data_versions([1]) == versions
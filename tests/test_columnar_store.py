@@ -0,0 +1,87 @@
+"""
+Round-trip tests of the columnar export.
+
+A small database is exported in each columnar format and read back through
+`DBOperations.fetch_data(source="columnar")`, `fetch_columns` and an import into a new
+database; every path must return exactly the records SQLite returns.
+"""
+
+import numpy as np
+import pytest
+import columnar_store
+from columnar_store import ColumnarStore
+from db_operations import DBOperations, iter_weather_rows
+from dbcm import DBCM
+from mock_climate_server import synthetic_month_records
+
+STATIONS = (1, 27174)
+RANGES = [("0001-01-01", "9999-12-31"), ("2020-02-10", "2021-03-05"), ("2020-12-31", "2021-01-01"),
+          ("2019-01-01", "2019-12-31")]
+
+
+@pytest.fixture(params=["npy", "parquet"])
+def file_format(request):
+    """
+    Each columnar format that can be written here.
+    """
+    if request.param == "parquet" and columnar_store.pa is None:
+        pytest.skip("pyarrow is not installed")
+    return request.param
+
+
+@pytest.fixture
+def exported(tmp_path, file_format):
+    """
+    A database of two stations over 2020 and 2021, with missing temperatures, and its export.
+    """
+    db_name = str(tmp_path / "weather.db")
+    columnar_dir = str(tmp_path / "columns")
+    db = DBOperations(db_name, columnar_dir)
+    db.initialize_db()
+    for station_id in STATIONS:
+        for year in (2020, 2021):
+            for month in range(1, 13):
+                db.bulk_insert(iter_weather_rows(synthetic_month_records(station_id, year, month, seed=3),
+                                                 station_id))
+    store = ColumnarStore(columnar_dir, file_format)
+    assert store.export(db) == 2 * (366 + 365)
+    yield db, store
+    DBCM.close_all(db_name)
+
+
+@pytest.mark.parametrize("start_date, end_date", RANGES)
+def test_fetch_data_round_trip(exported, start_date, end_date):
+    db, _ = exported
+    for station_id in STATIONS:
+        assert (db.fetch_data(start_date, end_date, station_id, source="columnar")
+                == list(db.fetch_data(start_date, end_date, station_id)))
+
+
+@pytest.mark.parametrize("start_date, end_date", RANGES)
+def test_fetch_columns_round_trip(exported, start_date, end_date):
+    db, _ = exported
+    expected = db.fetch_columns(start_date, end_date, list(STATIONS))
+    actual = db.fetch_columns(start_date, end_date, list(STATIONS), source="columnar")
+    for name in expected._fields:
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name))
+
+
+def test_missing_temperatures_survive(exported):
+    db, _ = exported
+    rows = db.fetch_data("2020-01-01", "2021-12-31", STATIONS[0], source="columnar")
+    assert any(row[3] is None for row in rows)
+    assert db.fetch_data("2020-01-01", "2021-12-31", STATIONS[0]) == rows
+
+
+def test_import_into_new_database(exported, tmp_path):
+    db, store = exported
+    target = DBOperations(str(tmp_path / "imported.db"))
+    target.initialize_db()
+    try:
+        assert store.import_into(target) == 2 * (366 + 365)
+        assert store.verify(target) == []
+        for station_id in STATIONS:
+            assert target.fetch_data("0001-01-01", "9999-12-31", station_id) == \
+                db.fetch_data("0001-01-01", "9999-12-31", station_id)
+    finally:
+        DBCM.close_all(target.db_name)
@@ -0,0 +1,135 @@
+"""
+Tests of the pooled SQLite connections behind DBCM.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import dbcm
+from dbcm import DBCM, get_pool
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    """
+    The name of a database with one table of values, whose connections are closed afterwards.
+    """
+    db_name = str(tmp_path / "test.db")
+    with DBCM(db_name) as cursor:
+        cursor.execute("CREATE TABLE items (value INTEGER);")
+    yield db_name
+    DBCM.close_all(db_name)
+
+
+def _values(db_name):
+    """
+    Return the committed values, read from a thread of its own.
+    """
+    result = []
+
+    def read():
+        with DBCM(db_name) as cursor:
+            cursor.execute("SELECT value FROM items ORDER BY value;")
+            result.extend(value for value, in cursor.fetchall())
+        DBCM.close_thread()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+    return result
+
+
+def test_each_thread_has_its_own_connection(db_name):
+    with DBCM(db_name) as cursor:
+        connection = cursor.connection
+    with DBCM(db_name) as cursor:
+        assert cursor.connection is connection
+
+    others = []
+
+    def use():
+        with DBCM(db_name) as cursor:
+            others.append(cursor.connection)
+        DBCM.close_thread()
+
+    threads = [threading.Thread(target=use) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(other) for other in others + [connection]}) == 4
+
+
+def test_uncommitted_writes_stay_in_their_thread(db_name):
+    with DBCM(db_name) as cursor:
+        cursor.execute("INSERT INTO items VALUES (1);")
+        assert _values(db_name) == []
+    assert _values(db_name) == [1]
+
+
+def test_nested_blocks_commit_at_the_outermost(db_name):
+    with DBCM(db_name) as outer:
+        outer.execute("INSERT INTO items VALUES (1);")
+        with DBCM(db_name) as inner:
+            inner.execute("INSERT INTO items VALUES (2);")
+        assert _values(db_name) == []
+    assert _values(db_name) == [1, 2]
+
+
+def test_nested_blocks_roll_back_at_the_outermost(db_name):
+    with pytest.raises(RuntimeError):
+        with DBCM(db_name) as outer:
+            outer.execute("INSERT INTO items VALUES (1);")
+            with DBCM(db_name) as inner:
+                inner.execute("INSERT INTO items VALUES (2);")
+            raise RuntimeError("The outer block failed after the inner one finished.")
+    assert _values(db_name) == []
+
+    # An exception the outer block catches does not roll back the inner block's writes
+    with DBCM(db_name) as outer:
+        outer.execute("INSERT INTO items VALUES (3);")
+        try:
+            with DBCM(db_name) as inner:
+                inner.execute("INSERT INTO items VALUES (4);")
+                raise RuntimeError("The inner block failed.")
+        except RuntimeError:
+            pass
+    assert _values(db_name) == [3, 4]
+
+
+def test_close_thread_opens_a_new_connection(db_name):
+    with DBCM(db_name) as cursor:
+        connection = cursor.connection
+    DBCM.close_thread()
+    with DBCM(db_name) as cursor:
+        assert cursor.connection is not connection
+    assert get_pool(db_name).stats()["open"] == 1
+
+
+def _use_after_fork(db_name):
+    """
+    Insert a row from a forked process and report on the pools it inherited.
+    """
+    inherited = list(dbcm._inherited_pools)
+    with DBCM(db_name) as cursor:
+        cursor.execute("INSERT INTO items VALUES (2);")
+    fresh = get_pool(db_name)
+    return fresh not in inherited, any(pool.db_name == db_name for pool in inherited), fresh.stats()["opened"]
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_children_start_with_fresh_pools(db_name):
+    with DBCM(db_name) as cursor:
+        cursor.execute("INSERT INTO items VALUES (1);")
+        connection = cursor.connection
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("fork")) as executor:
+        fresh, inherited, opened = executor.submit(_use_after_fork, db_name).result()
+    assert fresh and inherited and opened == 1
+
+    # The parent's connection was neither used nor closed by the child
+    with DBCM(db_name) as cursor:
+        assert cursor.connection is connection
+        cursor.execute("SELECT value FROM items ORDER BY value;")
+        assert cursor.fetchall() == [(1,), (2,)]
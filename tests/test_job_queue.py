@@ -0,0 +1,150 @@
+"""
+Tests of the persistent scrape job queue and of resuming a backfill that was interrupted.
+"""
+
+import socket
+import subprocess
+import sys
+import types
+from datetime import date
+import pytest
+import scrape_jobs
+from db_operations import DBOperations
+from dbcm import DBCM
+from mock_climate_server import MockClimateServer, SyntheticSource, synthetic_month_records
+from scrape_jobs import JobQueue, run_worker
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    """
+    A JobQueue of an empty, initialized database.
+    """
+    db_name = str(tmp_path / "weather.db")
+    DBOperations(db_name).initialize_db()
+    yield JobQueue(db_name)
+    DBCM.close_all(db_name)
+
+
+def _dead_worker_id():
+    """
+    Return the name a worker process of this host that has already exited would have had.
+    """
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}"
+
+
+def _statuses(jobs):
+    """
+    Return the status and attempts of every job.
+    """
+    with DBCM(jobs.db_name) as cursor:
+        cursor.execute("SELECT station_id, year, month, status, attempts FROM scrape_jobs;")
+        return {row[:3]: row[3:] for row in cursor.fetchall()}
+
+
+def test_enqueue_and_claim_newest_first(jobs):
+    assert jobs.enqueue([1, 2], date(2020, 11, 15), date(2021, 1, 31)) == 6
+    assert jobs.enqueue([1, 2], date(2020, 11, 15), date(2021, 1, 31)) == 0
+
+    first = jobs.claim("a", limit=3)
+    second = jobs.claim("b", limit=10)
+    assert first == [(1, 2021, 1), (2, 2021, 1), (1, 2020, 12)]
+    assert second == [(2, 2020, 12), (1, 2020, 11), (2, 2020, 11)]
+    assert jobs.claim("c") == []
+    assert jobs.progress() == {"pending": 0, "claimed": 6, "done": 0, "failed": 0}
+
+
+def test_complete_and_fail(jobs):
+    jobs.enqueue([1], date(2020, 1, 1), date(2020, 2, 29))
+    assert jobs.claim("a", limit=2) == [(1, 2020, 2), (1, 2020, 1)]
+    jobs.complete(1, 2020, 2, 29)
+    jobs.fail(1, 2020, 1, RuntimeError("boom"))
+    assert jobs.progress() == {"pending": 0, "claimed": 0, "done": 1, "failed": 1}
+
+    # A failed job is claimed again until it runs out of attempts
+    for attempt in range(2, jobs.max_attempts + 1):
+        assert jobs.claim("a") == [(1, 2020, 1)]
+        jobs.fail(1, 2020, 1, "boom")
+        assert _statuses(jobs)[(1, 2020, 1)] == ("failed", attempt)
+    assert jobs.claim("a") == []
+
+    assert jobs.retry_failed() == 1
+    assert _statuses(jobs)[(1, 2020, 1)] == ("pending", 0)
+    with DBCM(jobs.db_name) as cursor:
+        cursor.execute("SELECT record_count, last_error FROM scrape_jobs WHERE month = 2;")
+        assert cursor.fetchone() == (29, None)
+
+
+def test_release(jobs):
+    jobs.enqueue([1, 2, 3], date(2020, 1, 1), date(2020, 1, 31))
+    jobs.claim("a", limit=2)
+    jobs.claim("b")
+    assert jobs.release("a") == 2
+    assert jobs.release("b", error="cancelled") == 1
+    assert _statuses(jobs) == {(1, 2020, 1): ("pending", 1), (2, 2020, 1): ("pending", 1),
+                               (3, 2020, 1): ("failed", 1)}
+
+
+def test_release_orphaned(jobs):
+    jobs.enqueue([1, 2], date(2020, 1, 1), date(2020, 1, 31))
+    jobs.claim(_dead_worker_id())
+    jobs.claim(scrape_jobs.worker_name())
+    assert jobs.release_orphaned() == 1
+    assert _statuses(jobs) == {(1, 2020, 1): ("pending", 1), (2, 2020, 1): ("claimed", 1)}
+
+
+def test_expired_claims_are_claimed_again(jobs, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(scrape_jobs, "time", types.SimpleNamespace(time=lambda: now[0]))
+    jobs.enqueue([1], date(2020, 1, 1), date(2020, 1, 31))
+    assert jobs.claim("a") == [(1, 2020, 1)]
+    now[0] += jobs.lease_seconds - 1
+    assert jobs.claim("b") == []
+    now[0] += 2
+    assert jobs.claim("b") == [(1, 2020, 1)]
+
+
+def test_enqueue_reopens_unsettled_months(jobs):
+    today = date.today()
+    jobs.enqueue([1], date(2020, 1, 1), date(2020, 1, 31))
+    jobs.enqueue([1], today, today)
+    for station_id, year, month in jobs.claim("a", limit=2):
+        jobs.complete(station_id, year, month, 10)
+
+    # Every month in between is added, and only the current month was fetched before it settled
+    months = (today.year - 2020) * 12 + today.month
+    assert jobs.enqueue([1], date(2020, 1, 1), today) == months - 2 + 1
+    statuses = _statuses(jobs)
+    assert statuses[(1, today.year, today.month)] == ("pending", 0)
+    assert statuses[(1, 2020, 1)] == ("done", 1)
+
+
+def test_worker_resumes_an_interrupted_backfill(jobs):
+    jobs.enqueue([1, 2], date(2020, 1, 1), date(2020, 3, 31))
+    # A worker saved one month, then died holding two more
+    dead_worker = _dead_worker_id()
+    claimed = jobs.claim(dead_worker, limit=3)
+    station_id, year, month = claimed[0]
+    rows = [(station_id, sample_date, weather["Min"], weather["Max"], weather["Mean"])
+            for sample_date, weather in synthetic_month_records(station_id, year, month).items()]
+    DBOperations(jobs.db_name).bulk_insert(rows)
+    jobs.complete(station_id, year, month, len(rows))
+
+    assert jobs.release_orphaned() == 2
+    with MockClimateServer(SyntheticSource(first_year=2000)) as server:
+        done, failed, _, _ = run_worker(jobs.db_name, batch_size=2, base_url=server.url, adaptive=False)
+        requests = server.stats()["requests"]
+
+    assert (done, failed) == (5, 0)
+    assert requests == 5
+    assert jobs.progress() == {"pending": 0, "claimed": 0, "done": 6, "failed": 0}
+    db = DBOperations(jobs.db_name)
+    for station_id in (1, 2):
+        expected = {}
+        for month in (1, 2, 3):
+            expected.update(synthetic_month_records(station_id, 2020, month))
+        stored = db.fetch_data("2020-01-01", "2020-03-31", station_id)
+        assert {row[0]: (row[1], row[2], row[3]) for row in stored} == {
+            sample_date: (weather["Min"], weather["Max"], weather["Mean"]) for sample_date, weather in expected.items()}
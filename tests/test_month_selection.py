@@ -0,0 +1,81 @@
+"""
+Tests of how WeatherProcessor picks the months an update fetches and records their completeness.
+"""
+
+import calendar
+from datetime import date, timedelta
+import pytest
+from dbcm import DBCM
+from weather_processor import WeatherProcessor
+
+STATION = 1
+TODAY = date(2024, 6, 15)
+
+
+def _days(year, month, last_day=None):
+    """
+    Return weather rows for the first last_day days of a month, or all of them.
+    """
+    last_day = last_day or calendar.monthrange(year, month)[1]
+    return [(STATION, str(date(year, month, day)), -1.0, 1.0, 0.0) for day in range(1, last_day + 1)]
+
+
+@pytest.fixture
+def processor(tmp_path):
+    """
+    A processor of an empty database without a page cache.
+    """
+    return WeatherProcessor(str(tmp_path / "weather.db"), cache_dir=None, station_ids=[STATION])
+
+
+def test_find_missing_months(processor):
+    db = processor.db_operations
+    db.bulk_insert(_days(2024, 1) + _days(2024, 4, 10) + _days(2024, 5) + _days(2024, 6, 15))
+    db.record_month_status([(2024, 3, 0, 31, True)], STATION)
+
+    missing = processor._find_missing_months(STATION, date(2024, 1, 1), TODAY)
+
+    # February is a gap, April is partial and June is the current month;
+    # March is already recorded complete even though it has no rows
+    assert missing == [date(2024, 6, 1), date(2024, 4, 1), date(2024, 2, 1)]
+    # Closed months found full are recorded complete without being fetched
+    assert db.complete_months(STATION) == {(2024, 1), (2024, 3), (2024, 5)}
+
+
+def test_find_missing_months_skips_recorded_months_next_time(processor):
+    db = processor.db_operations
+    db.bulk_insert(_days(2024, 5))
+    assert date(2024, 5, 1) not in processor._find_missing_months(STATION, date(2024, 5, 1), TODAY)
+
+    # A complete month is not fetched again even if its rows are gone
+    with DBCM(processor.db_name) as cursor:
+        cursor.execute("DELETE FROM weather WHERE station_id = ?;", (STATION,))
+    assert processor._find_missing_months(STATION, date(2024, 5, 1), TODAY) == [date(2024, 6, 1)]
+
+
+def test_find_missing_months_of_an_empty_station(processor):
+    missing = processor._find_missing_months(STATION, date(2023, 11, 1), TODAY)
+    assert missing == [date(2024, month, 1) for month in range(6, 0, -1)] + [date(2023, 12, 1), date(2023, 11, 1)]
+    assert processor.db_operations.complete_months(STATION) == set()
+
+
+def test_record_fetched_months(processor):
+    db = processor.db_operations
+    db.bulk_insert(_days(2024, 2, 20) + _days(2024, 4, 30) + _days(2024, 5, 30) + _days(2024, 6, 15))
+    months = [date(2024, 6, 1), date(2024, 5, 1), date(2024, 4, 1), date(2024, 2, 1)]
+
+    processor._record_fetched_months(STATION, months, TODAY)
+
+    # February and April can no longer change, so they are complete even with gaps. May, the
+    # previous month, is missing a day and June is the current month, so both are fetched again
+    assert db.complete_months(STATION) == {(2024, 2), (2024, 4)}
+    assert processor._find_missing_months(STATION, date(2024, 2, 1), TODAY) == [
+        date(2024, 6, 1), date(2024, 5, 1), date(2024, 3, 1)]
+
+
+def test_previous_month_is_complete_once_full(processor):
+    db = processor.db_operations
+    db.bulk_insert(_days(2024, 5))
+    previous = TODAY.replace(day=1) - timedelta(days=1)
+    processor._record_fetched_months(STATION, [previous.replace(day=1), TODAY.replace(day=1)], TODAY)
+    assert db.complete_months(STATION) == {(2024, 5)}
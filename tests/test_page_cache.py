@@ -0,0 +1,169 @@
+"""
+Tests of the on-disk page cache and of WeatherScraper fetching through it.
+"""
+
+import os
+import random
+import string
+import threading
+import types
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import page_cache
+from http_client import FetchError, HTTPClient
+from page_cache import PageCache, settled_date
+from scrape_weather import WeatherScraper
+
+
+def _month_url(year, month, station_id=27174):
+    return WeatherScraper(base_url="http://127.0.0.1:9")._generate_url_for_month(date(year, month, 1), station_id)
+
+
+def _timestamp(year, month, day):
+    return datetime(year, month, day, 12).timestamp()
+
+
+class _ETagHandler(BaseHTTPRequestHandler):
+    """
+    Serves one page body with an ETag, answering 304 when the client already has it.
+    """
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        body = self.server.body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def etag_server():
+    """
+    A local server answering conditional requests, with the list of If-None-Match headers it saw.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ETagHandler)
+    server.body = "<html><body>A month page</body></html>"
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_settled_date():
+    assert settled_date(2020, 3) == date(2020, 5, 1)
+    assert settled_date(2020, 11) == date(2021, 1, 1)
+    assert settled_date(2020, 12) == date(2021, 2, 1)
+
+
+def test_settled_months_are_immutable(tmp_path):
+    cache = PageCache(str(tmp_path))
+    url = _month_url(2020, 3)
+    assert not cache.is_immutable(url, today=date(2020, 3, 20))
+    assert not cache.is_immutable(url, today=date(2020, 4, 30))
+    assert cache.is_immutable(url, today=date(2020, 5, 1))
+    assert not cache.is_immutable("http://127.0.0.1:9/climate_data/daily_data_e.html", today=date(2030, 1, 1))
+
+
+def test_pages_fetched_before_their_month_settled_are_revalidated(tmp_path):
+    cache = PageCache(str(tmp_path))
+    url = _month_url(2020, 3)
+    today = date(2020, 8, 1)
+    assert not cache.is_immutable(url, today, fetched_at=_timestamp(2020, 4, 10))
+    assert cache.is_immutable(url, today, fetched_at=_timestamp(2020, 5, 1))
+
+
+def test_put_and_get(tmp_path):
+    cache = PageCache(str(tmp_path))
+    assert cache.get("http://example/a") is None
+    cache.put("http://example/a", "same body", etag='"a"')
+    cache.put("http://example/b", "same body", last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+
+    page = cache.get("http://example/a")
+    assert (page.text, page.etag, page.last_modified) == ("same body", '"a"', None)
+    assert cache.get("http://example/b").last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+    # Identical bodies share one object
+    objects = [name for _, _, names in os.walk(tmp_path / "objects") for name in names]
+    assert len(objects) == 1
+    assert dict(cache.iter_pages()) == {"http://example/a": "same body", "http://example/b": "same body"}
+
+
+def test_evicts_least_recently_used_pages(tmp_path, monkeypatch):
+    clock = iter(range(1, 1000))
+    monkeypatch.setattr(page_cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    rng = random.Random(0)
+
+    def body():
+        # Random text barely compresses, so every page costs about the same
+        return "".join(rng.choice(string.ascii_letters) for _ in range(6000))
+
+    cache = PageCache(str(tmp_path), max_bytes=10_000)
+    cache.put("http://example/1", body())
+    cache.put("http://example/2", body())
+    assert cache.get("http://example/1") is not None  # Now more recently used than page 2
+    cache.put("http://example/3", body())
+
+    assert cache.get("http://example/2") is None
+    assert cache.get("http://example/1") is not None
+    assert cache.get("http://example/3") is not None
+    objects = [name for _, _, names in os.walk(tmp_path / "objects") for name in names]
+    assert len(objects) == 2
+
+
+def test_offline_cache_never_touches_the_network(tmp_path):
+    cache = PageCache(str(tmp_path), offline=True)
+    current = date.today()
+    cached_url = _month_url(current.year, current.month)
+    cache.put(cached_url, "<html>cached</html>")
+
+    scraper = WeatherScraper(HTTPClient(max_retries=0, timeout=0.5), cache, base_url="http://127.0.0.1:9")
+    assert scraper._get_html(cached_url) == "<html>cached</html>"
+    with pytest.raises(FetchError):
+        scraper._get_html(_month_url(2020, 1))
+
+
+def test_unsettled_pages_are_revalidated_with_etags(tmp_path, etag_server, monkeypatch):
+    clock = iter(range(1_000_000, 2_000_000))
+    monkeypatch.setattr(page_cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    host, port = etag_server.server_address[:2]
+    cache = PageCache(str(tmp_path))
+    scraper = WeatherScraper(HTTPClient(max_retries=0), cache, base_url=f"http://{host}:{port}")
+    url = scraper._generate_url_for_month(date.today())
+
+    assert scraper._get_html(url) == etag_server.body
+    fetched_at = cache.get(url).fetched_at
+    etag_server.body = "<html>changed, but the ETag says otherwise</html>"
+
+    # The 304 answer serves the cached body and touch() records the revalidation
+    assert scraper._get_html(url) == "<html><body>A month page</body></html>"
+    assert etag_server.requests == [None, '"v1"']
+    assert cache.get(url).fetched_at > fetched_at
+
+
+def test_settled_pages_are_served_from_the_cache(tmp_path, etag_server):
+    host, port = etag_server.server_address[:2]
+    scraper = WeatherScraper(HTTPClient(max_retries=0), PageCache(str(tmp_path)), base_url=f"http://{host}:{port}")
+    url = scraper._generate_url_for_month(date(2020, 1, 1))
+    for _ in range(3):
+        assert scraper._get_html(url) == etag_server.body
+    assert etag_server.requests == [None]
+
+
+def test_touch_records_the_revalidation(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path))
+    cache.put("http://example/a", "body")
+    monkeypatch.setattr(page_cache, "time", types.SimpleNamespace(time=lambda: 2_000_000_000.0))
+    cache.touch("http://example/a")
+    assert cache.get("http://example/a").fetched_at == 2_000_000_000.0
@@ -0,0 +1,126 @@
+"""
+Tests of the plot data cache: its memory-bounded LRU eviction, and invalidation by data versions.
+"""
+
+import sys
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from db_operations import DBOperations
+from dbcm import DBCM
+from plot_cache import PlotCache, estimate_size
+from plot_operations import PlotOperations
+
+
+def _value(size):
+    """
+    Return a bytes value whose estimated size is exactly size.
+    """
+    return b"x" * (size - sys.getsizeof(b""))
+
+
+def test_estimate_size():
+    array = np.zeros(100)
+    assert estimate_size(array) == 800 + sys.getsizeof(array)
+    assert estimate_size(array[10:]) == 720
+    assert estimate_size((array, [1, 2])) > 800
+
+
+def test_evicts_least_recently_used_bytes():
+    cache = PlotCache(max_bytes=3000, max_entries=10)
+    cache.put("a", _value(1000))
+    cache.put("b", _value(1000))
+    cache.put("c", _value(1000))
+    assert cache.get("a") is not None  # Now more recently used than b and c
+
+    cache.put("d", _value(1500))
+    assert cache.get("b") is None and cache.get("c") is None
+    assert cache.get("a") is not None and cache.get("d") is not None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 2500, 2)
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = PlotCache(max_bytes=3000, max_entries=10)
+    cache.put("a", _value(2000))
+    cache.put("a", _value(500))
+    cache.put("b", _value(2000))
+    assert cache.stats()["bytes"] == 2500
+    assert cache.get("a") is not None
+
+
+def test_oversized_values_are_not_cached():
+    cache = PlotCache(max_bytes=1000)
+    cache.put("a", _value(500))
+    cache.put("b", _value(1001))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 0
+
+
+def test_entry_cap():
+    cache = PlotCache(max_entries=2)
+    for key in "abc":
+        cache.put(key, key)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 2
+
+
+def _rows(station_id, year, mean):
+    """
+    Return a year of rows for a station with the same mean temperature every day.
+    """
+    first = date(year, 1, 1)
+    return [(station_id, str(first + timedelta(days=offset)), mean - 5, mean + 5, mean)
+            for offset in range((date(year + 1, 1, 1) - first).days)]
+
+
+@pytest.fixture
+def plots(tmp_path):
+    """
+    PlotOperations of a database holding 2020 for stations 1 and 2.
+    """
+    db = DBOperations(str(tmp_path / "weather.db"))
+    db.initialize_db()
+    db.bulk_insert(_rows(1, 2020, 1.0) + _rows(2, 2020, 2.0))
+    return PlotOperations(db.db_name)
+
+
+def test_cached_plot_data_is_reused(plots):
+    stats = plots.boxplot_stats(2020, 2020, 1)
+    days, temperatures = plots.lineplot_data(2020, 3, 1)
+    assert plots.boxplot_stats(2020, 2020, 1) is stats
+    assert plots.lineplot_data(2020, 3, 1)[1] is temperatures
+    assert list(days) == list(range(1, 32))
+
+
+def test_new_data_version_invalidates_plot_data(plots):
+    stats = plots.boxplot_stats(2020, 2020, 1)
+    assert list(plots.lineplot_data(2020, 3, 1)[1]) == [1.0] * 31
+    other = plots.lineplot_data(2020, 3, 2)
+    assert stats[0]["med"] == pytest.approx(1.0)
+
+    plots.db_operations.bulk_insert(_rows(1, 2020, 4.0), on_conflict="update")
+    assert plots.boxplot_stats(2020, 2020, 1)[0]["med"] == pytest.approx(4.0)
+    assert list(plots.lineplot_data(2020, 3, 1)[1]) == [4.0] * 31
+    # Station 2 kept its version, so its entries are still used
+    assert plots.lineplot_data(2020, 3, 2) is other
+
+
+def test_bump_data_version_alone_invalidates(plots):
+    stats = plots.boxplot_stats(2020, 2020, [1, 2])
+    _, temperatures = plots.lineplot_data(2020, 3, 2)
+    with DBCM(plots.db_name) as cursor:
+        plots.db_operations._bump_data_version(cursor, [2])
+
+    fresh = plots.boxplot_stats(2020, 2020, [1, 2])
+    assert fresh is not stats
+    assert [month_stats["med"] for month_stats in fresh] == [month_stats["med"] for month_stats in stats]
+    assert plots.lineplot_data(2020, 3, 2)[1] is not temperatures
+
+
+def test_purge_invalidates_plot_data(plots):
+    assert len(plots.lineplot_data(2020, 3, 1)[0]) == 31
+    plots.db_operations.purge_data()
+    assert len(plots.lineplot_data(2020, 3, 1)[0]) == 0
+    assert all(np.isnan(month_stats["med"]) for month_stats in plots.boxplot_stats(2020, 2020, 1))
@@ -0,0 +1,61 @@
+"""
+Query plan tests of the queries the application relies on.
+
+Every checked query must search an index rather than scan its table, both in a
+database created at the current schema and in the committed `weather_data.db` once
+migrated from its older schema. The column fetch behind line plots and the month day
+counts must be answered from their covering indexes without reading the table.
+"""
+
+import os
+import shutil
+import pytest
+from db_operations import DBOperations, iter_weather_rows
+from dbcm import DBCM
+from migrate_db import PLAN_CHECKS, check_query_plans, migrate
+from mock_climate_server import synthetic_month_records
+from stations import DEFAULT_STATION_ID
+
+REPO_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "weather_data.db")
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    """
+    A new database at the current schema holding a few years of two stations.
+    """
+    name = str(tmp_path / "weather.db")
+    db = DBOperations(name)
+    db.initialize_db()
+    for station_id in (DEFAULT_STATION_ID, 1):
+        for year in range(2022, 2025):
+            for month in range(1, 13):
+                db.bulk_insert(iter_weather_rows(synthetic_month_records(station_id, year, month), station_id))
+    yield name
+    DBCM.close_all(name)
+
+
+@pytest.mark.parametrize("name", list(PLAN_CHECKS))
+def test_query_searches_index(db_name, name):
+    query, params = PLAN_CHECKS[name]
+    plan = DBOperations(db_name).explain_query_plan(query, params)
+    assert not any(step.startswith("SCAN") for step in plan), plan
+    assert any("INDEX" in step or "PRIMARY KEY" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("name", ["line plot", "month day counts"])
+def test_weather_query_is_covered(db_name, name):
+    query, params = PLAN_CHECKS[name]
+    plan = DBOperations(db_name).explain_query_plan(query, params)
+    assert all("USING COVERING INDEX" in step for step in plan if "weather" in step), plan
+
+
+@pytest.mark.skipif(not os.path.exists(REPO_DB), reason="no committed database")
+def test_migrated_database_has_no_scans(tmp_path):
+    name = str(tmp_path / "migrated.db")
+    shutil.copy(REPO_DB, name)
+    try:
+        migrate(name)
+        assert check_query_plans(name) == []
+    finally:
+        DBCM.close_all(name)
@@ -0,0 +1,161 @@
+"""
+Tests of the AIMD concurrency limit, Retry-After pauses and rate buckets, on a simulated clock.
+"""
+
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import http_client
+import rate_control
+from http_client import HTTPClient
+from rate_control import AdaptiveLimiter, TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A simulated monotonic clock for rate_control, which sleeping advances instead of blocking.
+    """
+    clock = types.SimpleNamespace(now=1000.0)
+
+    def sleep(seconds):
+        clock.now += max(0.0, seconds)
+
+    clock.monotonic = lambda: clock.now
+    clock.sleep = sleep
+    monkeypatch.setattr(rate_control, "time", clock)
+    return clock
+
+
+def _round(limiter, clock, capacity=None, latency=0.1):
+    """
+    Send a full window of requests at once and answer them after latency seconds,
+    throttling those beyond the server's capacity.
+    :return: The limit the round started with.
+    """
+    limit = limiter.limit
+    sent = [limiter.acquire() for _ in range(limit)]
+    clock.sleep(latency)
+    for index, sent_at in enumerate(sent):
+        limiter.release(sent_at, throttled=capacity is not None and index >= capacity)
+    return limit
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_token_bucket_paces_after_a_burst(clock):
+    bucket = TokenBucket(10, burst=2)
+    assert [bucket.reserve() for _ in range(4)] == pytest.approx([0.0, 0.0, 0.1, 0.2])
+    clock.sleep(1.0)
+    assert bucket.reserve() == 0.0
+
+
+def test_limit_grows_by_about_one_per_window(clock):
+    limiter = AdaptiveLimiter(initial=4, maximum=10)
+    limits = [_round(limiter, clock) for _ in range(12)]
+    assert limits[0] == 4
+    assert all(0 <= later - earlier <= 1 for earlier, later in zip(limits, limits[1:]))
+    assert limits[-1] == 10
+    assert limiter.stats()["decreases"] == 0
+
+
+def test_throttle_with_retry_after_halves_the_limit_and_pauses(clock):
+    limiter = AdaptiveLimiter(initial=8, maximum=8)
+    for _ in range(3):
+        _round(limiter, clock)
+    assert limiter.bucket is None
+
+    sent = [limiter.acquire() for _ in range(8)]
+    clock.sleep(0.1)
+    limiter.release(sent[0], throttled=True, retry_after=2.0)
+    # The other throttled answers to the same burst are one congestion event
+    for sent_at in sent[1:]:
+        limiter.release(sent_at, throttled=True, retry_after=2.0)
+
+    stats = limiter.stats()
+    assert (stats["limit"], stats["throttled"], stats["decreases"]) == (4, 8, 1)
+    assert stats["paused_seconds"] == pytest.approx(2.0)
+    # The latest 20 successes were answered over 0.2 seconds, 95 a second, and are paced at half that
+    assert stats["rate"] == pytest.approx(47.5)
+
+    assert limiter._wait_time(clock.now) == pytest.approx(2.0)
+    clock.sleep(2.0)
+    assert limiter._wait_time(clock.now) == 0
+    assert limiter.acquire() == pytest.approx(clock.now)
+
+
+def test_limit_converges_to_the_server_capacity(clock):
+    capacity = 6
+    limiter = AdaptiveLimiter(initial=2, maximum=32)
+    limits = [_round(limiter, clock, capacity) for _ in range(200)]
+
+    # The limit saws between half the capacity and just above it
+    settled = limits[50:]
+    assert min(settled) >= capacity // 2
+    assert max(settled) <= capacity + 1
+    assert limiter.stats()["decreases"] > 5
+    # The rate found by throttling grows back slowly between decreases rather than running away
+    assert limiter.bucket is not None and limiter.bucket.rate < 200
+
+
+def test_rate_cap_is_never_exceeded(clock):
+    limiter = AdaptiveLimiter(initial=8, maximum=8, requests_per_second=20)
+    start = clock.now
+    sent = []
+    for _ in range(10):
+        limit = limiter.limit
+        round_sent = [limiter.acquire() for _ in range(limit)]
+        sent += round_sent
+        clock.sleep(0.01)
+        for sent_at in round_sent:
+            limiter.release(sent_at)
+    # The first second's burst is free, then requests are 0.05 seconds apart
+    assert clock.now - start >= (len(sent) - 20) / 20
+    assert limiter.bucket.rate == 20
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    """
+    Answers 429 with a Retry-After header to the first request, then 200.
+    """
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.requests == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "3")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_client_backs_off_for_retry_after(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottlingHandler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sleeps = []
+    monkeypatch.setattr(http_client, "time", types.SimpleNamespace(sleep=sleeps.append))
+    client = HTTPClient(max_retries=2, backoff_factor=0.5)
+    try:
+        assert client.get_text(f"http://127.0.0.1:{server.server_address[1]}/") == "ok"
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    # The client waits as long as the server asked rather than its own half a second
+    assert sleeps == [3.0]
+    assert server.requests == 2
@@ -0,0 +1,88 @@
+"""
+Tests of the streaming record file writers and readers.
+"""
+
+from datetime import date
+import pytest
+import record_io
+from db_operations import DBOperations
+from mock_climate_server import MockClimateServer, SyntheticSource, synthetic_month_records
+from record_io import RecordWriter, load_file, open_writer, read_records
+from scrape_weather import WeatherScraper
+
+RECORDS = {
+    "2024-12-01": {"Max": -8.8, "Min": -17.5, "Mean": -13.2},
+    "2024-12-02": {"Max": None, "Min": -20.1, "Mean": None},
+    "2024-12-03": {"Max": 0.5, "Min": -3.0, "Mean": -1.3},
+}
+
+
+@pytest.mark.parametrize("extension", ["jsonl", "csv", "bin", "txt"])
+def test_round_trip(tmp_path, extension):
+    file_name = str(tmp_path / f"records.{extension}")
+    with open_writer(file_name) as writer:
+        writer.write(dict(list(RECORDS.items())[:1]))
+        writer.write(dict(list(RECORDS.items())[1:]))
+    assert writer.count == len(RECORDS)
+    assert dict(read_records(file_name)) == RECORDS
+
+
+def test_incomplete_writer_cannot_be_created(tmp_path):
+    class IncompleteWriter(RecordWriter):
+        pass
+
+    file_name = tmp_path / "records.out"
+    with pytest.raises(TypeError):
+        IncompleteWriter(str(file_name))
+    assert not file_name.exists()
+
+
+def test_unsupported_extension(tmp_path):
+    with pytest.raises(ValueError):
+        open_writer(str(tmp_path / "records.xml"))
+
+
+def test_truncated_binary_file(tmp_path):
+    file_name = tmp_path / "records.bin"
+    with open_writer(str(file_name)) as writer:
+        writer.write(RECORDS)
+    file_name.write_bytes(file_name.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        list(read_records(str(file_name)))
+
+
+def test_legacy_text_is_not_evaluated(tmp_path):
+    file_name = tmp_path / "weather_data.txt"
+    file_name.write_text("2024-12-01: __import__('os').remove('x')\n")
+    with pytest.raises(ValueError):
+        list(read_records(str(file_name)))
+
+
+def test_load_file(tmp_path):
+    file_name = str(tmp_path / "records.jsonl")
+    with open_writer(file_name) as writer:
+        writer.write(RECORDS)
+    db = DBOperations(str(tmp_path / "weather.db"))
+    db.initialize_db()
+    assert load_file(file_name, db, station_id=1) == len(RECORDS)
+    rows = db.fetch_data("2024-12-01", "2024-12-31", 1)
+    assert {row[0]: (row[2], row[1], row[3]) for row in rows} == {
+        sample_date: (weather["Max"], weather["Min"], weather["Mean"]) for sample_date, weather in RECORDS.items()}
+
+
+def test_writers_cover_every_reader():
+    assert set(record_io._WRITERS) == set(record_io._READERS)
+
+
+def test_scrape_to_file(tmp_path):
+    file_name = str(tmp_path / "records.bin")
+    with MockClimateServer(SyntheticSource(first_year=2020)) as server:
+        scraper = WeatherScraper(station_id=5, base_url=server.url)
+        written = scraper.scrape_to_file(file_name, date(2019, 6, 1), date(2020, 3, 31), max_workers=2)
+
+    expected = {}
+    for month in (1, 2, 3):
+        expected.update(synthetic_month_records(5, 2020, month))
+    assert written == len(expected)
+    assert dict(read_records(file_name)) == expected
+    assert len(scraper.weather_data) == 0
@@ -0,0 +1,86 @@
+"""
+Tests of the array-backed WeatherRecordStore and its dictionary semantics.
+"""
+
+import pytest
+from record_store import WeatherRecordStore
+
+RECORDS = {
+    "2024-03-01": {"Max": 5.0, "Min": -2.5, "Mean": 1.3},
+    "2024-02-28": {"Max": None, "Min": -8.0, "Mean": None},
+    "2024-03-15": {"Max": 9.5, "Min": 0.5, "Mean": 5.0},
+}
+
+
+def test_get_set_delete_and_len():
+    store = WeatherRecordStore()
+    assert len(store) == 0 and not store
+    for sample_date, weather in RECORDS.items():
+        store[sample_date] = weather
+    assert len(store) == 3
+    assert store["2024-02-28"] == {"Max": None, "Min": -8.0, "Mean": None}
+    assert store.get("2024-03-02") is None
+
+    store["2024-03-01"] = {"Max": 6.0, "Min": -1.0}
+    assert len(store) == 3
+    assert store["2024-03-01"] == {"Max": 6.0, "Min": -1.0, "Mean": None}
+
+    del store["2024-03-01"]
+    assert len(store) == 2
+    assert "2024-03-01" not in store
+    with pytest.raises(KeyError):
+        store["2024-03-01"]
+    with pytest.raises(KeyError):
+        del store["2024-03-01"]
+    with pytest.raises(KeyError):
+        del store["1999-01-01"]
+
+
+def test_contains():
+    store = WeatherRecordStore(RECORDS)
+    assert "2024-03-15" in store
+    assert "2024-03-14" not in store
+    assert "2030-01-01" not in store
+    assert "not a date" not in store
+    assert 20240315 not in store
+
+
+def test_mapping_methods():
+    store = WeatherRecordStore(RECORDS)
+    assert store == RECORDS
+    assert dict(store.items()) == RECORDS
+    assert store.pop("2024-02-28") == RECORDS["2024-02-28"]
+    store.setdefault("2024-01-01", {"Max": 1.0})
+    assert store["2024-01-01"] == {"Max": 1.0, "Min": None, "Mean": None}
+    assert store.setdefault("2024-03-01", {}) == RECORDS["2024-03-01"]
+    assert set(store.keys()) == {"2024-01-01", "2024-03-01", "2024-03-15"}
+    store.clear()
+    assert len(store) == 0 and list(store) == []
+
+
+def test_iterates_in_date_order_not_insertion_order():
+    store = WeatherRecordStore(RECORDS)
+    assert list(store) == ["2024-02-28", "2024-03-01", "2024-03-15"]
+    assert [row[1] for row in store.iter_rows(7)] == list(store)
+    assert next(store.iter_rows(7)) == (7, "2024-02-28", -8.0, None, None)
+
+
+def test_grows_in_both_directions():
+    store = WeatherRecordStore()
+    store["2024-06-01"] = {"Max": 1.0}
+    store["2020-01-01"] = {"Max": 2.0}
+    store["2028-12-31"] = {"Max": 3.0}
+    assert list(store) == ["2020-01-01", "2024-06-01", "2028-12-31"]
+    assert [store[sample_date]["Max"] for sample_date in store] == [2.0, 1.0, 3.0]
+    assert store.memory_bytes() >= 25 * ((2028 - 2020) * 365)
+
+
+@pytest.mark.parametrize("source", [dict, WeatherRecordStore])
+def test_update(source):
+    store = WeatherRecordStore({"2024-03-01": {"Max": 0.0, "Min": 0.0, "Mean": 0.0},
+                                "2024-04-01": {"Max": 1.0, "Min": 1.0, "Mean": 1.0}})
+    store.update(source(RECORDS))
+    assert len(store) == 4
+    assert store["2024-03-01"] == RECORDS["2024-03-01"]
+    assert store["2024-04-01"] == {"Max": 1.0, "Min": 1.0, "Mean": 1.0}
+    assert store == {**{"2024-04-01": {"Max": 1.0, "Min": 1.0, "Mean": 1.0}}, **RECORDS}
@@ -0,0 +1,93 @@
+"""
+Tests of rendering the plots of every month of every year to files with worker processes.
+"""
+
+import multiprocessing
+import os
+from datetime import date, timedelta
+import pytest
+import dbcm
+import plot_operations
+from db_operations import DBOperations
+from dbcm import DBCM, get_pool
+from plot_operations import PlotOperations
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _month_rows(station_id, year, month, days=10):
+    """
+    Return rows for the first days of a month.
+    """
+    first = date(year, month, 1)
+    return [(station_id, str(first + timedelta(days=day)), -5.0 + day, 5.0 + day, float(day))
+            for day in range(days)]
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    """
+    A database with some months of 2020 and 2021 for station 1 and one month of 2020 for station 2.
+    """
+    db = DBOperations(str(tmp_path / "weather.db"))
+    db.initialize_db()
+    db.bulk_insert(_month_rows(1, 2020, 1) + _month_rows(1, 2020, 2) + _month_rows(1, 2020, 3)
+                   + _month_rows(1, 2021, 2) + _month_rows(2, 2020, 6))
+    yield db.db_name
+    DBCM.close_all(db.db_name)
+
+
+_original_render = plot_operations._render_batch_year
+
+
+def _render_in_fresh_connection(station_id, year, output_dir, formats, dpi):
+    """
+    Render a year like _render_batch_year, failing if the worker touches a connection it inherited.
+    """
+    inherited = list(dbcm._inherited_pools)
+    acquires = [pool.stats()["acquires"] for pool in inherited]
+    written = _original_render(station_id, year, output_dir, formats, dpi)
+
+    pool = get_pool(plot_operations._worker_plotter.db_name)
+    assert pool not in inherited
+    assert pool.stats()["opened"] == 1
+    assert [pool.stats()["acquires"] for pool in inherited] == acquires
+    return written
+
+
+def test_render_batch_writes_every_plot(tmp_path, db_name):
+    output_dir = tmp_path / "plots"
+    written = PlotOperations(db_name).render_batch(str(output_dir), [1, 2], formats=("png",), processes=2)
+
+    expected = {"1/2020.png", "1/2020-01.png", "1/2020-02.png", "1/2020-03.png", "1/2021.png", "1/2021-02.png",
+                "2/2020.png", "2/2020-06.png"}
+    found = {os.path.relpath(os.path.join(root, name), output_dir).replace(os.sep, "/")
+             for root, _, names in os.walk(output_dir) for name in names}
+    assert written == len(expected)
+    assert found == expected
+    for path in expected:
+        assert (output_dir / path).read_bytes().startswith(PNG_SIGNATURE)
+
+
+def test_render_batch_of_given_years_and_formats(tmp_path, db_name):
+    output_dir = tmp_path / "plots"
+    written = PlotOperations(db_name).render_batch(str(output_dir), 1, years=[2021, 2022], formats=("png", "svg"),
+                                                   processes=1)
+    assert written == 4
+    assert sorted(os.listdir(output_dir / "1")) == ["2021-02.png", "2021-02.svg", "2021.png", "2021.svg"]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the workers must be forked")
+def test_workers_open_their_own_connections(tmp_path, db_name, monkeypatch):
+    plotter = PlotOperations(db_name)
+    # The parent has its connection open when the workers are forked
+    with DBCM(db_name) as cursor:
+        connection = cursor.connection
+    monkeypatch.setattr(plot_operations, "_render_batch_year", _render_in_fresh_connection)
+
+    assert plotter.render_batch(str(tmp_path / "plots"), [1, 2], formats=("png",), processes=2) == 8
+
+    with DBCM(db_name) as cursor:
+        assert cursor.connection is connection
+        cursor.execute("SELECT COUNT(*) FROM weather;")
+        assert cursor.fetchone() == (50,)
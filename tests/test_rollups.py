@@ -0,0 +1,87 @@
+"""
+Tests that the monthly rollups kept up to date by DBOperations match a rebuild from the raw rows.
+"""
+
+import random
+from datetime import date, timedelta
+import pytest
+from db_operations import DBOperations
+from dbcm import DBCM
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    A DBOperations of an empty, initialized database.
+    """
+    db = DBOperations(str(tmp_path / "weather.db"))
+    db.initialize_db()
+    return db
+
+
+def _rows(station_id, start, days, seed):
+    """
+    Return random weather rows for consecutive days, some with missing values.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for offset in range(days):
+        low = round(rng.uniform(-30, 10), 1)
+        high = round(low + rng.uniform(0, 15), 1)
+        mean = None if rng.random() < 0.1 else round((low + high) / 2, 1)
+        rows.append((station_id, str(start + timedelta(days=offset)), low, high, mean))
+    return rows
+
+
+def _stored(db):
+    """
+    Return every stored rollup row.
+    """
+    with DBCM(db.db_name) as cursor:
+        cursor.execute("SELECT * FROM monthly_rollup ORDER BY station_id, year, month;")
+        return cursor.fetchall()
+
+
+def _assert_consistent(db):
+    """
+    Assert that the stored rollups have no differences from, and equal, a rebuild of them.
+    """
+    assert db.rollups.check() == []
+    stored = _stored(db)
+    db.rollups.rebuild()
+    assert _stored(db) == stored
+
+
+def test_rollups_follow_ingest_updates_and_purge(db):
+    rows = _rows(1, date(2023, 11, 1), 120, seed=1)
+    db.bulk_insert(rows + _rows(2, date(2024, 1, 1), 60, seed=2))
+    _assert_consistent(db)
+    # The rollups summarize the daily means, so days without one are not counted
+    january = [row[4] for row in rows if row[1].startswith("2024-01") and row[4] is not None]
+    assert db.rollups.fetch_monthly(2024, 2024, 1)[0][:5] == (2024, 1, len(january), min(january), max(january))
+
+    # Re-ingest part of the range, changing some days and adding others
+    db.bulk_insert(_rows(1, date(2024, 1, 15), 60, seed=3), on_conflict="update")
+    db.bulk_insert(_rows(2, date(2024, 2, 10), 40, seed=4), on_conflict="ignore", use_staging=True)
+    _assert_consistent(db)
+
+    db.purge_data()
+    assert _stored(db) == []
+    assert db.rollups.check() == []
+
+    db.bulk_insert(_rows(1, date(2024, 6, 1), 10, seed=5))
+    _assert_consistent(db)
+    assert [row[:2] for row in db.rollups.fetch_monthly(2020, 2030, 1)] == [(2024, 6)]
+
+
+def test_check_reports_stale_rollups(db):
+    db.bulk_insert(_rows(1, date(2024, 3, 1), 31, seed=6))
+    with DBCM(db.db_name) as cursor:
+        cursor.execute("UPDATE weather SET avg_temp = 99.0 WHERE sample_date = '2024-03-05';")
+        cursor.execute("DELETE FROM weather WHERE sample_date = '2024-03-31';")
+
+    fields = {difference[3] for difference in db.rollups.check()}
+    assert {"day_count", "max_temp", "sum_temp", "histogram"} <= fields
+
+    db.rollups.refresh([(1, 2024, 3)])
+    assert db.rollups.check() == []
@@ -0,0 +1,93 @@
+"""
+Tests of the bulk CSV backend.
+
+`CSVWeatherScraper` reads the yearly CSV files in `tests/fixtures` through its `csv_dir`,
+and years without a readable file are scraped from the HTML pages of the mock climate server.
+"""
+
+import os
+from datetime import date
+import pytest
+from mock_climate_server import MockClimateServer, SyntheticSource, synthetic_month_records
+from scrape_csv import CSVWeatherScraper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+FIXTURE_RECORDS = {
+    "2021-01-01": {"Max": -1.5, "Min": -9.0, "Mean": -5.3},
+    "2021-01-02": {"Max": 0.4, "Min": -6.2, "Mean": -2.9},
+    "2021-01-03": {"Max": None, "Min": -11.8, "Mean": None},
+    "2021-01-05": {"Max": 2.0, "Min": -3.5, "Mean": -0.8},
+    "2021-02-01": {"Max": -7.1, "Min": -15.6, "Mean": -11.4},
+    "2021-02-02": {"Max": -4.0, "Min": -12.2, "Mean": -8.1},
+    "2021-12-31": {"Max": 1.0, "Min": -2.0, "Mean": -0.5},
+}
+
+
+@pytest.fixture
+def server():
+    """
+    A mock climate server with generated data from 2000 on.
+    """
+    with MockClimateServer(SyntheticSource(first_year=2000)) as server:
+        yield server
+
+
+def _synthetic_records(station_id, year, months):
+    """
+    Return the records the mock server renders for some months of a year.
+    """
+    records = {}
+    for month in months:
+        records.update(synthetic_month_records(station_id, year, month))
+    return records
+
+
+def test_parse_csv_lines():
+    scraper = CSVWeatherScraper(station_id=27174, csv_dir=FIXTURES)
+    with open(os.path.join(FIXTURES, "27174_2021.csv"), encoding="utf-8-sig", newline="") as f:
+        records = scraper.parse_csv_lines(f, date(2021, 1, 1), date(2021, 12, 31))
+    assert records == FIXTURE_RECORDS
+
+
+def test_parse_csv_lines_limits_the_range():
+    scraper = CSVWeatherScraper(station_id=27174, csv_dir=FIXTURES)
+    with open(os.path.join(FIXTURES, "27174_2021.csv"), encoding="utf-8-sig", newline="") as f:
+        records = scraper.parse_csv_lines(f, date(2021, 1, 15), date(2021, 2, 1))
+    assert sorted(records) == ["2021-01-01", "2021-01-02", "2021-01-03", "2021-01-05", "2021-02-01"]
+
+
+def test_parse_csv_lines_rejects_unknown_header():
+    scraper = CSVWeatherScraper(csv_dir=FIXTURES)
+    with pytest.raises(ValueError):
+        scraper.parse_csv_lines(["Date/Time,Max Temp (°C)\n", "2021-01-01,1.0\n"],
+                                date(2021, 1, 1), date(2021, 12, 31))
+
+
+def test_scrape_reads_fixture(server):
+    scraper = CSVWeatherScraper(station_id=27174, base_url=server.url, csv_dir=FIXTURES)
+    records = scraper.scrape(date(2021, 1, 1), date(2021, 12, 31))
+    assert dict(records) == FIXTURE_RECORDS
+    assert server.stats()["requests"] == 0
+
+
+def test_missing_file_falls_back_to_html(server):
+    scraper = CSVWeatherScraper(station_id=27174, base_url=server.url, csv_dir=FIXTURES)
+    records = scraper.scrape(date(2020, 10, 1), date(2020, 12, 31))
+    assert dict(records) == _synthetic_records(27174, 2020, [10, 11, 12])
+    assert server.stats()["requests"] == 3
+
+
+def test_unreadable_file_falls_back_to_html(server, tmp_path):
+    (tmp_path / "27174_2020.csv").write_text("Not a climate CSV\n1,2,3\n", encoding="utf-8")
+    scraper = CSVWeatherScraper(station_id=27174, base_url=server.url, csv_dir=str(tmp_path))
+    months = scraper.scrape_months([date(2020, 3, 1), date(2020, 4, 1)], max_workers=1)
+    assert months == {(2020, 3): synthetic_month_records(27174, 2020, 3),
+                      (2020, 4): synthetic_month_records(27174, 2020, 4)}
+
+
+def test_csv_download_from_server(server):
+    scraper = CSVWeatherScraper(station_id=27174, base_url=server.url)
+    records = scraper.scrape(date(2020, 1, 1), date(2020, 12, 31))
+    assert dict(records) == _synthetic_records(27174, 2020, range(1, 13))
+    assert server.stats()["requests"] == 1
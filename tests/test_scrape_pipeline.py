@@ -0,0 +1,92 @@
+"""
+Tests of the fetch, parse and write pipeline against the mock climate server.
+"""
+
+from datetime import date
+import pytest
+from db_operations import DBOperations
+from http_client import FetchError, HTTPClient
+from mock_climate_server import MockClimateServer, SyntheticSource, synthetic_month_records
+from scrape_jobs import ClaimScheduler, JobPipeline, JobQueue
+from scrape_pipeline import ScrapePipeline, StationScheduler
+from scrape_weather import WeatherScraper
+
+
+@pytest.fixture
+def server():
+    """
+    A mock climate server with generated data from 2000 on.
+    """
+    with MockClimateServer(SyntheticSource(first_year=2000)) as server:
+        yield server
+
+
+def _scraper(server):
+    """
+    A scraper of the mock server that does not retry failed requests.
+    """
+    return WeatherScraper(HTTPClient(max_retries=0), base_url=server.url)
+
+
+def _expected(station_ids, year, months):
+    """
+    Return the records the mock server renders for some months of each station, by station.
+    """
+    expected = {}
+    for station_id in station_ids:
+        for month in months:
+            expected.setdefault(station_id, {}).update(synthetic_month_records(station_id, year, month))
+    return expected
+
+
+def test_station_scheduler_interleaves_stations():
+    scheduler = StationScheduler(WeatherScraper(), [1, 2], date(2020, 1, 1), date(2020, 3, 31))
+    jobs = iter(scheduler.next_job, None)
+    assert [(station_id, month_date.month) for station_id, month_date in jobs] == [
+        (1, 3), (2, 3), (1, 2), (2, 2), (1, 1), (2, 1)]
+    assert scheduler.total == 6
+
+
+def test_pipeline_saves_every_month(server):
+    saved = {}
+
+    def save_records(records, station_id):
+        saved.setdefault(station_id, {}).update(records)
+
+    pipeline = ScrapePipeline(_scraper(server), save_records, fetch_workers=3, parse_workers=2,
+                              queue_size=2, batch_size=40)
+    count = pipeline.run(date(2020, 1, 1), date(2020, 4, 30), [1, 2])
+    assert saved == _expected([1, 2], 2020, range(1, 5))
+    assert count == sum(len(records) for records in saved.values())
+
+
+def test_pipeline_stops_at_the_first_error():
+    with MockClimateServer(SyntheticSource(first_year=2000), error_rate=1.0) as server:
+        pipeline = ScrapePipeline(_scraper(server), lambda records, station_id: None, fetch_workers=2,
+                                  parse_workers=1)
+        with pytest.raises(FetchError):
+            pipeline.run(date(2020, 1, 1), date(2020, 6, 30), [1])
+
+
+def test_job_pipeline_completes_and_fails_jobs(server, tmp_path):
+    db_name = str(tmp_path / "weather.db")
+    DBOperations(db_name).initialize_db()
+    jobs = JobQueue(db_name)
+    jobs.enqueue([1], date(2020, 1, 1), date(2020, 4, 30))
+
+    class FailingScraper(WeatherScraper):
+        def _get_html(self, url):
+            if "Month=2" in url:
+                raise FetchError("Failed to fetch page: injected")
+            return super()._get_html(url)
+
+    scraper = FailingScraper(HTTPClient(max_retries=0), base_url=server.url)
+    pipeline = JobPipeline(scraper, jobs, fetch_workers=2, parse_workers=1)
+    saved = pipeline.run_jobs(ClaimScheduler(jobs, "test:1", batch_size=2))
+
+    expected = _expected([1], 2020, [1, 3, 4])[1]
+    # The failing month is claimed again until it runs out of attempts
+    assert (pipeline.done, pipeline.failed, saved) == (3, jobs.max_attempts, len(expected))
+    assert jobs.progress() == {"pending": 0, "claimed": 0, "done": 3, "failed": 1}
+    rows = DBOperations(db_name).fetch_data("2020-01-01", "2020-04-30", 1)
+    assert {row[0] for row in rows} == set(expected)
@@ -0,0 +1,74 @@
+"""
+Tests of the concurrent month scrape and per-host rate limiting of WeatherScraper.
+"""
+
+import threading
+import time
+from datetime import date
+from mock_climate_server import MockClimateServer, SyntheticSource, synthetic_month_records
+from scrape_weather import HostRateLimiter, WeatherScraper
+
+
+class SlowNewestScraper(WeatherScraper):
+    """
+    A WeatherScraper whose newer months take longer to download, so pages complete oldest first,
+    and which records when each request was sent.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def _get_html(self, url, timeout=10):
+        with self._lock:
+            self.sent.append(time.monotonic())
+        month = int(url.rsplit("Month=", 1)[1])
+        time.sleep(0.01 * month)
+        return super()._get_html(url, timeout)
+
+
+def test_iter_scrape_yields_months_newest_first():
+    with MockClimateServer(SyntheticSource(first_year=2020)) as server:
+        scraper = SlowNewestScraper(station_id=3, base_url=server.url)
+        months = list(scraper.iter_scrape(date(2020, 1, 1), date(2020, 8, 31), max_workers=8))
+
+    assert [month_date.month for month_date, _ in months] == list(range(8, 0, -1))
+    for month_date, records in months:
+        assert records == synthetic_month_records(3, 2020, month_date.month)
+
+
+def test_scrape_stops_at_the_first_empty_month():
+    with MockClimateServer(SyntheticSource(first_year=2020)) as server:
+        scraper = WeatherScraper(station_id=3, base_url=server.url)
+        weather_data = scraper.scrape(date(2019, 10, 1), date(2020, 2, 29))
+
+    expected = {**synthetic_month_records(3, 2020, 1), **synthetic_month_records(3, 2020, 2)}
+    assert dict(weather_data) == expected
+
+
+def test_iter_scrape_spaces_requests_to_a_host():
+    with MockClimateServer(SyntheticSource(first_year=2020)) as server:
+        scraper = SlowNewestScraper(station_id=3, base_url=server.url)
+        list(scraper.iter_scrape(date(2020, 1, 1), date(2020, 6, 30), max_workers=6, requests_per_second=20))
+
+    sent = sorted(scraper.sent)
+    assert len(sent) == 6
+    assert min(later - earlier for earlier, later in zip(sent, sent[1:])) >= 0.05 * 0.9
+
+
+def test_host_rate_limiter_keeps_hosts_apart():
+    limiter = HostRateLimiter(requests_per_second=10)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait("http://first.example/page")
+        limiter.wait("http://second.example/page")
+    # Each host gets its own schedule: slots at 0, 0.1 and 0.2 seconds
+    assert 0.2 * 0.9 <= time.monotonic() - start < 0.3
+
+
+def test_host_rate_limiter_without_a_limit():
+    limiter = HostRateLimiter()
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.wait("http://first.example/page")
+    assert time.monotonic() - start < 0.05
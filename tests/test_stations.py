@@ -0,0 +1,25 @@
+"""
+Tests of the station ID helpers.
+"""
+
+import pytest
+from stations import DEFAULT_STATION_ID, load_station_ids, parse_station_ids
+
+
+def test_parse_station_ids():
+    assert parse_station_ids("27174, 1,2\n3 1") == [27174, 1, 2, 3]
+    assert parse_station_ids("  ") == [DEFAULT_STATION_ID]
+    with pytest.raises(ValueError):
+        parse_station_ids("27174, Winnipeg")
+
+
+def test_load_station_ids(tmp_path):
+    path = tmp_path / "stations.txt"
+    path.write_text("# Prairie stations\n27174\n3698, 50430\n  # 1 is skipped\n\n27174\n")
+    assert load_station_ids(str(path)) == [27174, 3698, 50430]
+
+
+def test_load_station_ids_of_an_empty_file(tmp_path):
+    path = tmp_path / "stations.txt"
+    path.write_text("# No stations yet\n")
+    assert load_station_ids(str(path)) == [DEFAULT_STATION_ID]
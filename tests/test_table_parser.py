@@ -0,0 +1,76 @@
+"""
+Parity tests of the streaming table extractor against the BeautifulSoup parser.
+
+Both parsers of `WeatherScraper` must turn a month page into identical records. The
+pages are rendered by the mock climate server, plus any pages saved in a local
+`page_cache` directory.
+"""
+
+import os
+import pytest
+import table_parser
+from mock_climate_server import render_month_page, synthetic_month_records
+from page_cache import PageCache
+from scrape_weather import WeatherScraper
+
+EDGE_CASE_PAGE = """
+<html><body>
+<table class="legend"><tr><td>Legend</td></tr></table>
+<table><tbody>
+<tr><th>DAY</th><th>Max Temp</th><th>Min Temp</th><th>Mean Temp</th></tr>
+<tr><th scope="row"><abbr title="March 1, 2021">01</abbr></th><td>5.5</td><td><b>-2.0</b></td><td>1.8</td><td></td></tr>
+<tr><th scope="row"><abbr title="March 2, 2021">02</abbr></th><td>M</td><td> -3.1 </td><td>M</td><td></td></tr>
+<tr><th scope="row"><abbr title="March 3, 2021">03</abbr></th><td>M</td><td>M</td><td>M</td><td></td></tr>
+<tr><th scope="row"><abbr title="March 4, 2021">04</abbr></th><td>4.0&#8224;</td><td>-1.0</td><td>1.5</td><td></td></tr>
+<tr><th scope="row"><abbr title="March 5, 2021">05</abbr></th><td>3.0</td><td>&nbsp;</td><td>1.5</td><td></td></tr>
+<tr><th scope="row"><abbr title="Sum">Sum</abbr></th><td>&nbsp;</td><td>&nbsp;</td><td>&nbsp;</td><td></td></tr>
+<tr><td>A row without a date</td></tr>
+</tbody></table>
+</body></html>
+"""
+
+
+def _pages():
+    """
+    Yield (name, html) pairs of the month pages to compare the parsers on.
+    """
+    for station_id, year, month in [(1, 2020, 2), (27174, 2023, 7), (42, 1999, 12)]:
+        records = synthetic_month_records(station_id, year, month, seed=station_id)
+        yield f"synthetic-{station_id}-{year}-{month:02d}", render_month_page(year, month, records)
+    yield "empty", render_month_page(2020, 1, {})
+    yield "edge-cases", EDGE_CASE_PAGE
+    if os.path.isdir("page_cache"):
+        yield from PageCache("page_cache", offline=True).iter_pages()
+
+
+@pytest.fixture(params=["html.parser", "lxml"])
+def extractor(request, monkeypatch):
+    """
+    Run the fast parser with lxml, or force its pure Python HTMLParser path.
+    """
+    if request.param == "lxml" and table_parser.lxml is None:
+        pytest.skip("lxml is not installed")
+    if request.param == "html.parser":
+        monkeypatch.setattr(table_parser, "lxml", None)
+    return request.param
+
+
+@pytest.mark.parametrize("name, html", list(_pages()))
+def test_fast_parser_matches_bs4(extractor, name, html):
+    fast = WeatherScraper(parser="fast")._parse_page(html)
+    bs4 = WeatherScraper(parser="bs4")._parse_page(html)
+    assert fast == bs4
+
+
+def test_edge_case_page_records():
+    found_rows, records = WeatherScraper(parser="fast")._parse_page(EDGE_CASE_PAGE)
+    assert found_rows
+    assert records == {"2021-03-01": {"Max": 5.5, "Min": -2.0, "Mean": 1.8},
+                       "2021-03-02": {"Max": None, "Min": -3.1, "Mean": None}}
+
+
+def test_synthetic_page_records_round_trip():
+    records = synthetic_month_records(1, 2020, 2, seed=1)
+    found_rows, parsed = WeatherScraper(parser="fast")._parse_page(render_month_page(2020, 2, records))
+    assert found_rows
+    assert parsed == records
@@ -1,11 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-import threading
 from scrape_weather import WeatherScraper
 from db_operations import DBOperations
 from plot_operations import PlotOperations
 from weather_processor import WeatherProcessor  # Import the WeatherProcessor class
+from async_scraper import BackgroundLoop
+from stations import DEFAULT_STATION_ID, parse_station_ids
 
 class WeatherApp:
     """
@@ -22,12 +23,14 @@ class WeatherApp:
         """
         self.root = root
         self.root.title("Weather Application")
-        self.root.geometry("600x400")
-        self.root.minsize(600, 400)
+        self.root.geometry("600x460")
+        self.root.minsize(600, 460)
         self.weather_scraper = WeatherScraper()
         self.db_operations = DBOperations()
         self.plot_operations = PlotOperations()
         self.weather_processor = WeatherProcessor()  # Create an instance of WeatherProcessor
+        self.scrape_loop = BackgroundLoop()
+        self.scrape_future = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -43,8 +46,16 @@ class WeatherApp:
         self.action_choice.grid(row=0, column=1, padx=5, pady=5)
         self.action_choice.set("New Weather Data")
 
-        scrape_button = ttk.Button(scrape_frame, text="Generate", command=self.scrape_data_threaded)
-        scrape_button.grid(row=1, column=0, columnspan=2, pady=10)
+        ttk.Label(scrape_frame, text="Station IDs (comma separated):").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.scrape_stations_entry = ttk.Entry(scrape_frame)
+        self.scrape_stations_entry.grid(row=1, column=1, padx=5, pady=5)
+        self.scrape_stations_entry.insert(0, str(DEFAULT_STATION_ID))
+
+        self.scrape_button = ttk.Button(scrape_frame, text="Generate", command=self.scrape_data_threaded)
+        self.scrape_button.grid(row=2, column=0, pady=10)
+
+        self.cancel_button = ttk.Button(scrape_frame, text="Cancel", command=self.cancel_scrape, state="disabled")
+        self.cancel_button.grid(row=2, column=1, pady=10)
 
         # Frame for graph and plotting inputs
         visualize_frame = ttk.LabelFrame(self.root, text="Visualize Data")
@@ -63,8 +74,13 @@ class WeatherApp:
         self.plot_month_entry = ttk.Entry(visualize_frame)
         self.plot_month_entry.grid(row=2, column=1, padx=5, pady=5)
 
+        ttk.Label(visualize_frame, text="Station ID(s):").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.plot_station_entry = ttk.Entry(visualize_frame)
+        self.plot_station_entry.grid(row=3, column=1, padx=5, pady=5)
+        self.plot_station_entry.insert(0, str(DEFAULT_STATION_ID))
+
         plot_button = ttk.Button(visualize_frame, text="Generate Plot", command=self.generate_plot)
-        plot_button.grid(row=3, column=0, columnspan=2, pady=10)
+        plot_button.grid(row=4, column=0, columnspan=2, pady=10)
 
         # Frame for database management
         db_frame = ttk.LabelFrame(self.root, text="Database Management")
@@ -75,33 +91,57 @@ class WeatherApp:
 
     def scrape_data_threaded(self):
         """
-        Start the data scraping in a separate thread to keep the UI responsive.
+        Start the data scraping on the background event loop to keep the UI responsive.
         """
-        thread = threading.Thread(target=self.scrape_data)
-        thread.start()
+        if self.scrape_future is not None and not self.scrape_future.done():
+            return
 
-    def scrape_data(self):
-        """
-        Scrape weather data based on user input and save it to the database.
-        """
         action = self.action_choice.get()
-
         try:
+            self.weather_processor.station_ids = parse_station_ids(self.scrape_stations_entry.get())
             if action == "New Weather Data":
                 # Use WeatherProcessor to download the full weather data
-                self.weather_processor._download_full_weather_data()
-                messagebox.showinfo("Success", "Full weather data downloaded successfully.")
+                coroutine = self.weather_processor.download_async(update=False)
+                success = "Full weather data downloaded successfully."
             elif action == "Update Weather Data":
                 # Use WeatherProcessor to update the weather data
-                self.weather_processor._update_weather_data()
-                messagebox.showinfo("Success", "Weather data updated successfully.")
+                coroutine = self.weather_processor.download_async(update=True)
+                success = "Weather data updated successfully."
             else:
                 raise ValueError("Invalid action selected.")
-
         except ValueError as e:
             messagebox.showerror("Invalid Input", str(e))
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
+            return
+
+        self.scrape_future = self.scrape_loop.submit(coroutine)
+        self.scrape_future.add_done_callback(
+            lambda future: self.root.after(0, self._scrape_finished, future, success))
+        self.scrape_button.state(["disabled"])
+        self.cancel_button.state(["!disabled"])
+
+    def cancel_scrape(self):
+        """
+        Cancel the running scrape. Months already downloaded stay in the database.
+        """
+        if self.scrape_future is not None and not self.scrape_future.done():
+            self.scrape_loop.cancel()
+            self.cancel_button.state(["disabled"])
+
+    def _scrape_finished(self, future, success):
+        """
+        Report the outcome of a scrape once it has stopped, on the tkinter thread.
+
+        :param future: The future of the scrape.
+        :param success: The message shown if the scrape completed.
+        """
+        self.scrape_button.state(["!disabled"])
+        self.cancel_button.state(["disabled"])
+        if future.cancelled():
+            messagebox.showinfo("Cancelled", "Scrape cancelled. Months already downloaded were saved.")
+        elif future.exception() is not None:
+            messagebox.showerror("Error", f"An error occurred: {future.exception()}")
+        else:
+            messagebox.showinfo("Success", success)
 
     def generate_plot(self):
         """
@@ -112,14 +152,15 @@ class WeatherApp:
         month = self.plot_month_entry.get()
 
         try:
+            station_ids = parse_station_ids(self.plot_station_entry.get())
             if plot_type == "Box Plot":
                 start_year = int(year.split("-")[0])
                 end_year = int(year.split("-")[1])
-                self.plot_operations.plot_boxplot(start_year, end_year)
+                self.plot_operations.plot_boxplot(start_year, end_year, station_ids)
             elif plot_type == "Line Plot":
                 year = int(year)
                 month = int(month)
-                self.plot_operations.plot_lineplot(year, month)
+                self.plot_operations.plot_lineplot(year, month, station_ids[0])
             else:
                 raise ValueError("Invalid plot type selected.")
         except ValueError as e:
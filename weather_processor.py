@@ -1,84 +1,453 @@
-import sqlite3
-from datetime import datetime, timedelta
+import asyncio
+import calendar
+import threading
+from datetime import date, datetime, timedelta
 from scrape_weather import WeatherScraper
+from scrape_csv import CSVWeatherScraper
+from scrape_jobs import JobQueue, run_backfill, worker_name
+from async_scraper import AsyncAdaptiveLimiter, AsyncHTTPClient, AsyncWeatherScraper
+from http_client import HTTPClient
+from page_cache import PageCache
+from rate_control import AdaptiveLimiter
 from plot_operations import PlotOperations
+from db_operations import DBOperations, iter_weather_rows
+from dbcm import DBCM
+from record_store import WeatherRecordStore
+from stations import DEFAULT_STATION_ID, parse_station_ids
 
 
 class WeatherProcessor:
-    def __init__(self, db_name="weather_data.db"):
+    def __init__(self, db_name="weather_data.db", max_workers=8, requests_per_second=10,
+                 cache_dir="page_cache", station_ids=None, backend="html", worker_processes=2,
+                 base_url=None, adaptive=True):
         """
         Initialize the WeatherProcessor with the database name.
         :param db_name: The SQLite database file name.
+        :param max_workers: The number of months downloaded at the same time.
+        :param requests_per_second: Maximum requests per second sent to the climate website.
+        :param cache_dir: Directory of the raw page cache, or None to always download pages.
+        :param station_ids: The stations to download, defaulting to the default station.
+        :param backend: "html" to scrape month pages, or "csv" to download yearly bulk CSV files.
+        :param worker_processes: The number of processes sharing a full download of month pages.
+        :param base_url: The scheme and host pages are downloaded from, defaulting to the climate website.
+        :param adaptive: Whether to adapt the number of requests in flight, up to max_workers, to the
+            latency and throttling the server shows, with requests_per_second shared by every station.
+            Otherwise max_workers requests are always in flight and each download is rate limited on its own.
         """
         self.db_name = db_name
-        self.weather_scraper = WeatherScraper()
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+        self.adaptive = adaptive
+        self.station_ids = station_ids or [DEFAULT_STATION_ID]
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.worker_processes = worker_processes
+        page_cache = PageCache(cache_dir) if cache_dir else None
+        limiter = AdaptiveLimiter(min(4, max_workers), maximum=max_workers,
+                                  requests_per_second=requests_per_second) if adaptive else None
+        self.weather_scraper = WeatherScraper(HTTPClient(pool_size=max(10, max_workers), limiter=limiter),
+                                              page_cache, base_url=base_url)
         self.plotter = PlotOperations(db_name)
+        self.db_operations = DBOperations(db_name)
+        self.db_operations.initialize_db()
 
-    def _get_latest_date_in_db(self):
+    def _scraper_for(self, station_id):
         """
-        Fetch the latest date of weather data available in the database.
-        :return: Latest date as a string in the format 'YYYY-MM-DD', or None if no data exists.
+        Create a scraper for one station that shares the HTTP client and page cache.
+        :param station_id: The station to scrape.
+        :return: A WeatherScraper (or CSVWeatherScraper) with an empty weather data dictionary.
         """
-        query = "SELECT MAX(sample_date) FROM weather;"
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            latest_date = cursor.fetchone()[0]
-        return latest_date
+        scraper_class = CSVWeatherScraper if self.backend == "csv" else WeatherScraper
+        return scraper_class(self.weather_scraper.http_client, self.weather_scraper.page_cache,
+                             self.weather_scraper.parser, station_id, self.weather_scraper.base_url)
 
-    def _save_weather_data_to_db(self, weather_data):
+    @property
+    def _download_rate(self):
+        """
+        The per-host rate limit of each download. The adaptive limiter enforces requests_per_second itself.
+        """
+        return None if self.adaptive else self.requests_per_second
+
+    def _save_weather_data_to_db(self, weather_data, station_id=DEFAULT_STATION_ID):
         """
         Save the scraped weather data into the database.
         :param weather_data: Dictionary of weather data to save.
+        :param station_id: The station the weather data was recorded at.
+        :return: The number of records saved.
         """
         if not weather_data:
             print("No weather data to save.")
-            return
+            return 0
+
+        count = self.db_operations.bulk_insert(iter_weather_rows(weather_data, station_id),
+                                               on_conflict="update")
+        print(f"Saved {count} records for station {station_id} to the database.")
+        return count
 
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            for date, data in weather_data.items():
-                query = """
-                    INSERT OR REPLACE INTO weather (sample_date, max_temp, min_temp, avg_temp)
-                    VALUES (?, ?, ?, ?);
-                """
-                cursor.execute(query, (date, data.get("Max"), data.get("Min"), data.get("Mean")))
-            conn.commit()
-            print(f"Saved {len(weather_data)} records to the database.")
+    def _find_missing_months(self, station_id, start_date, today):
+        """
+        Work out which months of a station still need to be fetched.
+
+        Months already recorded as complete are skipped. A closed month whose every
+        day is already stored is recorded as complete without being fetched.
+
+        :param station_id: The station to check.
+        :param start_date: The first date that should be in the database.
+        :param today: Today's date.
+        :return: A list of dates, the first day of each month to fetch, newest first.
+        """
+        complete = self.db_operations.complete_months(station_id)
+        counts = self.db_operations.month_day_counts(str(start_date), str(today), station_id)
+        current_month = (today.year, today.month)
+
+        missing = []
+        newly_complete = []
+        for month_date in self.weather_scraper._iter_months(start_date, today):
+            key = (month_date.year, month_date.month)
+            if key in complete:
+                continue
+            days_expected = calendar.monthrange(*key)[1]
+            days_present = counts.get(key, 0)
+            if key != current_month and days_present >= days_expected:
+                newly_complete.append((*key, days_present, days_expected, True))
+            else:
+                missing.append(month_date.replace(day=1))
+
+        self.db_operations.record_month_status(newly_complete, station_id)
+        return missing
+
+    def _record_fetched_months(self, station_id, months, today):
+        """
+        Record the completeness of months that were just fetched.
+
+        Months before the previous month can no longer change, so they are complete
+        once fetched even if the source has gaps. Newer months are complete only
+        when every day is stored, and the current month never is.
+
+        :param station_id: The station the months belong to.
+        :param months: The dates of the fetched months.
+        :param today: Today's date.
+        """
+        counts = self.db_operations.month_day_counts(
+            str(min(months)), str(max(months).replace(day=28) + timedelta(days=4)), station_id)
+        previous_month = today.replace(day=1) - timedelta(days=1)
+
+        statuses = []
+        for month_date in months:
+            key = (month_date.year, month_date.month)
+            days_expected = calendar.monthrange(*key)[1]
+            days_present = counts.get(key, 0)
+            closed = key < (previous_month.year, previous_month.month)
+            full = key < (today.year, today.month) and days_present >= days_expected
+            statuses.append((*key, days_present, days_expected, closed or full))
+        self.db_operations.record_month_status(statuses, station_id)
 
     def _update_weather_data(self):
         """
-        Update the weather database by fetching missing data.
+        Update the weather database by fetching only the missing or incomplete months
+        of every station.
+        :return: The number of records saved.
         """
-        latest_date = self._get_latest_date_in_db()
+        start_date = datetime(2000, 1, 1).date()  # Assuming data starts from 2000
         today = datetime.today().date()
 
-        if latest_date:
-            latest_date = datetime.strptime(latest_date, "%Y-%m-%d").date()
-            if latest_date >= today:
-                print("Weather data is already up-to-date.")
-                return
-            start_date = latest_date + timedelta(days=1)
-        else:
-            print("No data found in the database. Downloading full dataset.")
-            start_date = datetime(2000, 1, 1).date()  # Assuming data starts from 2000
+        saved = 0
+        for station_id in self.station_ids:
+            months = self._find_missing_months(station_id, start_date, today)
+            if not months:
+                print(f"Weather data for station {station_id} is already up-to-date.")
+                continue
+
+            print(f"Updating {len(months)} missing or incomplete months for station {station_id}.")
+            by_month = self._scraper_for(station_id).scrape_months(
+                months, self.max_workers, self._download_rate)
+            weather_data = WeatherRecordStore()
+            for records in by_month.values():
+                weather_data.update(records)
+            saved += self._save_weather_data_to_db(weather_data, station_id)
+            self._record_fetched_months(station_id, months, today)
 
-        print(f"Updating weather data from {start_date} to {today}.")
-        weather_data = self.weather_scraper.scrape(start_date, today)
-        self._save_weather_data_to_db(weather_data)
+        self._print_http_stats()
         print("Weather data update complete.")
+        return saved
+
+    def _backfill_station(self, station_id, start_date, today, stop=None):
+        """
+        Stream a station's history into the database one month at a time, newest first.
+
+        Each month is saved in the same transaction as a checkpoint naming the next
+        month to fetch, so only a few months are held in memory and an interrupted
+        backfill resumes after the last month that was committed. A finished backfill
+        is started again from today.
+
+        :param station_id: The station to backfill.
+        :param start_date: The first date to download.
+        :param today: Today's date.
+        :param stop: A threading.Event that, once set, stops the backfill after the month being saved.
+        :return: The number of records saved.
+        """
+        checkpoint = self.db_operations.get_checkpoint(station_id, str(start_date))
+        if checkpoint and checkpoint[1]:
+            end_date = checkpoint[0]
+            resume = date.fromisoformat(checkpoint[1])
+            range_end = resume.replace(day=calendar.monthrange(resume.year, resume.month)[1])
+            print(f"Resuming station {station_id} from {resume:%Y-%m}.")
+        else:
+            end_date = str(today)
+            range_end = today
+
+        saved = 0
+        scraper = self._scraper_for(station_id)
+        for month_date, records in scraper.iter_scrape(start_date, range_end, self.max_workers,
+                                                       self._download_rate):
+            next_month = month_date.replace(day=1) - timedelta(days=1)
+            with DBCM(self.db_name):
+                saved += self.db_operations.bulk_insert(iter_weather_rows(records, station_id),
+                                                        on_conflict="update")
+                self.db_operations.save_checkpoint(station_id, str(start_date), end_date,
+                                                   str(next_month.replace(day=1)))
+            if stop is not None and stop.is_set():
+                print(f"Stopped station {station_id}; saved {saved} records.")
+                return saved
+        self.db_operations.save_checkpoint(station_id, str(start_date), end_date, None)
+        print(f"Saved {saved} records for station {station_id} to the database.")
+        return saved
 
     def _download_full_weather_data(self):
         """
-        Download a full set of weather data into the database.
+        Download a full set of weather data into the database, resuming an interrupted download.
+
+        Month pages are downloaded by worker processes claiming jobs from the scrape_jobs
+        table; yearly CSV files are streamed station by station with checkpoints.
         """
         start_date = datetime(2000, 1, 1).date()  # Assuming data starts from 2000
         today = datetime.today().date()
         print(f"Downloading weather data from {start_date} to {today}.")
-        weather_data = self.weather_scraper.scrape(start_date, today)
-        self._save_weather_data_to_db(weather_data)
+        if self.backend == "csv":
+            for station_id in self.station_ids:
+                self._backfill_station(station_id, start_date, today)
+            self._print_http_stats()
+            self._print_db_stats()
+        else:
+            # The workers print their own totals; this process's counters saw none of their requests
+            progress = run_backfill(self.db_name, self.station_ids, start_date, today,
+                                    self.worker_processes, self.max_workers, self.requests_per_second,
+                                    self.cache_dir, self.weather_scraper.parser, self.weather_scraper.base_url,
+                                    self.adaptive)
+            if progress["failed"]:
+                print(f"{progress['failed']} months failed; run the download again to retry them.")
         print("Full weather data download complete.")
 
+    async def download_async(self, update=False, concurrency=100):
+        """
+        Download weather data for every station without blocking the event loop, as the GUI does.
+
+        A full download resumes the way _download_full_weather_data does: month pages
+        are claimed from the scrape_jobs table and fetched with the asyncio scrape engine,
+        and yearly CSV files are streamed station by station with checkpoints. An update
+        fetches only the missing or incomplete months. Each month is saved as soon as it
+        arrives, so cancelling the task keeps the months already downloaded and the next
+        download resumes after them.
+
+        The CSV backend has no asyncio engine and runs on a worker thread; cancelling it
+        takes effect after the month being saved, or once an update has finished.
+
+        :param update: Whether to fetch only the missing or incomplete months.
+        :param concurrency: The maximum number of requests in flight.
+        :return: The number of records saved.
+        """
+        start_date = datetime(2000, 1, 1).date()  # Assuming data starts from 2000
+        today = datetime.today().date()
+        if self.backend == "csv":
+            return await self._download_csv_async(update, start_date, today)
+
+        limiter = AsyncAdaptiveLimiter(min(8, concurrency), maximum=concurrency,
+                                       requests_per_second=self.requests_per_second) if self.adaptive else None
+        scraper = AsyncWeatherScraper(AsyncHTTPClient(limiter=limiter), self.weather_scraper.page_cache,
+                                      self.weather_scraper.parser, base_url=self.weather_scraper.base_url)
+        if update:
+            months = self._update_months_async(scraper, start_date, today, concurrency)
+        else:
+            months = self._backfill_jobs_async(scraper, start_date, today, concurrency)
+
+        saved = 0
+        try:
+            async for count in months:
+                saved += count
+        finally:
+            await months.aclose()
+            stats = scraper.async_client.stats()
+            await scraper.async_client.close()
+            print(f"Saved {saved} records to the database. HTTP requests: {stats['requests']}, "
+                  f"reused connections: {stats['reuses']}, retries: {stats['retries']}")
+            if limiter is not None:
+                self._print_limiter_stats(limiter)
+        return saved
+
+    def _save_month(self, station_id, month_date, records, today=None, jobs=None):
+        """
+        Save a month's records, with its completeness or its job, in one transaction.
+
+        :param station_id: The station the records belong to.
+        :param month_date: A date in the month.
+        :param records: A dictionary of weather data indexed by date.
+        :param today: Today's date, to record the month's completeness as an update does.
+        :param jobs: The JobQueue whose job for the month is marked done.
+        :return: The number of records saved.
+        """
+        with DBCM(self.db_name):
+            count = self.db_operations.bulk_insert(iter_weather_rows(records, station_id), on_conflict="update")
+            if today is not None:
+                self._record_fetched_months(station_id, [month_date], today)
+            if jobs is not None:
+                jobs.complete(station_id, month_date.year, month_date.month, count)
+        return count
+
+    async def _update_months_async(self, scraper, start_date, today, concurrency):
+        """
+        Fetch the missing or incomplete months of every station and save each one with its completeness.
+
+        The database is read and written on worker threads. A month that fails is skipped
+        and stays missing, so the next update fetches it again.
+
+        :param scraper: The AsyncWeatherScraper to fetch with.
+        :param start_date: The first date that should be in the database.
+        :param today: Today's date.
+        :param concurrency: The maximum number of requests in flight.
+        :return: An async generator of the number of records saved for each month.
+        """
+        jobs = []
+        for station_id in self.station_ids:
+            months = await asyncio.to_thread(self._find_missing_months, station_id, start_date, today)
+            jobs.extend((station_id, month_date) for month_date in months)
+        print(f"Updating {len(jobs)} missing or incomplete months.")
+        pages = scraper.scrape_months_async(jobs, concurrency, self._download_rate, return_exceptions=True)
+        try:
+            async for station_id, month_date, records in pages:
+                if isinstance(records, Exception):
+                    print(f"Failed to fetch {month_date:%Y-%m} of station {station_id}: {records}")
+                    continue
+                yield await asyncio.to_thread(self._save_month, station_id, month_date, records, today)
+        finally:
+            await pages.aclose()
+
+    async def _backfill_jobs_async(self, scraper, start_date, today, concurrency):
+        """
+        Work through the scrape_jobs table with the asyncio scrape engine, saving each month with its job.
+
+        Jobs are claimed in batches of concurrency months under this process's worker
+        name, and the database is read and written on worker threads. A month that fails
+        is recorded as a failed attempt of its job while the rest of its batch carries on;
+        cancelling returns the claimed months to the queue.
+
+        :param scraper: The AsyncWeatherScraper to fetch with.
+        :param start_date: The first date to download.
+        :param today: Today's date.
+        :param concurrency: The maximum number of requests in flight.
+        :return: An async generator of the number of records saved for each month.
+        """
+        jobs = JobQueue(self.db_name)
+        added = await asyncio.to_thread(jobs.enqueue, self.station_ids, start_date, today)
+        await asyncio.to_thread(jobs.release_orphaned)
+        await asyncio.to_thread(jobs.retry_failed)
+        print(f"Downloading weather data from {start_date} to {today}. Queued {added} new or unsettled "
+              f"month jobs; progress: {await asyncio.to_thread(jobs.progress)}")
+
+        worker_id = worker_name()
+        try:
+            while True:
+                claimed = await asyncio.to_thread(jobs.claim, worker_id, concurrency)
+                if not claimed:
+                    break
+                pages = scraper.scrape_months_async([(station_id, date(year, month, 1))
+                                                     for station_id, year, month in claimed],
+                                                    concurrency, self._download_rate, return_exceptions=True)
+                try:
+                    async for station_id, month_date, records in pages:
+                        if isinstance(records, Exception):
+                            print(f"Failed to fetch {month_date:%Y-%m} of station {station_id}, "
+                                  f"retrying it later: {records}")
+                            await asyncio.to_thread(jobs.fail, station_id, month_date.year, month_date.month,
+                                                    records)
+                            continue
+                        yield await asyncio.to_thread(self._save_month, station_id, month_date, records,
+                                                      jobs=jobs)
+                finally:
+                    await pages.aclose()
+        finally:
+            # On the loop itself, so a cancelled download still hands its claims back
+            jobs.release(worker_id)
+
+        progress = await asyncio.to_thread(jobs.progress)
+        if progress["failed"]:
+            print(f"{progress['failed']} months failed; run the download again to retry them.")
+
+    async def _download_csv_async(self, update, start_date, today):
+        """
+        Run a CSV download on a worker thread, stopping a full download between months if cancelled.
+
+        :param update: Whether to fetch only the missing or incomplete months.
+        :param start_date: The first date to download.
+        :param today: Today's date.
+        :return: The number of records saved.
+        """
+        if update:
+            return await asyncio.shield(asyncio.to_thread(self._update_weather_data))
+
+        stop = threading.Event()
+        saved = 0
+        for station_id in self.station_ids:
+            task = asyncio.ensure_future(asyncio.to_thread(self._backfill_station, station_id, start_date,
+                                                           today, stop))
+            try:
+                saved += await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # The month being saved is committed with its checkpoint before the thread stops
+                stop.set()
+                await task
+                raise
+        return saved
+
+    def _print_http_stats(self):
+        """
+        Print the HTTP client counters collected so far.
+        """
+        stats = self.weather_scraper.http_client.stats()
+        print(f"HTTP requests: {stats['requests']}, reused connections: {stats['reuses']}, "
+              f"retries: {stats['retries']}, not modified: {stats['not_modified']}, "
+              f"bytes: {stats['bytes']}")
+        if self.weather_scraper.http_client.limiter is not None:
+            self._print_limiter_stats(self.weather_scraper.http_client.limiter)
+
+    @staticmethod
+    def _print_limiter_stats(limiter):
+        """
+        Print where the adaptive concurrency limit settled and how often the server pushed back.
+        :param limiter: The AdaptiveLimiter.
+        """
+        stats = limiter.stats()
+        print(f"Concurrency limit: {stats['limit']} (max {limiter.maximum}), throttled: {stats['throttled']}, "
+              f"timeouts: {stats['timeouts']}, latency backoffs: {stats['latency_backoffs']}, "
+              f"paused: {stats['paused_seconds']:.1f} s")
+
+    def _print_db_stats(self):
+        """
+        Print the database connection pool counters collected so far.
+        """
+        stats = DBCM.stats(self.db_name)
+        print(f"DB connections open: {stats['open']}, opened: {stats['opened']}, "
+              f"acquires: {stats['acquires']}, mean acquire: {stats['mean_acquire_seconds'] * 1e6:.1f} us, "
+              f"max acquire: {stats['max_acquire_seconds'] * 1e6:.1f} us")
+
+    def _input_station_id(self):
+        """
+        Prompt the user for a station ID.
+        :return: The station ID entered, or the default station if left blank.
+        :raises ValueError: If the input is not a whole number.
+        """
+        text = input(f"Enter the station ID (blank for {DEFAULT_STATION_ID}): ")
+        return parse_station_ids(text)[0]
+
     def _generate_box_plot(self):
         """
         Prompt the user to enter a year range and generate a box plot.
@@ -86,7 +455,8 @@ class WeatherProcessor:
         try:
             start_year = int(input("Enter the start year (e.g., 2020): "))
             end_year = int(input("Enter the end year (e.g., 2023): "))
-            self.plotter.plot_boxplot(start_year, end_year)
+            text = input(f"Enter station IDs, comma separated (blank for {DEFAULT_STATION_ID}): ")
+            self.plotter.plot_boxplot(start_year, end_year, parse_station_ids(text))
         except ValueError:
             print("Invalid input. Please enter valid years.")
 
@@ -97,13 +467,29 @@ class WeatherProcessor:
         try:
             year = int(input("Enter the year (e.g., 2023): "))
             month = int(input("Enter the month (1-12): "))
+            station_id = self._input_station_id()
             if 1 <= month <= 12:
-                self.plotter.plot_lineplot(year, month)
+                self.plotter.plot_lineplot(year, month, station_id)
             else:
                 print("Invalid month. Please enter a value between 1 and 12.")
         except ValueError:
             print("Invalid input. Please enter a valid year and month.")
 
+    def _render_all_plots(self):
+        """
+        Prompt the user for an output directory and write every plot of the stations to files.
+        """
+        try:
+            output_dir = input("Enter the output directory (blank for plots): ").strip() or "plots"
+            text = input(f"Enter station IDs, comma separated (blank for {DEFAULT_STATION_ID}): ")
+            station_ids = parse_station_ids(text)
+        except ValueError:
+            print("Invalid input. Please enter valid station IDs.")
+            return
+        print("Rendering plots...")
+        written = self.plotter.render_batch(output_dir, station_ids)
+        print(f"Wrote {written} files to {output_dir}.")
+
     def main_menu(self):
         """
         Present the user with a menu of options and handle user interactions.
@@ -114,8 +500,9 @@ class WeatherProcessor:
             print("2. Update weather data")
             print("3. Generate box plot (year range)")
             print("4. Generate line plot (specific year and month)")
-            print("5. Exit")
-            choice = input("Enter your choice (1/2/3/4/5): ")
+            print("5. Render every plot to files")
+            print("6. Exit")
+            choice = input("Enter your choice (1/2/3/4/5/6): ")
 
             if choice == "1":
                 self._download_full_weather_data()
@@ -126,6 +513,8 @@ class WeatherProcessor:
             elif choice == "4":
                 self._generate_line_plot()
             elif choice == "5":
+                self._render_all_plots()
+            elif choice == "6":
                 print("Exiting Weather Data Processor. Goodbye!")
                 break
             else: